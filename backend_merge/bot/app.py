@@ -7,10 +7,12 @@ Main Flask app for Troc-Service:
 
 import os
 import logging
+from datetime import datetime, timezone
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 from twilio.twiml.messaging_response import MessagingResponse
 from sqlalchemy import text
+from werkzeug.exceptions import RequestEntityTooLarge
 
 load_dotenv()
 
@@ -18,24 +20,36 @@ load_dotenv()
 try:
     from .db import db
     from . import core_logic as core
-    from .models import User, Offer, Agreement, Transaction
+    from . import ledger
+    from . import community_stats
+    from . import wallet_jobs
+    from . import groupements
+    from .models import User, Offer, Agreement, Transaction, CommunityStats
     from . import blockchain_utils as web3  # placeholder for on-chain calls
     try:
         from .bafoka_client import get_balance as bafoka_get_balance
+        from . import bafoka_client
     except Exception:
         bafoka_get_balance = None
+        bafoka_client = None
 except ImportError:
     # Fallback for direct script execution
     import sys as _sys, os as _os
     _sys.path.insert(0, _os.path.abspath(_os.path.join(_os.path.dirname(__file__), "..")))
     from bot.db import db
     from bot import core_logic as core
-    from bot.models import User, Offer, Agreement, Transaction
+    from bot import ledger
+    from bot import community_stats
+    from bot import wallet_jobs
+    from bot import groupements
+    from bot.models import User, Offer, Agreement, Transaction, CommunityStats
     from bot import blockchain_utils as web3  # placeholder for on-chain calls
     try:
         from bot.bafoka_client import get_balance as bafoka_get_balance
+        from bot import bafoka_client
     except Exception:
         bafoka_get_balance = None
+        bafoka_client = None
 
 try:
     from . import voice_utils
@@ -83,7 +97,7 @@ def process_command(phone: str, text: str) -> str:
     cmd = parts[0].lower()
     
     if cmd in ["/start", "hi", "hello", "bonjour"]:
-        return "Welcome to Troc-Service! Commands:\n/register <COMMUNITY> | <Name> | <Skill>\n/offer <Title> | <Desc> | <Price>\n/search <Keyword>\n/balance\n/transfer <Phone> <Amount>"
+        return "Welcome to Troc-Service! Commands:\n/register <COMMUNITY> | <Name> | <Skill>\n/offer <Title> | <Desc> | <Price>\n/search <Keyword>\n/balance\n/transfer <Phone> <Amount>\n/history"
 
     if cmd == "/register":
         # /register BAMEKA | Jean | 25 | Farming
@@ -95,12 +109,12 @@ def process_command(phone: str, text: str) -> str:
                 if len(subparts) >= 4:
                     comm, name, age, skill = subparts[0], subparts[1], subparts[2], subparts[3]
                     user, created = core.register_user(phone, name=name, skill=skill, community=comm, age=age)
-                    return f"Welcome {name}! Wallet created.\nCommunity: {user.community}\nAge: {age}\nSkill: {skill}\nBalance: {user.bafoka_balance} {user.bafoka_local_name}"
+                    return f"Welcome {name}! Your wallet is being set up, we'll message you when it's ready.\nCommunity: {user.community}\nAge: {age}\nSkill: {skill}\nBalance: {user.bafoka_balance} {user.bafoka_local_name}"
                 elif len(subparts) >= 3:
                     # Fallback: old format without age (COMMUNITY | Name | Skill)
                     comm, name, skill = subparts[0], subparts[1], subparts[2]
                     user, created = core.register_user(phone, name=name, skill=skill, community=comm)
-                    return f"Welcome {name}! Wallet created.\nCommunity: {user.community}\nSkill: {skill}\nBalance: {user.bafoka_balance} {user.bafoka_local_name}"
+                    return f"Welcome {name}! Your wallet is being set up, we'll message you when it's ready.\nCommunity: {user.community}\nSkill: {skill}\nBalance: {user.bafoka_balance} {user.bafoka_local_name}"
             return "Usage: /register <COMMUNITY> | <Name> | <Age> | <Skill>"
         except Exception as e:
             return f"Error: {str(e)}"
@@ -116,6 +130,8 @@ def process_command(phone: str, text: str) -> str:
             try:
                 ext = bafoka_get_balance(user.phone)
                 ext_msg = f"\nReal Bafoka: {ext.get('balance')} {ext.get('currency')}"
+                if ext.get("cached"):
+                    ext_msg += f" (as of {ext.get('age_seconds', 0):.0f}s ago)"
             except:
                 ext_msg = "\n(Bafoka API unavailable)"
         return f"Local Balance: {local} {user.bafoka_local_name}{ext_msg}"
@@ -132,6 +148,24 @@ def process_command(phone: str, text: str) -> str:
         except Exception as e:
             return f"Transfer failed: {str(e)}"
 
+    if cmd == "/history":
+        # /history [cursor]
+        try:
+            cursor = parts[1] if len(parts) > 1 else None
+            rows, next_cursor = core.list_transactions(phone, cursor=cursor, limit=5)
+            if not rows:
+                return "No transactions yet."
+            lines = []
+            for r in rows:
+                sign = "-" if r["direction"] == "out" else "+"
+                arrow = "to" if r["direction"] == "out" else "from"
+                lines.append(f"{r['created_at'][:16].replace('T', ' ')} {sign}{r['amount']} {arrow} {r['counterparty'] or 'deleted user'} [{r['status']}]")
+            if next_cursor:
+                lines.append(f"More: /history {next_cursor}")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"Error: {str(e)}"
+
     if cmd == "/offer":
         # /offer Selling Maize | Fresh harvest | 5000
         try:
@@ -187,6 +221,8 @@ def create_app():
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev")
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///whatsapp_app.db")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Voice uploads are the largest bodies; refuse anything bigger before it is read (64 KiB for the other form fields)
+    app.config["MAX_CONTENT_LENGTH"] = voice_utils.MAX_BYTES + 64 * 1024
 
     # init db
     db.init_app(app)
@@ -208,10 +244,50 @@ def create_app():
                     db.session.execute(text("ALTER TABLE users ADD COLUMN bafoka_local_name VARCHAR(120)"))
                 if "bafoka_balance" not in cols:
                     db.session.execute(text("ALTER TABLE users ADD COLUMN bafoka_balance INTEGER NOT NULL DEFAULT 0"))
+                if "wallet_status" not in cols:
+                    db.session.execute(text("ALTER TABLE users ADD COLUMN wallet_status VARCHAR(20) NOT NULL DEFAULT 'pending'"))
+                    # Pre-queue users: either they got a wallet inline or the attempt was lost;
+                    # the lost ones go to the wallet queue so they finally get one
+                    db.session.execute(text("UPDATE users SET wallet_status = CASE WHEN bafoka_wallet_id IS NOT NULL THEN 'ready' ELSE 'pending' END"))
+                    requeued = wallet_jobs.requeue_missing()
+                    if requeued:
+                        LOG.info("Queued wallet creation for %d users registered before the wallet queue", requeued)
+                tx_info = db.session.execute(text("PRAGMA table_xinfo('bafoka_transactions')")).fetchall()
+                tx_cols = {row[1] for row in tx_info}
+                if "meta_json" not in tx_cols:
+                    db.session.execute(text("ALTER TABLE bafoka_transactions ADD COLUMN meta_json JSON"))
+                if "external_status" not in tx_cols:
+                    db.session.execute(text("ALTER TABLE bafoka_transactions ADD COLUMN external_status VARCHAR(50) GENERATED ALWAYS AS (json_extract(meta_json, '$.external_status')) VIRTUAL"))
+                if "error_code" not in tx_cols:
+                    db.session.execute(text("ALTER TABLE bafoka_transactions ADD COLUMN error_code VARCHAR(80) GENERATED ALWAYS AS (json_extract(meta_json, '$.error_code')) VIRTUAL"))
+                # create_all() does not add indexes to tables that already exist
+                db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_bafoka_transactions_external_status ON bafoka_transactions (external_status)"))
+                db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_bafoka_transactions_error_code ON bafoka_transactions (error_code)"))
+                db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_bafoka_transactions_from_created ON bafoka_transactions (from_user_id, created_at)"))
+                db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_bafoka_transactions_to_created ON bafoka_transactions (to_user_id, created_at)"))
+                # Rows from before meta_json only have the legacy _metadata text
+                backfilled = core.backfill_legacy_metadata()
+                if backfilled:
+                    LOG.info("Backfilled structured metadata for %d legacy transactions", backfilled)
                 db.session.commit()
         except Exception as e:
             LOG.warning("SQLite auto-migrate skipped/failed: %s", e)
 
+        # Seed community_stats once for databases that predate it
+        try:
+            if CommunityStats.query.first() is None and User.query.first() is not None:
+                community_stats.rebuild()
+        except Exception as e:
+            db.session.rollback()
+            LOG.warning("community_stats seed failed: %s", e)
+
+    wallet_jobs.start_worker(app)
+    # Load + warm up Whisper off the request path; /api/ready says when it is done
+    if voice_utils.PRELOAD:
+        voice_utils.preload()
+    # Warm the community registry in the background; lookups never block on it
+    groupements.get_registry().refresh_if_stale()
+
     # Aliases for Twilio webhook (common misconfigurations)
     @app.route("/", methods=["POST"])
     def root_incoming():
@@ -276,12 +352,7 @@ def create_app():
         
         # Convert groupement_id to community name if provided
         if groupement_id is not None:
-            groupement_to_community = {
-                1: "BATOUFAM",
-                2: "FONDJOMEKWET",
-                3: "BAMEKA",
-            }
-            community = groupement_to_community.get(int(groupement_id), community)
+            community = groupements.get_registry().community_for_id(groupement_id) or community
         
         if not phone:
             return jsonify({"error": "phone or phoneNumber required"}), 400
@@ -302,6 +373,7 @@ def create_app():
             "name": user.name,
             "community": user.community,
             "bafoka_wallet_id": user.bafoka_wallet_id,
+            "wallet_status": user.wallet_status,
             "bafoka_balance": user.bafoka_balance,
             "created": created
         })
@@ -332,17 +404,96 @@ def create_app():
             return jsonify({"error": "user not found"}), 404
         local = user.bafoka_balance
         external = None
+        cached = None
         if bafoka_get_balance:
             try:
                 # New client uses phone number
-                external = bafoka_get_balance(user.phone).get("balance")
+                ext = bafoka_get_balance(user.phone)
+                external = ext.get("balance")
+                cached = ext.get("cached")
             except Exception:
                 external = None
-        return jsonify({"phone": user.phone, "local_balance": local, "external_balance": external, "currency_name": user.bafoka_local_name or "Bafoka"})
+        return jsonify({"phone": user.phone, "local_balance": local, "external_balance": external, "external_balance_cached": cached, "currency_name": user.bafoka_local_name or "Bafoka"})
+
+    @app.route("/api/metrics", methods=["GET"])
+    def api_metrics():
+        """Bafoka upstream telemetry: per-endpoint outcomes, latency histograms, breaker state."""
+        return jsonify({"bafoka": bafoka_client.stats() if bafoka_client else None})
+
+    @app.route("/api/ready", methods=["GET"])
+    def api_ready():
+        """Readiness probe: 503 while a preloaded Whisper model is still loading / warming up."""
+        voice = voice_utils.readiness()
+        ready = voice_utils.is_ready() or not voice_utils.PRELOAD
+        return jsonify({"ready": ready, "voice": voice}), 200 if ready else 503
+
+    @app.route("/api/transactions", methods=["GET"])
+    def api_transactions():
+        phone = normalize_phone(request.args.get("phone") or "")
+        if not phone:
+            return jsonify({"error": "phone required (query param)"}), 400
+        try:
+            limit = int(request.args.get("limit", 20))
+        except ValueError:
+            return jsonify({"error": "limit must be integer"}), 400
+        try:
+            rows, next_cursor = core.list_transactions(phone, cursor=request.args.get("cursor"), limit=limit)
+        except ValueError as e:
+            status = 404 if str(e) == "User not found" else 400
+            return jsonify({"error": str(e)}), status
+        return jsonify({"phone": phone, "transactions": rows, "next_cursor": next_cursor})
+
+    @app.route("/api/ledger/balance", methods=["GET"])
+    def api_ledger_balance():
+        """Local balance as of `at` (ISO-8601, UTC), reconstructed from the ledger."""
+        phone = normalize_phone(request.args.get("phone") or "")
+        if not phone:
+            return jsonify({"error": "phone required (query param)"}), 400
+        at = None
+        if request.args.get("at"):
+            try:
+                at = datetime.fromisoformat(request.args["at"])
+            except ValueError:
+                return jsonify({"error": "at must be an ISO-8601 datetime"}), 400
+            if at.tzinfo is not None:
+                # ledger timestamps are naive UTC
+                at = at.astimezone(timezone.utc).replace(tzinfo=None)
+        user = core.get_user_by_phone(phone)
+        if not user:
+            return jsonify({"error": "user not found"}), 404
+        balance = ledger.balance_as_of(user.id, at)
+        return jsonify({"phone": user.phone, "at": at.isoformat() if at else None, "balance": balance, "currency_name": user.bafoka_local_name or "Bafoka"})
 
     @app.route("/api/bafoka/webhook", methods=["POST"])
     def api_bafoka_webhook():
         payload = request.get_json() or {}
+        # Batch form: a bare list, {"data": [...]} or {"updates": [...]}
+        if isinstance(payload, list):
+            batch = payload
+        elif isinstance(payload.get("data"), list):
+            batch = payload["data"]
+        else:
+            batch = payload.get("updates")
+        if isinstance(batch, list):
+            updates = [
+                {
+                    "tx_id": item.get("tx_id") or item.get("transaction_id"),
+                    "status": item.get("status"),
+                    "metadata": item,
+                }
+                for item in batch if isinstance(item, dict)
+            ]
+            results = core.adjust_balances_on_external_updates(updates)
+            if results and all(str(r.get("error", "")).startswith("batch_failed") for r in results):
+                return jsonify({"received": False, "error": results[0]["error"]}), 500
+            return jsonify({
+                "received": True,
+                "applied": sum(1 for r in results if r.get("ok") and r.get("action") != "skipped"),
+                "skipped": sum(1 for r in results if r.get("action") == "skipped"),
+                "failed": sum(1 for r in results if not r.get("ok")),
+                "results": results,
+            }), 200
+
         data = payload.get("data", {}) or {}
         tx_id = data.get("tx_id") or data.get("transaction_id")
         status = data.get("status")
@@ -376,6 +527,16 @@ def create_app():
             
         return jsonify({"agreement_id": ag.id, "status": ag.status})
 
+    @app.route("/api/communities/<name>/stats", methods=["GET"])
+    def api_community_stats(name):
+        community = core.canonicalize_community(name)
+        if not community:
+            return jsonify({"error": "unknown community"}), 404
+        stats = community_stats.get_stats(community)
+        if stats is None:
+            stats = {"community": community, "members": 0, "offers": 0, "agreements": 0, "transactions": 0, "volume": 0, "updated_at": None}
+        return jsonify(stats)
+
     @app.route("/api/me", methods=["GET"])
     def api_me():
         phone = normalize_phone(request.args.get("phone") or "")
@@ -389,6 +550,8 @@ def create_app():
             "name": user.name,
             "skill": user.skill,
             "community": user.community,
+            "bafoka_wallet_id": user.bafoka_wallet_id,
+            "wallet_status": user.wallet_status,
             "bafoka_balance": user.bafoka_balance,
             "currency": user.bafoka_local_name,
             "offers_count": len(user.offers)
@@ -438,7 +601,7 @@ def create_app():
         }
         """
         phone = None
-        audio_path = None
+        audio_data = None
         output_audio_path = None
         
         try:
@@ -457,12 +620,9 @@ def create_app():
                         "error": "audio_url required in JSON request"
                     }), 400
                 
-                # Download audio from URL
-                LOG.info(f"[VOICE] Downloading audio from URL for {phone}")
-                audio_path = voice_utils.download_audio(
-                    audio_url, 
-                    save_dir=os.path.join(app.static_folder, "audio", "input")
-                )
+                # Stream the download straight into the decoder (size/duration limits enforced)
+                LOG.info(f"[VOICE] Fetching audio from URL for {phone}")
+                audio_data = voice_utils.fetch_audio(audio_url)
                 
             else:
                 # Handle file upload
@@ -477,13 +637,11 @@ def create_app():
                 output_format = request.form.get("output_format", "both").lower()
                 LOG.info(f"[VOICE] File upload - Phone: {phone}, Output Format: {output_format}")
                 
-                # Save uploaded file
-                import uuid
-                filename = f"upload_{uuid.uuid4().hex[:8]}{os.path.splitext(audio_file.filename)[1]}"
-                audio_path = os.path.join(app.static_folder, "audio", "input", filename)
-                os.makedirs(os.path.dirname(audio_path), exist_ok=True)
-                audio_file.save(audio_path)
-                LOG.info(f"[VOICE] Saved uploaded audio file: {audio_path}")
+                # Decoded straight from memory in this thread, like a download, so bad or
+                # oversized audio is refused before it takes a transcription slot
+                upload = audio_file.read()
+                LOG.info(f"[VOICE] Received uploaded audio: {len(upload)} bytes")
+                audio_data = voice_utils.decode_audio(upload)
             
             # Validate output format
             if output_format not in ["audio", "text", "both"]:
@@ -494,7 +652,7 @@ def create_app():
             
             # Step 1: Transcribe audio to text (Whisper)
             LOG.info("[VOICE] Transcribing audio with Whisper...")
-            transcribed_text = voice_utils.transcribe_audio(audio_path)
+            transcribed_text = voice_utils.transcribe_audio(audio_data)
             LOG.info(f"[VOICE] Transcription: {transcribed_text}")
             
             if not transcribed_text or not transcribed_text.strip():
@@ -532,26 +690,26 @@ def create_app():
             else:
                 LOG.info(f"[VOICE] ⚠️ Skipping audio generation - output_format is '{output_format}'")
             
-            # Cleanup input audio file
-            try:
-                if audio_path and os.path.exists(audio_path):
-                    os.remove(audio_path)
-                    LOG.info(f"Cleaned up input audio: {audio_path}")
-            except Exception as cleanup_error:
-                LOG.warning(f"Failed to cleanup input audio: {cleanup_error}")
-            
             return jsonify(response_data), 200
+
+        except voice_utils.TranscriptionBusy as e:
+            LOG.warning(f"[VOICE] Rejected, transcription queue full: {e}")
+            resp = jsonify({"success": False, "error": str(e), "error_type": "busy"})
+            resp.headers["Retry-After"] = "5"
+            return resp, 503
+
+        except voice_utils.AudioRejected as e:
+            LOG.warning(f"[VOICE] Rejected input audio: {e}")
+            return jsonify({"success": False, "error": str(e), "error_type": "rejected_audio"}), e.status
+
+        except RequestEntityTooLarge:
+            LOG.warning("[VOICE] Rejected upload over MAX_CONTENT_LENGTH")
+            error = f"Audio larger than {voice_utils.MAX_BYTES} bytes"
+            return jsonify({"success": False, "error": error, "error_type": "rejected_audio"}), 413
             
         except Exception as e:
             LOG.exception("Voice processing failed")
             
-            # Cleanup on error
-            try:
-                if audio_path and os.path.exists(audio_path):
-                    os.remove(audio_path)
-            except:
-                pass
-            
             return jsonify({
                 "success": False,
                 "error": str(e),
@@ -5,8 +5,18 @@ Seamlessly switches between real sandbox and fake API without user noticing
 Updated to match REAL Bafoka API schema from Swagger docs
 """
 import os
+import asyncio
+import bisect
+import copy
+import json
+import random
+import time
+import threading
 import requests
-from typing import Optional, Dict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
 LOG = logging.getLogger("bafoka_client")
@@ -24,59 +34,522 @@ HEADERS = {
     # "Authorization": f"Bearer {BAFOKA_API_KEY}" 
 }
 
-# Track which API is being used
-_current_api_url = None
-_api_checked = False
+# Connection pooling: one keep-alive Session per base URL, shared by all threads
+CONNECT_TIMEOUT = float(os.getenv("BAFOKA_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("BAFOKA_READ_TIMEOUT", "15"))
+TIMEOUT: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT)
+POOL_SIZE = int(os.getenv("BAFOKA_POOL_SIZE", "20"))
+MAX_RETRIES = int(os.getenv("BAFOKA_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("BAFOKA_RETRY_BACKOFF", "0.3"))
+# POST endpoints that only read, so retrying them is safe
+IDEMPOTENT_POSTS = ("/api/get-balance", "/api/check-account")
 
-def check_api_health() -> str:
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def _adapter(retry_posts: bool) -> HTTPAdapter:
+    methods = {"GET", "HEAD", "OPTIONS"} | ({"POST"} if retry_posts else set())
+    # Connect errors and 502/503/504 are retried; a read timeout is raised at
+    # once (read=False keeps it a ReadTimeout) so the breaker sees it and the
+    # fallback runs after one READ_TIMEOUT, not three
+    retry = Retry(
+        total=MAX_RETRIES,
+        read=False,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(methods),
+        raise_on_status=False,
+    )
+    return HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+def get_session(base_url: str) -> requests.Session:
     """
-    Check which API is available and return its URL.
-    Priority: Real API > Fake API
+    Shared Session for base_url. Non-idempotent POSTs (account creation,
+    transactions) are never retried once sent; reads and GETs are.
     """
-    global _current_api_url, _api_checked
-    
-    if _api_checked and _current_api_url:
-        return _current_api_url
-    
-    # If explicitly set to use fake API
-    if USE_FAKE_API:
-        LOG.info("Using FAKE Bafoka API (forced by env variable)")
-        _current_api_url = FAKE_API_URL
-        _api_checked = True
-        return FAKE_API_URL
-    
-    # Try real API first
+    base_url = base_url.rstrip("/")
+    session = _sessions.get(base_url)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            session.mount(f"{base_url}/", _adapter(retry_posts=False))
+            # requests picks the longest matching prefix
+            for path in IDEMPOTENT_POSTS:
+                session.mount(f"{base_url}{path}", _adapter(retry_posts=True))
+            _sessions[base_url] = session
+        return session
+
+def close_sessions() -> None:
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+# Circuit breakers: one per upstream (real sandbox, fake API)
+BREAKER_FAILURES = int(os.getenv("BAFOKA_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("BAFOKA_BREAKER_RESET_SECONDS", "30"))
+PROBE_INTERVAL = float(os.getenv("BAFOKA_PROBE_INTERVAL", "15"))  # 0 disables background probes
+SLOW_MS = float(os.getenv("BAFOKA_SLOW_MS", "4000"))
+
+class BafokaUnavailable(requests.exceptions.ConnectionError):
+    """Raised without any network I/O when every usable endpoint's circuit is open."""
+
+class CircuitBreaker:
+    """
+    closed: requests flow; BREAKER_FAILURES consecutive failures open it.
+    open: requests are refused until BREAKER_RESET_SECONDS have passed.
+    half_open: one trial request (or health probe) decides closed vs open.
+    Also keeps an EWMA of successful call latency for routing.
+    """
+
+    def __init__(self, name: str, base_url: str, health_path: str):
+        self.name = name
+        self.base_url = base_url
+        self.health_path = health_path
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    def admit(self) -> Tuple[bool, Optional[int]]:
+        """
+        (allowed, trial). trial is set only for the call that got the
+        half-open trial; it hands it back to release_trial().
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True, None
+            if self.state == "open" and time.time() - self.opened_at >= BREAKER_RESET_SECONDS:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trials += 1
+                return True, self._trials
+            return False, None
+
+    def allow(self) -> bool:
+        return self.admit()[0]
+
+    def release_trial(self, trial: Optional[int]) -> None:
+        """
+        End a half-open trial that recorded no outcome (cancelled, or failed with
+        an unexpected error) so the next call can try again. No-op for calls
+        admitted while closed, and once a later trial has started.
+        """
+        with self._lock:
+            if trial is not None and trial == self._trials:
+                self._trial_in_flight = False
+
+    def record_success(self, latency_ms: float) -> None:
+        with self._lock:
+            if self.state != "closed":
+                LOG.info(f"Bafoka {self.name} API recovered, closing circuit")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+            self.latency_ms = latency_ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * latency_ms
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            self._trial_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= BREAKER_FAILURES):
+                if self.state == "closed":
+                    LOG.warning(f"Bafoka {self.name} API failing ({error}), opening circuit for {BREAKER_RESET_SECONDS:.0f}s")
+                self.state = "open"
+                self.opened_at = time.time()
+
+    def is_slow(self) -> bool:
+        return self.latency_ms is not None and self.latency_ms > SLOW_MS
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                "url": self.base_url,
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+                "last_error": self.last_error,
+            }
+
+REAL = CircuitBreaker("real", BAFOKA_API_URL, "/v3/api-docs")
+FAKE = CircuitBreaker("fake", FAKE_API_URL, "/api/health")
+
+def _routes(fake_only: bool = False) -> List[CircuitBreaker]:
+    """
+    Endpoints to try, in order. Real API first unless forced fake, or unless
+    its recent latency is over BAFOKA_SLOW_MS while the fake is healthy.
+    """
+    if fake_only or USE_FAKE_API:
+        return [FAKE]
+    if REAL.is_slow() and FAKE.state == "closed" and not FAKE.is_slow():
+        return [FAKE, REAL]
+    return [REAL, FAKE]
+
+def _send(method: str, path: str, payload: Optional[Dict] = None, fake_payload: Optional[Dict] = None, fake_only: bool = False):
+    """Transport entry point: the network, or the active cassette."""
+    cassette = _cassette
+    if cassette is None:
+        return _send_http(method, path, payload, fake_payload, fake_only)
+    key = cassette.key(method, path, payload, fake_payload, fake_only)
+    if cassette.mode == "replay":
+        return cassette.replay(key)
+    started = time.monotonic()
     try:
-        # Try the Swagger docs endpoint as health check
-        response = requests.get(f"{BAFOKA_API_URL}/v3/api-docs", timeout=3)
-        if response.status_code == 200:
-            LOG.info("Using REAL Bafoka Sandbox API")
-            _current_api_url = BAFOKA_API_URL
-            _api_checked = True
-            return BAFOKA_API_URL
-    except Exception as e:
-        LOG.warning(f"Real Bafoka API not reachable: {e}")
-    
-    # Fallback to fake API
+        result = _send_http(method, path, payload, fake_payload, fake_only)
+    except requests.exceptions.RequestException as e:
+        cassette.record(key, (time.monotonic() - started) * 1000, error=e)
+        raise
+    cassette.record(key, (time.monotonic() - started) * 1000, result=result)
+    return result
+
+# ---- telemetry ----
+#
+# Per (path, api) counters and a latency histogram. api is "real"/"fake" for
+# attempts, "none" when every circuit was open. Outcomes per attempt:
+# ok, fallback (ok, but not from the first route), http-error, timeout,
+# error (other transport failure), unavailable.
+
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LOG_SAMPLE_RATE = float(os.getenv("BAFOKA_LOG_SAMPLE_RATE", "0.01"))
+
+_metrics: Dict[Tuple[str, str], Dict] = {}
+_metrics_lock = threading.Lock()
+
+def _observe(path: str, api: str, outcome: str, latency_ms: Optional[float] = None) -> None:
+    with _metrics_lock:
+        m = _metrics.get((path, api))
+        if m is None:
+            m = _metrics[(path, api)] = {"outcomes": {}, "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1), "sum_ms": 0.0, "max_ms": 0.0, "count": 0}
+        m["outcomes"][outcome] = m["outcomes"].get(outcome, 0) + 1
+        if latency_ms is not None:
+            m["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            m["sum_ms"] += latency_ms
+            m["max_ms"] = max(m["max_ms"], latency_ms)
+            m["count"] += 1
+
+def _percentile(m: Dict, q: float) -> Optional[float]:
+    """Upper bound of the bucket holding the q-th observation (max for the overflow bucket)."""
+    if not m["count"]:
+        return None
+    target = q * m["count"]
+    seen = 0
+    for i, n in enumerate(m["buckets"]):
+        seen += n
+        if seen >= target:
+            return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else round(m["max_ms"], 1)
+    return round(m["max_ms"], 1)
+
+def _sampled() -> bool:
+    """Whether to log full payloads/responses for this call (BAFOKA_LOG_SAMPLE_RATE)."""
+    return LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE
+
+def stats() -> Dict:
+    """Snapshot of call telemetry, breaker state and single-flight counters."""
+    endpoints: Dict[str, Dict] = {}
+    with _metrics_lock:
+        for (path, api), m in sorted(_metrics.items()):
+            bounds = [f"le_{b}" for b in LATENCY_BUCKETS_MS] + ["le_inf"]
+            endpoints.setdefault(path, {})[api] = {
+                "requests": sum(m["outcomes"].values()),
+                "outcomes": dict(m["outcomes"]),
+                "latency_ms": {
+                    "count": m["count"],
+                    "mean": round(m["sum_ms"] / m["count"], 1) if m["count"] else None,
+                    "p50": _percentile(m, 0.50),
+                    "p95": _percentile(m, 0.95),
+                    "p99": _percentile(m, 0.99),
+                    "max": round(m["max_ms"], 1),
+                    "buckets": dict(zip(bounds, m["buckets"])),
+                },
+            }
+    return {
+        "endpoints": endpoints,
+        "breakers": {e.name: e.info() for e in (REAL, FAKE)},
+        "singleflight": singleflight_stats(),
+        "cassette": _cassette.mode if _cassette is not None else None,
+    }
+
+def reset_stats() -> None:
+    with _metrics_lock:
+        _metrics.clear()
+
+def _send_http(method: str, path: str, payload: Optional[Dict] = None, fake_payload: Optional[Dict] = None, fake_only: bool = False):
+    """
+    Send one request, falling through the route list. Transport errors and
+    5xx count against an endpoint's breaker; 4xx means it is up (and still
+    falls through, like the original fallback). Endpoints with an open
+    circuit are skipped without touching the network.
+    """
+    _ensure_prober()
+    last_exc: Optional[Exception] = None
+    routes = _routes(fake_only)
+    for endpoint in routes:
+        allowed, trial = endpoint.admit()
+        if not allowed:
+            continue
+        try:
+            body = fake_payload if endpoint is FAKE and fake_payload is not None else payload
+            url = f"{endpoint.base_url}{path}"
+            started = time.monotonic()
+            try:
+                r = get_session(endpoint.base_url).request(method, url, json=body, timeout=TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                latency_ms = (time.monotonic() - started) * 1000
+                endpoint.record_failure(str(e))
+                _observe(path, endpoint.name, "timeout" if isinstance(e, requests.exceptions.Timeout) else "error", latency_ms)
+                LOG.error(f"{method} {url} failed: {e}")
+                last_exc = e
+                continue
+            latency_ms = (time.monotonic() - started) * 1000
+            if r.status_code >= 500:
+                endpoint.record_failure(f"HTTP {r.status_code}")
+            else:
+                endpoint.record_success(latency_ms)
+            try:
+                r.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                _observe(path, endpoint.name, "http-error", latency_ms)
+                LOG.error(f"{method} {url} failed: {e}")
+                last_exc = e
+                continue
+            _observe(path, endpoint.name, "ok" if endpoint is routes[0] else "fallback", latency_ms)
+            try:
+                return r.json()
+            except ValueError:
+                # check-account answers with a bare "success"/"failed" string
+                return r.text
+        finally:
+            # a half-open trial that ended in an unexpected error must not block the endpoint forever
+            endpoint.release_trial(trial)
+    if last_exc is None:
+        _observe(path, "none", "unavailable")
+        raise BafokaUnavailable(f"No Bafoka API available for {path} (circuits open)")
+    raise last_exc
+
+# ---- record / replay ----
+#
+# BAFOKA_CASSETTE_MODE=record writes every upstream exchange (request key,
+# response or error, elapsed ms) as one JSON line to BAFOKA_CASSETTE_PATH
+# (gzipped when the name ends in .gz). BAFOKA_CASSETTE_MODE=replay serves
+# those exchanges in-process, in recorded order per request key, sleeping
+# elapsed_ms * BAFOKA_CASSETTE_LATENCY (0 = no delay) to mimic the upstream.
+# Nothing touches the network in replay mode.
+
+class CassetteMiss(LookupError):
+    """Replay was asked for a request that was never recorded."""
+
+_REPLAY_ERRORS = {
+    "HTTPError": requests.exceptions.HTTPError,
+    "Timeout": requests.exceptions.Timeout,
+    "ReadTimeout": requests.exceptions.ReadTimeout,
+    "ConnectTimeout": requests.exceptions.ConnectTimeout,
+    "ConnectionError": requests.exceptions.ConnectionError,
+}
+
+class Cassette:
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"cassette mode must be record or replay, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._file = None
+        self._tapes: Dict[str, List[Dict]] = {}
+        self._positions: Dict[str, int] = {}
+        if mode == "replay":
+            self._load()
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            import gzip
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self) -> None:
+        with self._open("r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._tapes.setdefault(entry["key"], []).append(entry)
+        LOG.info(f"Cassette {self.path}: {sum(map(len, self._tapes.values()))} exchanges loaded")
+
+    @staticmethod
+    def key(method: str, path: str, payload, fake_payload, fake_only: bool) -> str:
+        return json.dumps([method, path, payload, fake_payload, fake_only], sort_keys=True, separators=(",", ":"), default=str)
+
+    def record(self, key: str, elapsed_ms: float, result=None, error: Optional[Exception] = None) -> None:
+        entry = {"key": key, "ms": round(elapsed_ms, 1)}
+        if error is not None:
+            entry["error"] = [type(error).__name__, str(error)]
+        else:
+            entry["result"] = result
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = self._open("a")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def _next(self, key: str) -> Dict:
+        with self._lock:
+            tape = self._tapes.get(key)
+            if not tape:
+                raise CassetteMiss(f"No recorded Bafoka exchange for {key}")
+            pos = self._positions.get(key, 0)
+            # past the end, keep answering with the last recording
+            self._positions[key] = pos + 1
+            return tape[min(pos, len(tape) - 1)]
+
+    def _result(self, entry: Dict):
+        if "error" in entry:
+            name, message = entry["error"]
+            raise _REPLAY_ERRORS.get(name, requests.exceptions.RequestException)(message)
+        return copy.deepcopy(entry["result"])
+
+    def replay(self, key: str):
+        entry = self._next(key)
+        if self.latency_scale > 0:
+            time.sleep(entry["ms"] * self.latency_scale / 1000)
+        return self._result(entry)
+
+    async def replay_async(self, key: str):
+        entry = self._next(key)
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["ms"] * self.latency_scale / 1000)
+        return self._result(entry)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_cassette: Optional[Cassette] = None
+
+def use_cassette(path: Optional[str], mode: str = "replay", latency_scale: float = 1.0) -> Optional[Cassette]:
+    """Switch record/replay on (or off with path=None). Returns the new cassette."""
+    global _cassette
+    previous, _cassette = _cassette, None
+    if previous is not None:
+        previous.close()
+    if path:
+        _cassette = Cassette(path, mode, latency_scale)
+        LOG.info(f"Bafoka cassette {mode}: {path}")
+    return _cassette
+
+# Single-flight: concurrent identical read calls share one upstream request
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+_flight_stats = {"leaders": 0, "coalesced": 0}
+
+def _is_read(method: str, path: str) -> bool:
+    return method == "GET" or path in IDEMPOTENT_POSTS
+
+def _call(method: str, path: str, payload: Optional[Dict] = None, fake_payload: Optional[Dict] = None, fake_only: bool = False, generation: Optional[int] = None):
+    """
+    _send() for writes; for reads, callers that arrive while an identical
+    request (same method, path and payloads) is in flight wait for it and
+    get a copy of its result or its exception. generation is part of the
+    identity: a read issued after an invalidation never joins one from before.
+    """
+    if not _is_read(method, path):
+        return _send(method, path, payload, fake_payload, fake_only)
+
+    key = json.dumps([method, path, payload, fake_payload, fake_only, generation], sort_keys=True, default=str)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+            _flight_stats["leaders"] += 1
+        else:
+            _flight_stats["coalesced"] += 1
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return copy.deepcopy(flight.result)
+
     try:
-        response = requests.get(f"{FAKE_API_URL}/api/health", timeout=2)
-        if response.status_code == 200:
-            LOG.info("Using FAKE Bafoka API (real API unavailable)")
-            _current_api_url = FAKE_API_URL
-            _api_checked = True
-            return FAKE_API_URL
-    except Exception as e:
-        LOG.warning(f"Fake Bafoka API not reachable: {e}")
-    
-    # Default to real API URL (will fail gracefully in actual calls)
-    LOG.warning("No Bafoka API available, defaulting to real API URL")
-    _current_api_url = BAFOKA_API_URL
-    _api_checked = True
-    return BAFOKA_API_URL
+        flight.result = _send(method, path, payload, fake_payload, fake_only)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+def singleflight_stats() -> Dict:
+    with _flights_lock:
+        return dict(_flight_stats, in_flight=len(_flights))
+
+def _probe(endpoint: CircuitBreaker) -> None:
+    started = time.monotonic()
+    try:
+        r = get_session(endpoint.base_url).get(f"{endpoint.base_url}{endpoint.health_path}", timeout=(CONNECT_TIMEOUT, 3))
+        ok = r.status_code < 500
+    except requests.exceptions.RequestException as e:
+        endpoint.record_failure(str(e))
+        return
+    if ok:
+        endpoint.record_success((time.monotonic() - started) * 1000)
+    else:
+        endpoint.record_failure(f"HTTP {r.status_code}")
+
+def _probe_loop() -> None:
+    while True:
+        for endpoint in _routes():
+            try:
+                _probe(endpoint)
+            except Exception:
+                LOG.exception(f"Health probe for {endpoint.name} crashed")
+        time.sleep(PROBE_INTERVAL)
+
+_prober: Optional[threading.Thread] = None
+_prober_lock = threading.Lock()
+
+def _ensure_prober() -> None:
+    global _prober
+    if _prober is not None or PROBE_INTERVAL <= 0:
+        return
+    with _prober_lock:
+        if _prober is None:
+            _prober = threading.Thread(target=_probe_loop, name="bafoka-health", daemon=True)
+            _prober.start()
+
+def check_api_health() -> str:
+    """Probe every endpoint once now and return the URL calls would use first."""
+    for endpoint in _routes():
+        _probe(endpoint)
+    return get_api_url()
 
 def get_api_url() -> str:
-    """Get the current API URL (with caching)"""
-    return check_api_health()
+    """URL of the first endpoint whose circuit is not open (no network I/O)."""
+    routes = _routes()
+    for endpoint in routes:
+        if endpoint.state != "open":
+            return endpoint.base_url
+    return routes[0].base_url
 
 def create_wallet(phoneNumber: str, fullName: str, groupement_id: int, age: str = "25", sex: str = "M", blockchainAddress: str = "") -> Dict:
     """
@@ -95,8 +568,6 @@ def create_wallet(phoneNumber: str, fullName: str, groupement_id: int, age: str
     
     Parameters use EXACT API field names for clarity.
     """
-    api_url = get_api_url()
-    
     # Build payload with EXACT API field names
     payload = {
         "phoneNumber": phoneNumber,
@@ -107,48 +578,21 @@ def create_wallet(phoneNumber: str, fullName: str, groupement_id: int, age: str
         "blockchainAddress": blockchainAddress
     }
     
+    # Fake API uses the SAME payload format as the real API
+    if _sampled():
+        LOG.info(f"Creating wallet with payload {payload}")
     try:
-        url = f"{api_url}/api/account-creation"
-        LOG.info(f"Creating wallet at {url} with payload {payload}")
-        r = requests.post(url, json=payload, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        response = r.json()
-        LOG.info(f"Wallet created successfully: {response}")
-        return response
+        response = _call("POST", "/api/account-creation", payload)
     except requests.exceptions.RequestException as e:
         LOG.error(f"Failed to create wallet: {e}")
-        
-        # Try fallback to fake API if using real API
-        if api_url == BAFOKA_API_URL:
-            LOG.info("Attempting fallback to fake API...")
-            try:
-                # Fake API now uses SAME payload format as real API
-                # No need to change anything - use the same payload!
-                url = f"{FAKE_API_URL}/api/account-creation"
-                r = requests.post(url, json=payload, headers=HEADERS, timeout=10)
-                r.raise_for_status()
-                response = r.json()
-                LOG.info(f"Wallet created via fake API: {response}")
-                global _current_api_url
-                _current_api_url = FAKE_API_URL
-                return response
-            except Exception as fallback_error:
-                LOG.error(f"Fallback also failed: {fallback_error}")
-        
         raise
+    if _sampled():
+        LOG.info(f"Wallet created successfully: {response}")
+    return response
 
-def get_balance(phone: str) -> Dict:
-    """
-    Checks balance.
-    Endpoint: POST /api/get-balance
-    
-    REAL API uses AccountCreationRequest schema (same as create_wallet!)
-    This is unusual but matches the Swagger documentation.
-    """
-    api_url = get_api_url()
-    
+def _account_query(phone: str) -> Dict:
     # Real API requires full AccountCreationRequest schema
-    payload = {
+    return {
         "phoneNumber": phone,
         "fullName": "",  # Can be empty for balance check
         "age": "0",
@@ -156,35 +600,108 @@ def get_balance(phone: str) -> Dict:
         "groupement_id": 0,
         "blockchainAddress": ""
     }
+
+def _fetch_balance(phone: str) -> Dict:
+    """
+    Checks balance (uncached; see get_balance). Only fetches started in the
+    same cache generation are coalesced, so one issued after
+    invalidate_balance() never gets a pre-transfer answer.
+    Endpoint: POST /api/get-balance
+    
+    REAL API uses AccountCreationRequest schema (same as create_wallet!)
+    This is unusual but matches the Swagger documentation.
+    """
+    payload = _account_query(phone)
     
     try:
-        url = f"{api_url}/api/get-balance"
-        LOG.info(f"Getting balance from {url} for {phone}")
-        r = requests.post(url, json=payload, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        response = r.json()
-        LOG.info(f"Balance retrieved: {response}")
-        return response
+        response = _call("POST", "/api/get-balance", payload, fake_payload={"phoneNumber": phone}, generation=_balance_generation(phone))
     except requests.exceptions.RequestException as e:
         LOG.error(f"Failed to get balance: {e}")
-        
-        # Try fallback to fake API
-        if api_url == BAFOKA_API_URL:
-            LOG.info("Attempting fallback to fake API...")
-            try:
-                fake_payload = {"phoneNumber": phone}
-                url = f"{FAKE_API_URL}/api/get-balance"
-                r = requests.post(url, json=fake_payload, headers=HEADERS, timeout=10)
-                r.raise_for_status()
-                response = r.json()
-                LOG.info(f"Balance retrieved via fake API: {response}")
-                global _current_api_url
-                _current_api_url = FAKE_API_URL
-                return response
-            except Exception as fallback_error:
-                LOG.error(f"Fallback also failed: {fallback_error}")
-        
         raise
+    if _sampled():
+        LOG.info(f"Balance retrieved for {phone}: {response}")
+    return response
+
+# Balance cache: phone -> (fetched_at, response). A per-phone generation
+# counter stops a fetch that raced with invalidate_balance() from storing.
+BALANCE_TTL_SECONDS = float(os.getenv("BAFOKA_BALANCE_TTL_SECONDS", "15"))
+BALANCE_STALE_SECONDS = float(os.getenv("BAFOKA_BALANCE_STALE_SECONDS", "300"))
+
+_balances: Dict[str, Tuple[float, Dict]] = {}
+_balance_gen: Dict[str, int] = {}
+_balance_refreshing = set()
+_balances_lock = threading.Lock()
+
+def _balance_generation(phone: str) -> int:
+    """Take before fetching; pass to _store_balance so a racing invalidate wins."""
+    with _balances_lock:
+        return _balance_gen.get(phone, 0)
+
+def _store_balance(phone: str, gen: int, fetched_at: float, response: Dict) -> None:
+    with _balances_lock:
+        if _balance_gen.get(phone, 0) == gen:
+            _balances[phone] = (fetched_at, response)
+
+def _load_balance(phone: str) -> Tuple[float, Dict]:
+    gen = _balance_generation(phone)
+    response = _fetch_balance(phone)
+    fetched_at = time.time()
+    _store_balance(phone, gen, fetched_at, response)
+    return fetched_at, response
+
+def _refresh_balance_async(phone: str) -> None:
+    with _balances_lock:
+        if phone in _balance_refreshing:
+            return
+        _balance_refreshing.add(phone)
+
+    def _run():
+        try:
+            _load_balance(phone)
+        except Exception as e:
+            LOG.warning(f"Background balance refresh for {phone} failed: {e}")
+        finally:
+            with _balances_lock:
+                _balance_refreshing.discard(phone)
+
+    threading.Thread(target=_run, name="bafoka-balance-refresh", daemon=True).start()
+
+def _flagged(response: Dict, fetched_at: float, cached: bool) -> Dict:
+    out = dict(response)
+    out["cached"] = cached
+    out["age_seconds"] = round(time.time() - fetched_at, 1)
+    return out
+
+def get_balance(phone: str, max_age: Optional[float] = None) -> Dict:
+    """
+    Balance for phone, served from a short-lived cache.
+    Within BAFOKA_BALANCE_TTL_SECONDS (or max_age) the cached response is
+    returned as-is. Up to BAFOKA_BALANCE_STALE_SECONDS the stale value is
+    returned immediately while a background refresh runs; older or
+    invalidated entries are fetched synchronously.
+    The response carries "cached" (bool) and "age_seconds".
+    """
+    ttl = BALANCE_TTL_SECONDS if max_age is None else max_age
+    with _balances_lock:
+        entry = _balances.get(phone)
+    if entry:
+        fetched_at, response = entry
+        age = time.time() - fetched_at
+        if age <= ttl:
+            return _flagged(response, fetched_at, True)
+        if age <= BALANCE_STALE_SECONDS:
+            _refresh_balance_async(phone)
+            return _flagged(response, fetched_at, True)
+    fetched_at, response = _load_balance(phone)
+    return _flagged(response, fetched_at, False)
+
+def invalidate_balance(*phones: str) -> None:
+    """Drop cached balances after anything that moves money for these phones."""
+    with _balances_lock:
+        for phone in phones:
+            if phone:
+                _balances.pop(phone, None)
+                _balance_gen[phone] = _balance_gen.get(phone, 0) + 1
 
 def transfer(from_phone: str, to_phone: str, amount: int) -> Dict:
     """
@@ -195,9 +712,6 @@ def transfer(from_phone: str, to_phone: str, amount: int) -> Dict:
     
     The real API may have this endpoint but it's not documented.
     """
-    LOG.warning("Transfer endpoint not found in real Bafoka API documentation!")
-    LOG.info("Using fake API for transfers...")
-    
     payload = {
         "senderPhoneNumber": from_phone,
         "receiverPhoneNumber": to_phone,
@@ -205,12 +719,9 @@ def transfer(from_phone: str, to_phone: str, amount: int) -> Dict:
     }
     
     try:
-        url = f"{FAKE_API_URL}/api/initiate-transaction"
-        LOG.info(f"Initiating transfer at {url} (fake API)")
-        r = requests.post(url, json=payload, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        response = r.json()
-        LOG.info(f"Transfer completed via fake API: {response}")
+        response = _call("POST", "/api/initiate-transaction", payload, fake_only=True)
+        if _sampled():
+            LOG.info(f"Transfer completed via fake API: {response}")
         return response
     except requests.exceptions.RequestException as e:
         LOG.error(f"Failed to transfer: {e}")
@@ -219,6 +730,124 @@ def transfer(from_phone: str, to_phone: str, amount: int) -> Dict:
             "Make sure the fake Bafoka API is running on port 9000."
         )
 
+def check_account(phone: str) -> bool:
+    """
+    Whether an account exists for phone.
+    Endpoint: POST /api/check-account
+    Response: "success" or "failed" (plain string, not JSON)
+    """
+    try:
+        response = _call("POST", "/api/check-account", _account_query(phone), fake_payload={"phoneNumber": phone})
+    except requests.exceptions.RequestException as e:
+        LOG.error(f"Failed to check account: {e}")
+        raise
+    return str(response).strip().strip('"').lower() == "success"
+
+def get_groupements() -> List[Dict]:
+    """
+    Lists communities.
+    Endpoint: GET /api/groupements
+    Response: [{"id": 1, "name": "Batoufam"}, ...]
+    """
+    try:
+        return _call("GET", "/api/groupements")
+    except requests.exceptions.RequestException as e:
+        LOG.error(f"Failed to list groupements: {e}")
+        raise
+
+# ---- batch calls ----
+#
+# The fake API has /api/batch/* endpoints; the real API does not. When the
+# fake is the first route (and always for transfers, which are fake-only)
+# a batch is one round trip; otherwise items go out concurrently through
+# the single-call functions. Results line up with the input:
+# {"ok": True, "response": ...} or {"ok": False, "error": "...", "response": ...}.
+
+BATCH_CONCURRENCY = int(os.getenv("BAFOKA_BATCH_CONCURRENCY", "16"))
+
+def _per_item(fn, items: List) -> List[Dict]:
+    def _one(item):
+        try:
+            return {"ok": True, "response": fn(item)}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(items))) as pool:
+        return list(pool.map(_one, items))
+
+def _fake_batch(path: str, payloads: List[Dict], writes: bool) -> Optional[List[Dict]]:
+    """
+    One call to the fake's batch endpoint. None means "do it item by item":
+    for reads on any failure, for writes only when the endpoint is missing
+    (404/405), since a failed write batch may already have been applied.
+    """
+    try:
+        body = _call("POST", path, fake_payload={"items": payloads}, fake_only=True)
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        if writes and status not in (404, 405):
+            raise
+        LOG.warning(f"Batch {path} unavailable, falling back to per-item calls: {e}")
+        return None
+    except requests.exceptions.RequestException as e:
+        if writes:
+            raise
+        LOG.warning(f"Batch {path} failed, falling back to per-item calls: {e}")
+        return None
+    results = []
+    for r in body["results"]:
+        if r["status"] < 400:
+            results.append({"ok": True, "response": r["body"]})
+        else:
+            error = (r["body"].get("message") or r["body"].get("error")) if isinstance(r["body"], dict) else str(r["body"])
+            results.append({"ok": False, "error": error or f"HTTP {r['status']}", "response": r["body"]})
+    return results
+
+def batch_get_balance(phones: List[str]) -> List[Dict]:
+    """Balances for many phones. Successful fake-batch results also fill the balance cache."""
+    if _routes()[0] is FAKE:
+        gens = [_balance_generation(p) for p in phones]
+        results = _fake_batch("/api/batch/get-balance", [{"phoneNumber": p} for p in phones], writes=False)
+        if results is not None:
+            now = time.time()
+            for phone, gen, result in zip(phones, gens, results):
+                if result["ok"]:
+                    _store_balance(phone, gen, now, result["response"])
+            return results
+    return _per_item(get_balance, phones)
+
+def batch_create_wallet(accounts: List[Dict]) -> List[Dict]:
+    """Each item holds create_wallet() keyword arguments."""
+    if _routes()[0] is FAKE:
+        payloads = [
+            {
+                "phoneNumber": a["phoneNumber"],
+                "fullName": a.get("fullName", ""),
+                "age": str(a.get("age", "25")),
+                "sex": a.get("sex", "M"),
+                "groupement_id": a["groupement_id"],
+                "blockchainAddress": a.get("blockchainAddress", ""),
+            }
+            for a in accounts
+        ]
+        results = _fake_batch("/api/batch/account-creation", payloads, writes=True)
+        if results is not None:
+            return results
+    return _per_item(lambda a: create_wallet(**a), accounts)
+
+def batch_transfer(transfers: List[Tuple[str, str, int]]) -> List[Dict]:
+    """(from_phone, to_phone, amount) triples, applied in order by the fake API."""
+    try:
+        payloads = [{"senderPhoneNumber": f, "receiverPhoneNumber": t, "amount": amount} for f, t, amount in transfers]
+        results = _fake_batch("/api/batch/initiate-transaction", payloads, writes=True)
+        if results is None:
+            results = _per_item(lambda t: transfer(*t), transfers)
+        return results
+    finally:
+        invalidate_balance(*{p for f, t, _ in transfers for p in (f, t)})
+
 # Deprecated/Internal helpers
 def credit_wallet(wallet_id: str, amount: int, reason: str = "signup") -> Dict:
     """
@@ -239,7 +868,160 @@ def get_current_api_info() -> Dict:
         "api_url": api_url,
         "is_fake_api": is_fake,
         "is_real_api": not is_fake,
-        "api_type": "FAKE" if is_fake else "REAL"
+        "api_type": "FAKE" if is_fake else "REAL",
+        "routing": [e.name for e in _routes()],
+        "endpoints": {e.name: e.info() for e in (REAL, FAKE)},
+        "singleflight": singleflight_stats(),
     }
 
 
+# ---- asyncio client ----
+
+ASYNC_CONCURRENCY = int(os.getenv("BAFOKA_ASYNC_CONCURRENCY", "100"))
+
+try:
+    import aiohttp
+except ImportError:  # optional: only bulk jobs need it
+    aiohttp = None
+
+class AsyncBafokaClient:
+    """
+    asyncio twin of the functions above for bulk jobs (reconciliation,
+    imports, batch transfers):
+
+        async with AsyncBafokaClient(concurrency=200) as client:
+            results = await asyncio.gather(*(client.get_balance(p) for p in phones), return_exceptions=True)
+
+    One pooled aiohttp session per client; a semaphore caps requests in
+    flight. Routing, fallback and circuit breakers are shared with the
+    sync client, so both see the same upstream health.
+    """
+
+    def __init__(self, concurrency: int = ASYNC_CONCURRENCY):
+        if aiohttp is None:
+            raise RuntimeError("AsyncBafokaClient needs aiohttp (pip install aiohttp)")
+        self.concurrency = concurrency
+        self._session = None
+        self._sem = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self) -> None:
+        if self._session is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._session = aiohttp.ClientSession(
+                headers=HEADERS,
+                connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+            )
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _call(self, method: str, path: str, payload: Optional[Dict] = None, fake_payload: Optional[Dict] = None, fake_only: bool = False):
+        cassette = _cassette
+        if cassette is None:
+            return await self._call_http(method, path, payload, fake_payload, fake_only)
+        key = cassette.key(method, path, payload, fake_payload, fake_only)
+        if cassette.mode == "replay":
+            return await cassette.replay_async(key)
+        started = time.monotonic()
+        try:
+            result = await self._call_http(method, path, payload, fake_payload, fake_only)
+        except requests.exceptions.RequestException as e:
+            cassette.record(key, (time.monotonic() - started) * 1000, error=e)
+            raise
+        cassette.record(key, (time.monotonic() - started) * 1000, result=result)
+        return result
+
+    async def _call_http(self, method: str, path: str, payload: Optional[Dict] = None, fake_payload: Optional[Dict] = None, fake_only: bool = False):
+        """Same contract as the sync _send_http(): fall through routes, feed the breakers."""
+        await self.open()
+        last_exc: Optional[Exception] = None
+        routes = _routes(fake_only)
+        for endpoint in routes:
+            allowed, trial = endpoint.admit()
+            if not allowed:
+                continue
+            try:
+                body = fake_payload if endpoint is FAKE and fake_payload is not None else payload
+                url = f"{endpoint.base_url}{path}"
+                async with self._sem:
+                    started = time.monotonic()
+                    try:
+                        async with self._session.request(method, url, json=body) as r:
+                            status = r.status
+                            text = await r.text()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        endpoint.record_failure(str(e) or type(e).__name__)
+                        _observe(path, endpoint.name, "timeout" if isinstance(e, asyncio.TimeoutError) else "error", (time.monotonic() - started) * 1000)
+                        LOG.error(f"{method} {url} failed: {e!r}")
+                        last_exc = requests.exceptions.ConnectionError(f"{method} {url} failed: {e!r}")
+                        continue
+                latency_ms = (time.monotonic() - started) * 1000
+                if status >= 500:
+                    endpoint.record_failure(f"HTTP {status}")
+                else:
+                    endpoint.record_success(latency_ms)
+                if status >= 400:
+                    _observe(path, endpoint.name, "http-error", latency_ms)
+                    LOG.error(f"{method} {url} failed: HTTP {status}")
+                    last_exc = requests.exceptions.HTTPError(f"{status} Error for url: {url}")
+                    continue
+                _observe(path, endpoint.name, "ok" if endpoint is routes[0] else "fallback", latency_ms)
+                try:
+                    return json.loads(text)
+                except ValueError:
+                    return text
+            finally:
+                # also runs on cancellation, which records no outcome
+                endpoint.release_trial(trial)
+        if last_exc is None:
+            _observe(path, "none", "unavailable")
+            raise BafokaUnavailable(f"No Bafoka API available for {path} (circuits open)")
+        raise last_exc
+
+    async def create_wallet(self, phoneNumber: str, fullName: str, groupement_id: int, age: str = "25", sex: str = "M", blockchainAddress: str = "") -> Dict:
+        payload = {
+            "phoneNumber": phoneNumber,
+            "fullName": fullName,
+            "age": str(age),
+            "sex": sex,
+            "groupement_id": groupement_id,
+            "blockchainAddress": blockchainAddress
+        }
+        return await self._call("POST", "/api/account-creation", payload)
+
+    async def get_balance(self, phone: str) -> Dict:
+        """Always hits the API, then refreshes the shared balance cache."""
+        gen = _balance_generation(phone)
+        response = await self._call("POST", "/api/get-balance", _account_query(phone), fake_payload={"phoneNumber": phone})
+        _store_balance(phone, gen, time.time(), response)
+        return response
+
+    async def transfer(self, from_phone: str, to_phone: str, amount: int) -> Dict:
+        # Fake API only, same as the sync transfer()
+        payload = {"senderPhoneNumber": from_phone, "receiverPhoneNumber": to_phone, "amount": amount}
+        try:
+            return await self._call("POST", "/api/initiate-transaction", payload, fake_only=True)
+        finally:
+            invalidate_balance(from_phone, to_phone)
+
+    async def check_account(self, phone: str) -> bool:
+        response = await self._call("POST", "/api/check-account", _account_query(phone), fake_payload={"phoneNumber": phone})
+        return str(response).strip().strip('"').lower() == "success"
+
+
+if os.getenv("BAFOKA_CASSETTE_MODE", "off").lower() in ("record", "replay"):
+    use_cassette(
+        os.getenv("BAFOKA_CASSETTE_PATH", "bafoka_cassette.jsonl"),
+        os.getenv("BAFOKA_CASSETTE_MODE").lower(),
+        float(os.getenv("BAFOKA_CASSETTE_LATENCY", "1")),
+    )
@@ -0,0 +1,95 @@
+# community_stats.py
+"""
+Incrementally maintained community statistics.
+
+Write paths call bump() before their own commit, so counters move in the same
+DB transaction as the registration/offer/agreement/transfer they describe.
+Increments are issued as `SET col = col + n` so concurrent writers never lose
+updates. rebuild() recomputes everything from the base tables and is only used
+to seed the table once.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from .db import db
+from .models import User, Offer, Agreement, Transaction, CommunityStats
+
+_COUNTERS = ("total_members", "total_offers", "total_agreements", "total_transactions", "total_volume")
+
+
+def bump(community: Optional[str], **deltas: int) -> None:
+    """Add deltas (e.g. total_members=1) to a community's counters. Does not commit."""
+    if not community:
+        return
+    unknown = set(deltas) - set(_COUNTERS)
+    if unknown:
+        raise ValueError(f"Unknown community counters: {sorted(unknown)}")
+    if CommunityStats.query.get(community) is None:
+        _create_row(community)
+    values = {getattr(CommunityStats, k): getattr(CommunityStats, k) + v for k, v in deltas.items() if v}
+    values[CommunityStats.updated_at] = datetime.utcnow()
+    CommunityStats.query.filter_by(community=community).update(values, synchronize_session=False)
+
+
+def _create_row(community: str) -> None:
+    """Insert a zeroed row unless one exists; a concurrent first writer for the same community is not an error."""
+    row = {"community": community, "updated_at": datetime.utcnow(), **{c: 0 for c in _COUNTERS}}
+    dialect = db.session.get_bind(mapper=CommunityStats.__mapper__).dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        db.session.execute(insert(CommunityStats.__table__).values(**row).on_conflict_do_nothing(index_elements=["community"]))
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(CommunityStats(**row))
+    except IntegrityError:
+        pass  # the other writer's row is there now; the UPDATE below adds to it
+
+
+def get_stats(community: str) -> Optional[Dict]:
+    row = CommunityStats.query.get(community)
+    if row is None:
+        return None
+    return {
+        "community": row.community,
+        "members": row.total_members,
+        "offers": row.total_offers,
+        "agreements": row.total_agreements,
+        "transactions": row.total_transactions,
+        "volume": row.total_volume,
+        "updated_at": row.updated_at.isoformat(),
+    }
+
+
+def rebuild() -> None:
+    """Recompute all counters from users/offers/agreements/transactions. Commits."""
+    stats: Dict[str, Dict[str, int]] = {}
+
+    def _row(community):
+        return stats.setdefault(community, {c: 0 for c in _COUNTERS})
+
+    for community, n in db.session.query(User.community, db.func.count(User.id)).filter(User.community.isnot(None)).group_by(User.community):
+        _row(community)["total_members"] = n
+    for community, n in db.session.query(User.community, db.func.count(Offer.id)).join(Offer.owner).filter(User.community.isnot(None)).group_by(User.community):
+        _row(community)["total_offers"] = n
+    for community, n in db.session.query(User.community, db.func.count(Agreement.id)).join(Agreement.requester).filter(User.community.isnot(None)).group_by(User.community):
+        _row(community)["total_agreements"] = n
+    tx_rows = (
+        db.session.query(User.community, db.func.count(Transaction.id), db.func.coalesce(db.func.sum(Transaction.amount), 0))
+        .join(Transaction.from_user)
+        .filter(User.community.isnot(None), Transaction.reverted.is_(False), Transaction.status != "failed")
+        .group_by(User.community)
+    )
+    for community, n, volume in tx_rows:
+        row = _row(community)
+        row["total_transactions"] = n
+        row["total_volume"] = int(volume)
+
+    CommunityStats.query.delete()
+    now = datetime.utcnow()
+    for community, counters in stats.items():
+        db.session.add(CommunityStats(community=community, updated_at=now, **counters))
+    db.session.commit()
@@ -1,40 +1,32 @@
 # core_logic.py
 from typing import List, Optional, Tuple, Dict
 from .db import db
-from .models import User, Offer, Agreement, Transaction
+from .models import User, Offer, Agreement, Transaction, WalletJob
+from . import ledger
+from . import community_stats
+from . import wallet_jobs
+from . import groupements
 from datetime import datetime
+import ast
+import base64
 import logging
 import uuid
 
 LOG = logging.getLogger("core_logic")
 LOG.setLevel(logging.INFO)
 
-# Community to currency mapping (canonical uppercase keys)
-# Real mapping from Bafoka API /api/groupements:
-# [{'id': 1, 'name': 'Batoufam'}, {'id': 2, 'name': 'Fondjomekwet'}, {'id': 3, 'name': 'Bameka'}]
-COMMUNITY_TO_CURRENCY = {
-    "BATOUFAM": "MBIP TSWEFAP",
-    "FONDJOMEKWET": "MBAM",
-    "FONDJOMENKWET": "MBAM",  # Alternative spelling
-    "BAMEKA": "MUNKAP",
-}
+# Communities, currencies and groupement ids come from the registry (/api/groupements)
 
 def canonicalize_community(value: str) -> Optional[str]:
-    if not value:
-        return None
-    key = value.strip().upper()
-    return key if key in COMMUNITY_TO_CURRENCY else None
+    return groupements.get_registry().canonicalize(value)
 
 def currency_for_community(comm: Optional[str]) -> Optional[str]:
-    if not comm:
-        return None
-    key = canonicalize_community(comm)
-    return COMMUNITY_TO_CURRENCY.get(key) if key else None
+    return groupements.get_registry().currency_for(comm)
 
 # Try to import real bafoka client; if missing, fallback to stubs for dev
 try:
     # import transfer as bafoka_transfer so code below reads clearly
-    from .bafoka_client import create_wallet, transfer as bafoka_transfer, get_balance
+    from .bafoka_client import create_wallet, transfer as bafoka_transfer, get_balance, invalidate_balance
 except Exception as e:
     LOG.warning("bafoka_client not available; using stubs: %s", e)
 
@@ -47,6 +39,9 @@ except Exception as e:
     def get_balance(phone):
         return {"balance": 0}
 
+    def invalidate_balance(*phones):
+        pass
+
 
 def get_user_by_phone(phone: str) -> Optional[User]:
     if not phone:
@@ -58,7 +53,8 @@ def register_user(phone: str, name: str = None, skill: str = None, community: st
     """
     Create a new user. Raises ValueError if phone number already exists.
     When creating a new user, community is validated and currency name is set accordingly.
-    On first creation, create a Bafoka wallet.
+    Wallet creation is queued (wallet_status='pending') and done by the
+    background worker in wallet_jobs, so this returns without calling Bafoka.
     Returns (user, created_bool)
     """
     phone = (phone or "").strip()
@@ -66,7 +62,7 @@ def register_user(phone: str, name: str = None, skill: str = None, community: st
     # Validate and canonicalize community if provided
     canon_comm = canonicalize_community(community) if community else None
     if community and not canon_comm:
-        raise ValueError("Invalid community. Allowed: BAMEKA, BATOUFAM, FONDJOMEKWET")
+        raise ValueError(f"Invalid community. Allowed: {', '.join(groupements.get_registry().communities())}")
 
     # Check if user already exists - reject duplicate registrations
     existing_user = get_user_by_phone(phone)
@@ -82,49 +78,43 @@ def register_user(phone: str, name: str = None, skill: str = None, community: st
         bafoka_local_name=(local_name or currency_for_community(canon_comm))
     )
     db.session.add(user)
+    community_stats.bump(user.community, total_members=1)
+    # Queue the external wallet in the same commit as the user row
+    groupement_id = groupements.get_registry().groupement_id_for(user.community)
+    wallet_jobs.enqueue(user, groupement_id, age)
     db.session.commit()
-    created = True
+    wallet_jobs.kick()
 
-    # If newly created - ensure external wallet (idempotent)
-    if created and not user.bafoka_wallet_id:
-        try:
-            # Convert community name to groupement_id (matching real API)
-            # Mapping from Bafoka API /api/groupements:
-            community_to_groupement = {
-                "BATOUFAM": 1,
-                "FONDJOMEKWET": 2,
-                "FONDJOMENKWET": 2,  # Alternative spelling
-                "BAMEKA": 3,
-            }
-            groupement_id = community_to_groupement.get(user.community.upper() if user.community else "", 3)
-            
-            # Use provided age or default to "25" (string as required by API)
-            user_age = str(age) if age else "25"
-            
-            # Call create_wallet with EXACT API parameter names
-            resp = create_wallet(
-                phoneNumber=phone,
-                fullName=name or phone,
-                groupement_id=groupement_id,
-                age=user_age,
-                sex="M",   # Default
-                blockchainAddress=""  # Empty for new accounts
-            )
-            # Real API response structure: {'code': 200, 'data': {'blockchainAddress': '0x...', ...}, ...}
-            # Extract blockchain address from response
-            if resp.get('code') == 200 and resp.get('data'):
-                blockchain_addr = resp['data'].get('blockchainAddress')
-                if blockchain_addr:
-                    user.bafoka_wallet_id = blockchain_addr
-                    # Real API starts with 0 balance - no automatic credit
-                    # Balance remains 0 until user receives funds
-                    db.session.add(user)
-                    db.session.commit()
-                    LOG.info(f"Bafoka wallet created for {phone}: {blockchain_addr}")
-        except Exception as e:
-            LOG.exception("Failed to create Bafoka wallet for user %s: %s", phone, e)
-
-    return user, created
+    return user, True
+
+
+class WalletRejected(RuntimeError):
+    """Bafoka refused the account itself (4xx, e.g. phone number already used); retrying cannot help."""
+
+
+def provision_wallet(phone: str, name: Optional[str], groupement_id: int, age: str = "25") -> str:
+    """
+    Create a Bafoka account and return its blockchain address.
+    Raises on failure so callers can retry (WalletRejected when they should
+    not). Touches no DB state, so it is safe to call from worker threads.
+    """
+    # Call create_wallet with EXACT API parameter names
+    resp = create_wallet(
+        phoneNumber=phone,
+        fullName=name or phone,
+        groupement_id=groupement_id,
+        age=str(age) if age else "25",  # string as required by API
+        sex="M",   # Default
+        blockchainAddress=""  # Empty for new accounts
+    )
+    # Real API response structure: {'code': 200, 'data': {'blockchainAddress': '0x...', ...}, ...}
+    # Real API starts with 0 balance - no automatic credit
+    blockchain_addr = (resp.get("data") or {}).get("blockchainAddress") if resp.get("code") == 200 else None
+    if isinstance(resp.get("code"), int) and 400 <= resp["code"] < 500:
+        raise WalletRejected(resp.get("message") or f"account creation refused ({resp['code']})")
+    if not blockchain_addr:
+        raise RuntimeError(f"Unexpected account-creation response: {resp.get('message') or resp}")
+    return blockchain_addr
 
 
 # compatibility wrapper used by your chatbot
@@ -138,6 +128,7 @@ def create_offer_for_user(phone: str, description: str, title: Optional[str] = N
         raise ValueError("User must be registered with a community before creating offers")
     offer = Offer(owner=user, title=(title or ""), description=description, price=price)
     db.session.add(offer)
+    community_stats.bump(user.community, total_offers=1)
     db.session.commit()
     return offer
 
@@ -178,6 +169,7 @@ def initiate_agreement(offer_id: int, requester_phone: str) -> Agreement:
     ag = Agreement(offer=offer, requester=requester, status="pending")
     offer.status = "matched"
     db.session.add(ag)
+    community_stats.bump(requester.community, total_agreements=1)
     db.session.commit()
     return ag
 
@@ -215,21 +207,19 @@ def transfer_bafoka(from_phone: str, to_phone: str, amount: int, idempotency_key
         raise ValueError("Insufficient balance")
 
     # create transaction record
-    tx = Transaction(tx_id=None, from_user_id=from_user.id, to_user_id=to_user.id, amount=amount, status="pending", _metadata=None, reverted=False)
+    tx = Transaction(tx_id=None, from_user_id=from_user.id, to_user_id=to_user.id, amount=amount, status="pending", reverted=False)
     db.session.add(tx)
     db.session.commit()
 
-    # optimistic local update
+    # optimistic local update (through the ledger: one debit + one credit entry)
     try:
-        from_user.bafoka_balance = (from_user.bafoka_balance or 0) - amount
-        to_user.bafoka_balance = (to_user.bafoka_balance or 0) + amount
-        db.session.add(from_user)
-        db.session.add(to_user)
+        ledger.post_transfer(tx, from_user, to_user, amount)
+        community_stats.bump(from_user.community, total_transactions=1, total_volume=amount)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         tx.status = "failed"
-        tx._metadata = f"local-update-failed: {str(e)}"
+        tx.set_meta(error_code="local_update_failed", failure_reason=str(e))
         db.session.add(tx)
         db.session.commit()
         raise
@@ -237,35 +227,86 @@ def transfer_bafoka(from_phone: str, to_phone: str, amount: int, idempotency_key
     # call external
     try:
         # API uses phone numbers, not wallet IDs
-        resp = bafoka_transfer(from_user.phone, to_user.phone, amount)
+        try:
+            resp = bafoka_transfer(from_user.phone, to_user.phone, amount)
+        finally:
+            # whatever happened upstream, cached balances for both sides are suspect
+            invalidate_balance(from_user.phone, to_user.phone)
         external_tx_id = resp.get("tx_id") or resp.get("id") or resp.get("transaction_id")
         status = resp.get("status", "pending")
         tx.tx_id = external_tx_id
         tx.status = status
-        tx._metadata = str(resp)
+        tx.set_meta(
+            external_id=external_tx_id,
+            external_status=status,
+            sender_balance=resp.get("senderBalance"),
+            receiver_balance=resp.get("receiverBalance"),
+            provider=resp,
+        )
         db.session.add(tx)
         db.session.commit()
         return {"tx_id": tx.tx_id, "status": tx.status}
     except Exception as e:
         # revert local balances
         try:
-            from_user.bafoka_balance = (from_user.bafoka_balance or 0) + amount
-            to_user.bafoka_balance = (to_user.bafoka_balance or 0) - amount
-            db.session.add(from_user)
-            db.session.add(to_user)
+            ledger.post_revert(tx, from_user, to_user, amount)
+            community_stats.bump(from_user.community, total_transactions=-1, total_volume=-amount)
+            tx.reverted = True
             tx.status = "failed"
-            tx._metadata = f"external-transfer-failed: {str(e)}"
+            tx.set_meta(error_code="external_transfer_failed", failure_reason=str(e))
             db.session.add(tx)
             db.session.commit()
         except Exception:
             db.session.rollback()
             tx.status = "failed"
-            tx._metadata = f"external-transfer-failed-and-revert_failed: {str(e)}"
+            tx.set_meta(error_code="external_transfer_failed_revert_failed", failure_reason=str(e))
             db.session.add(tx)
             db.session.commit()
         raise
 
 
+FAILURE_STATES = {"failed", "rejected", "cancelled", "error"}
+SUCCESS_STATES = {"success", "confirmed", "completed"}
+
+# SQLite caps bound parameters per statement (999 on older builds)
+_IN_CHUNK = 500
+
+
+def _apply_external_status(tx: Transaction, new_status: str, metadata: Optional[dict], from_user: Optional[User], to_user: Optional[User]) -> Dict:
+    """
+    Apply one provider status update to a loaded Transaction without committing.
+    Reverts local optimistic changes on failure (once) and marks success otherwise.
+    """
+    if tx.status == new_status:
+        return {"ok": True, "status": tx.status}
+
+    lower_status = (new_status or "").lower()
+    action = None
+    if lower_status in FAILURE_STATES and not tx.reverted:
+        ledger.post_revert(tx, from_user, to_user, tx.amount)
+        party = from_user or to_user
+        community_stats.bump(party.community if party else None, total_transactions=-1, total_volume=-tx.amount)
+        tx.reverted = True
+        action = "reverted"
+    elif lower_status in SUCCESS_STATES:
+        action = "confirmed"
+
+    tx.status = new_status
+    invalidate_balance(*(u.phone for u in (from_user, to_user) if u))
+    meta = {"external_status": new_status}
+    if metadata:
+        meta["provider"] = metadata
+        meta["error_code"] = metadata.get("error_code") or metadata.get("errorCode")
+        if lower_status in FAILURE_STATES:
+            meta["failure_reason"] = metadata.get("reason") or metadata.get("message")
+    tx.set_meta(**meta)
+    db.session.add(tx)
+    res = {"ok": True, "status": tx.status}
+    if action:
+        res["action"] = action
+    return res
+
+
 def adjust_balances_on_external_update(tx_id: str, new_status: str, metadata: dict = None) -> Dict:
     """
     Called by webhook to reconcile transaction state reported by external Bafoka API.
@@ -279,44 +320,181 @@ def adjust_balances_on_external_update(tx_id: str, new_status: str, metadata: di
     if tx.status == new_status:
         return {"ok": True, "status": tx.status}
 
-    failure_states = {"failed", "rejected", "cancelled", "error"}
-    success_states = {"success", "confirmed", "completed"}
-
     from_user = User.query.get(tx.from_user_id) if tx.from_user_id else None
     to_user = User.query.get(tx.to_user_id) if tx.to_user_id else None
 
-    lower_status = (new_status or "").lower()
+    try:
+        res = _apply_external_status(tx, new_status, metadata, from_user, to_user)
+        db.session.commit()
+        return res
+    except Exception as e:
+        db.session.rollback()
+        return {"ok": False, "error": f"revert_failed: {str(e)}"}
 
-    if lower_status in failure_states and not tx.reverted:
-        try:
-            if from_user:
-                from_user.bafoka_balance = (from_user.bafoka_balance or 0) + tx.amount
-                db.session.add(from_user)
-            if to_user:
-                to_user.bafoka_balance = (to_user.bafoka_balance or 0) - tx.amount
-                db.session.add(to_user)
-            tx.reverted = True
-            tx.status = new_status
-            tx._metadata = str(metadata) if metadata else tx._metadata
-            db.session.add(tx)
-            db.session.commit()
-            return {"ok": True, "action": "reverted", "status": tx.status}
-        except Exception as e:
-            db.session.rollback()
-            return {"ok": False, "error": f"revert_failed: {str(e)}"}
 
-    if lower_status in success_states:
-        tx.status = new_status
-        tx._metadata = str(metadata) if metadata else tx._metadata
-        db.session.add(tx)
+def adjust_balances_on_external_updates(updates: List[Dict]) -> List[Dict]:
+    """
+    Batch variant of adjust_balances_on_external_update for settlement bursts.
+    `updates` is a list of {"tx_id", "status", "metadata"} dicts, applied in order.
+    Transactions and their users are loaded with one IN (...) query each and
+    everything is written in a single commit; updates whose status is already
+    applied are skipped without touching the session.
+    Returns one result dict per update (same order), each carrying its tx_id.
+    """
+    tx_ids = list({u["tx_id"] for u in updates if u.get("tx_id")})
+    txs = {}
+    for i in range(0, len(tx_ids), _IN_CHUNK):
+        for tx in Transaction.query.filter(Transaction.tx_id.in_(tx_ids[i:i + _IN_CHUNK])).all():
+            txs.setdefault(tx.tx_id, tx)
+
+    user_ids = list({uid for tx in txs.values() for uid in (tx.from_user_id, tx.to_user_id) if uid})
+    users = {}
+    for i in range(0, len(user_ids), _IN_CHUNK):
+        users.update({u.id: u for u in User.query.filter(User.id.in_(user_ids[i:i + _IN_CHUNK])).all()})
+
+    results = []
+    try:
+        for u in updates:
+            tx_id, status = u.get("tx_id"), u.get("status")
+            if not tx_id or not status:
+                results.append({"tx_id": tx_id, "ok": False, "reason": "missing tx_id or status"})
+                continue
+            tx = txs.get(tx_id)
+            if not tx:
+                results.append({"tx_id": tx_id, "ok": False, "reason": "tx not found"})
+                continue
+            if tx.status == status:
+                results.append({"tx_id": tx_id, "ok": True, "action": "skipped", "status": tx.status})
+                continue
+            res = _apply_external_status(tx, status, u.get("metadata"), users.get(tx.from_user_id), users.get(tx.to_user_id))
+            results.append({"tx_id": tx_id, **res})
         db.session.commit()
-        return {"ok": True, "action": "confirmed", "status": tx.status}
+    except Exception as e:
+        db.session.rollback()
+        LOG.exception("Batch webhook update failed: %s", e)
+        return [{"tx_id": u.get("tx_id"), "ok": False, "error": f"batch_failed: {str(e)}"} for u in updates]
+    return results
 
-    tx.status = new_status
-    tx._metadata = str(metadata) if metadata else tx._metadata
-    db.session.add(tx)
-    db.session.commit()
-    return {"ok": True, "status": tx.status}
+
+def _encode_cursor(tx: Transaction) -> str:
+    raw = f"{tx.created_at.isoformat()}|{tx.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, tx_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created), int(tx_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_transactions(phone: str, cursor: Optional[str] = None, limit: int = 20) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Keyset-paginated transfer history for a user, newest first.
+    Sent and received transfers are fetched with two queries that each walk
+    one (party, created_at) index, then merged; no OFFSET scans.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    user = get_user_by_phone(phone)
+    if not user:
+        raise ValueError("User not found")
+    limit = max(1, min(int(limit), 100))
+
+    def _page(column):
+        q = Transaction.query.filter(column == user.id)
+        if cursor:
+            created, tx_pk = _decode_cursor(cursor)
+            q = q.filter(db.or_(
+                Transaction.created_at < created,
+                db.and_(Transaction.created_at == created, Transaction.id < tx_pk),
+            ))
+        return q.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(limit + 1).all()
+
+    merged = {t.id: t for t in _page(Transaction.from_user_id) + _page(Transaction.to_user_id)}
+    txs = sorted(merged.values(), key=lambda t: (t.created_at, t.id), reverse=True)
+    page, has_more = txs[:limit], len(txs) > limit
+
+    # one query for all counterparties on the page
+    other_ids = {t.to_user_id if t.from_user_id == user.id else t.from_user_id for t in page} - {None}
+    phones = dict(db.session.query(User.id, User.phone).filter(User.id.in_(other_ids)).all()) if other_ids else {}
+
+    rows = []
+    for t in page:
+        outgoing = t.from_user_id == user.id
+        other_id = t.to_user_id if outgoing else t.from_user_id
+        rows.append({
+            "id": t.id,
+            "tx_id": t.tx_id,
+            "direction": "out" if outgoing else "in",
+            "counterparty": phones.get(other_id),
+            "amount": t.amount,
+            "status": t.status,
+            "created_at": t.created_at.isoformat(),
+        })
+    return rows, (_encode_cursor(page[-1]) if has_more else None)
+
+
+def find_transactions(external_status: Optional[str] = None, error_code: Optional[str] = None, limit: int = 100) -> List[Transaction]:
+    """Ops lookup by provider status and/or error code (both are indexed generated columns)."""
+    query = Transaction.query
+    if external_status:
+        query = query.filter(Transaction.external_status == external_status)
+    if error_code:
+        query = query.filter(Transaction.error_code == error_code)
+    return query.order_by(Transaction.id.desc()).limit(limit).all()
+
+
+# Legacy _metadata text -> meta. Rows written before meta_json existed held
+# either an error prefix or the str() of the provider payload, optionally
+# followed by " | user_deleted".
+_LEGACY_ERROR_PREFIXES = (
+    ("external-transfer-failed-and-revert_failed: ", "external_transfer_failed_revert_failed"),
+    ("external-transfer-failed: ", "external_transfer_failed"),
+    ("local-update-failed: ", "local_update_failed"),
+)
+
+
+def legacy_meta(tx: Transaction) -> Dict:
+    """set_meta() fields recovered from a row's legacy _metadata text."""
+    text = tx._metadata or ""
+    meta: Dict = {}
+    if text.endswith("| user_deleted"):
+        meta["user_deleted"] = True
+        text = text[:-len("| user_deleted")].rstrip()
+    if not text:
+        return meta
+    for prefix, code in _LEGACY_ERROR_PREFIXES:
+        if text.startswith(prefix):
+            meta.update(error_code=code, failure_reason=text[len(prefix):])
+            return meta
+    try:
+        payload = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        payload = None
+    if not isinstance(payload, dict):
+        meta["provider"] = text  # unrecognised: keep it verbatim
+        return meta
+    meta.update(
+        provider=payload,
+        external_id=tx.tx_id,
+        external_status=tx.status,
+        sender_balance=payload.get("senderBalance"),
+        receiver_balance=payload.get("receiverBalance"),
+        error_code=payload.get("error_code") or payload.get("errorCode"),
+    )
+    if (tx.status or "").lower() in FAILURE_STATES:
+        meta["failure_reason"] = payload.get("reason") or payload.get("message")
+    return meta
+
+
+def backfill_legacy_metadata() -> int:
+    """Fill meta from _metadata for rows that predate meta_json, so ops filters see them. Does not commit."""
+    rows = Transaction.query.filter(Transaction.meta.is_(None), Transaction._metadata.isnot(None)).all()
+    for tx in rows:
+        tx.set_meta(**legacy_meta(tx))  # always leaves a dict, so the row is not picked up again
+    return len(rows)
 
 
 # Account deletion
@@ -333,13 +511,21 @@ def delete_user(phone: str) -> Tuple[bool, str]:
 
     try:
         # Remove agreements where user is requester
-        Agreement.query.filter_by(requester_id=user.id).delete(synchronize_session=False)
+        removed_agreements = Agreement.query.filter_by(requester_id=user.id).delete(synchronize_session=False)
 
         # Delete offers owned by user (and cascade to their agreements)
         owned_offers = Offer.query.filter_by(owner_id=user.id).all()
         for off in owned_offers:
+            removed_agreements += len(off.agreements)
             db.session.delete(off)
 
+        community_stats.bump(
+            user.community,
+            total_members=-1,
+            total_offers=-len(owned_offers),
+            total_agreements=-removed_agreements,
+        )
+
         # Nullify transactions
         txs = (
             Transaction.query
@@ -351,9 +537,15 @@ def delete_user(phone: str) -> Tuple[bool, str]:
                 t.from_user_id = None
             if t.to_user_id == user.id:
                 t.to_user_id = None
-            t._metadata = (t._metadata or "") + " | user_deleted"
+            t.set_meta(user_deleted=True)
             db.session.add(t)
 
+        # Drop any queued wallet provisioning
+        WalletJob.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+
+        # Anonymise ledger history (entries are append-only, never deleted)
+        ledger.forget_user(user.id)
+
         # Finally delete user
         db.session.delete(user)
         db.session.commit()
@@ -2,6 +2,8 @@
 # Real Bafoka API client for dev backend
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, Optional
 
 BAFOKA_BASE_URL = os.getenv("BAFOKA_BASE_URL", "https://sandbox.bafoka.network")
@@ -9,6 +11,18 @@ BAFOKA_API_PREFIX = os.getenv("BAFOKA_API_PREFIX", "/api")
 API_BASE = BAFOKA_BASE_URL.rstrip("/") + BAFOKA_API_PREFIX
 
 DEFAULT_TIMEOUT = float(os.getenv("BAFOKA_TIMEOUT", "15"))
+CONNECT_TIMEOUT = float(os.getenv("BAFOKA_CONNECT_TIMEOUT", "3.05"))
+TIMEOUT = (CONNECT_TIMEOUT, DEFAULT_TIMEOUT)
+POOL_SIZE = int(os.getenv("BAFOKA_POOL_SIZE", "10"))
+
+# One keep-alive session for the whole process. Only GETs are retried;
+# register/products/purchase POSTs must not be replayed.
+_session = requests.Session()
+_session.mount(BAFOKA_BASE_URL.rstrip("/") + "/", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=POOL_SIZE,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), raise_on_status=False),
+))
 
 
 def _headers(token: Optional[str] = None) -> Dict[str, str]:
@@ -20,21 +34,21 @@ def _headers(token: Optional[str] = None) -> Dict[str, str]:
 
 def register_user(payload: Dict[str, Any]) -> Dict[str, Any]:
     url = f"{API_BASE}/register"
-    r = requests.post(url, json=payload, headers=_headers(), timeout=DEFAULT_TIMEOUT)
+    r = _session.post(url, json=payload, headers=_headers(), timeout=TIMEOUT)
     r.raise_for_status()
     return r.json()
 
 
 def get_user_balance(token: str) -> Dict[str, Any]:
     url = f"{API_BASE}/user/balance"
-    r = requests.get(url, headers=_headers(token), timeout=DEFAULT_TIMEOUT)
+    r = _session.get(url, headers=_headers(token), timeout=TIMEOUT)
     r.raise_for_status()
     return r.json()
 
 
 def list_products(token: Optional[str] = None) -> Any:
     url = f"{API_BASE}/products"
-    r = requests.get(url, headers=_headers(token), timeout=DEFAULT_TIMEOUT)
+    r = _session.get(url, headers=_headers(token), timeout=TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -42,7 +56,7 @@ def list_products(token: Optional[str] = None) -> Any:
 def create_product(token: str, name: str, description: str, price: float) -> Dict[str, Any]:
     url = f"{API_BASE}/products"
     payload = {"name": name, "description": description, "price": price}
-    r = requests.post(url, json=payload, headers=_headers(token), timeout=DEFAULT_TIMEOUT)
+    r = _session.post(url, json=payload, headers=_headers(token), timeout=TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -52,14 +66,14 @@ def purchase(token: str, seller_id: int, amount: int, description: Optional[str]
     payload = {"seller_id": seller_id, "amount": int(amount)}
     if description:
         payload["description"] = description
-    r = requests.post(url, json=payload, headers=_headers(token), timeout=DEFAULT_TIMEOUT)
+    r = _session.post(url, json=payload, headers=_headers(token), timeout=TIMEOUT)
     r.raise_for_status()
     return r.json()
 
 
 def list_transactions(token: str) -> Any:
     url = f"{API_BASE}/transaction"
-    r = requests.get(url, headers=_headers(token), timeout=DEFAULT_TIMEOUT)
+    r = _session.get(url, headers=_headers(token), timeout=TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -92,6 +92,11 @@ def create_app():
                 cols2 = {row[1] for row in info2}
                 if "remote_product_id" not in cols2:
                     db.session.execute(text("ALTER TABLE offers ADD COLUMN remote_product_id INTEGER"))
+                # transactions table
+                info3 = db.session.execute(text("PRAGMA table_info('bafoka_transactions')")).fetchall()
+                cols3 = {row[1] for row in info3}
+                if "meta_json" not in cols3:
+                    db.session.execute(text("ALTER TABLE bafoka_transactions ADD COLUMN meta_json JSON"))
                 db.session.commit()
         except Exception as e:
             LOG.warning("SQLite auto-migrate skipped/failed: %s", e)
@@ -370,12 +375,15 @@ def create_app():
             return jsonify({"error": "user not found"}), 404
         local = user.bafoka_balance
         external = None
+        cached = None
         if user.auth_token and bafoka_get_balance:
             try:
-                external = bafoka_get_balance(user.auth_token).get("balance")
+                ext = bafoka_get_balance(user.auth_token)
+                external = ext.get("balance")
+                cached = ext.get("cached")
             except Exception:
                 external = None
-        return jsonify({"phone": user.phone, "local_balance": local, "external_balance": external, "currency_name": user.bafoka_local_name or "Bafoka"})
+        return jsonify({"phone": user.phone, "local_balance": local, "external_balance": external, "external_balance_cached": cached, "currency_name": user.bafoka_local_name or "Bafoka"})
 
     @app.route("/api/bafoka/webhook", methods=["POST"])
     def api_bafoka_webhook():
@@ -1,7 +1,64 @@
 # dev/bafoka_client.py
 # Thin wrapper to mirror bot.bafoka_client.get_balance interface in dev
+import os
+import threading
+import time
 from . import api_client
 
-def get_balance(token: str) -> dict:
+# Short TTL cache keyed by auth token (same idea as bot.bafoka_client): fresh
+# within the TTL, served stale while a background refresh runs up to the stale
+# limit. A per-token generation stops a fetch that raced with
+# invalidate_balance() from storing its pre-transfer answer.
+BALANCE_TTL_SECONDS = float(os.getenv("BAFOKA_BALANCE_TTL_SECONDS", "15"))
+BALANCE_STALE_SECONDS = float(os.getenv("BAFOKA_BALANCE_STALE_SECONDS", "300"))
+
+_balances = {}
+_balance_gen = {}
+_refreshing = set()
+_lock = threading.Lock()
+
+def _load_balance(token: str) -> dict:
+    with _lock:
+        gen = _balance_gen.get(token, 0)
     # Real API requires token, not wallet id
-    return api_client.get_user_balance(token)
+    response = api_client.get_user_balance(token)
+    with _lock:
+        if _balance_gen.get(token, 0) == gen:
+            _balances[token] = (time.time(), response)
+    return response
+
+def _refresh_async(token: str) -> None:
+    with _lock:
+        if token in _refreshing:
+            return
+        _refreshing.add(token)
+
+    def _run():
+        try:
+            _load_balance(token)
+        except Exception:
+            pass  # the stale value stays until the next read retries
+        finally:
+            with _lock:
+                _refreshing.discard(token)
+
+    threading.Thread(target=_run, name="dev-balance-refresh", daemon=True).start()
+
+def get_balance(token: str) -> dict:
+    with _lock:
+        entry = _balances.get(token)
+    if entry:
+        age = time.time() - entry[0]
+        if age <= BALANCE_TTL_SECONDS:
+            return dict(entry[1], cached=True)
+        if age <= BALANCE_STALE_SECONDS:
+            _refresh_async(token)
+            return dict(entry[1], cached=True)
+    return dict(_load_balance(token), cached=False)
+
+def invalidate_balance(*tokens: str) -> None:
+    with _lock:
+        for token in tokens:
+            if token:
+                _balances.pop(token, None)
+                _balance_gen[token] = _balance_gen.get(token, 0) + 1
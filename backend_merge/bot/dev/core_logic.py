@@ -6,6 +6,7 @@ from .models import User, Offer, Agreement, Transaction
 import logging
 import uuid
 from . import api_client
+from . import bafoka_client
 import re
 
 LOG = logging.getLogger("dev_core_logic")
@@ -224,7 +225,7 @@ def transfer_bafoka(from_phone: str, to_phone: str, amount: int, idempotency_key
         raise ValueError("Insufficient balance")
 
     # create transaction record
-    tx = Transaction(tx_id=None, from_user_id=from_user.id, to_user_id=to_user.id, amount=amount, status="pending", _metadata=None, reverted=False)
+    tx = Transaction(tx_id=None, from_user_id=from_user.id, to_user_id=to_user.id, amount=amount, status="pending", reverted=False)
     db.session.add(tx)
     db.session.commit()
 
@@ -238,19 +239,22 @@ def transfer_bafoka(from_phone: str, to_phone: str, amount: int, idempotency_key
     except Exception as e:
         db.session.rollback()
         tx.status = "failed"
-        tx._metadata = f"local-update-failed: {str(e)}"
+        tx.set_meta(error_code="local_update_failed", failure_reason=str(e))
         db.session.add(tx)
         db.session.commit()
         raise
 
     # call real API purchase
     try:
-        resp = api_client.purchase(from_user.auth_token, seller_id=int(to_user.remote_user_id), amount=int(amount))
+        try:
+            resp = api_client.purchase(from_user.auth_token, seller_id=int(to_user.remote_user_id), amount=int(amount))
+        finally:
+            bafoka_client.invalidate_balance(from_user.auth_token, to_user.auth_token)
         external_tx_id = resp.get("id") or resp.get("tx_id") or resp.get("transaction_id")
         status = resp.get("status", "pending")
         tx.tx_id = external_tx_id
         tx.status = status
-        tx._metadata = str(resp)
+        tx.set_meta(external_id=external_tx_id, external_status=status, provider=resp)
         db.session.add(tx)
         db.session.commit()
         return {"tx_id": tx.tx_id, "status": tx.status}
@@ -262,18 +266,28 @@ def transfer_bafoka(from_phone: str, to_phone: str, amount: int, idempotency_key
             db.session.add(from_user)
             db.session.add(to_user)
             tx.status = "failed"
-            tx._metadata = f"external-transfer-failed: {str(e)}"
+            tx.set_meta(error_code="external_transfer_failed", failure_reason=str(e))
             db.session.add(tx)
             db.session.commit()
         except Exception:
             db.session.rollback()
             tx.status = "failed"
-            tx._metadata = f"external-transfer-failed-and-revert_failed: {str(e)}"
+            tx.set_meta(error_code="external_transfer_failed_revert_failed", failure_reason=str(e))
             db.session.add(tx)
             db.session.commit()
         raise
 
 
+def _record_external_status(tx: Transaction, new_status: str, metadata: Optional[dict]) -> None:
+    meta = {"external_status": new_status}
+    if metadata:
+        meta["provider"] = metadata
+        meta["error_code"] = metadata.get("error_code") or metadata.get("errorCode")
+        if (new_status or "").lower() in {"failed", "rejected", "cancelled", "error"}:
+            meta["failure_reason"] = metadata.get("reason") or metadata.get("message")
+    tx.set_meta(**meta)
+
+
 def adjust_balances_on_external_update(tx_id: str, new_status: str, metadata: dict = None) -> Dict:
     tx = Transaction.query.filter_by(tx_id=tx_id).first()
     if not tx:
@@ -287,6 +301,8 @@ def adjust_balances_on_external_update(tx_id: str, new_status: str, metadata: di
 
     from_user = User.query.get(tx.from_user_id) if tx.from_user_id else None
     to_user = User.query.get(tx.to_user_id) if tx.to_user_id else None
+    # the upstream balance just changed (settled or refunded): drop cached copies
+    bafoka_client.invalidate_balance(*[u.auth_token for u in (from_user, to_user) if u and u.auth_token])
 
     lower_status = (new_status or "").lower()
 
@@ -300,7 +316,7 @@ def adjust_balances_on_external_update(tx_id: str, new_status: str, metadata: di
                 db.session.add(to_user)
             tx.reverted = True
             tx.status = new_status
-            tx._metadata = str(metadata) if metadata else tx._metadata
+            _record_external_status(tx, new_status, metadata)
             db.session.add(tx)
             db.session.commit()
             return {"ok": True, "action": "reverted", "status": tx.status}
@@ -310,13 +326,13 @@ def adjust_balances_on_external_update(tx_id: str, new_status: str, metadata: di
 
     if lower_status in success_states:
         tx.status = new_status
-        tx._metadata = str(metadata) if metadata else tx._metadata
+        _record_external_status(tx, new_status, metadata)
         db.session.add(tx)
         db.session.commit()
         return {"ok": True, "action": "confirmed", "status": tx.status}
 
     tx.status = new_status
-    tx._metadata = str(metadata) if metadata else tx._metadata
+    _record_external_status(tx, new_status, metadata)
     db.session.add(tx)
     db.session.commit()
     return {"ok": True, "status": tx.status}
@@ -342,7 +358,7 @@ def delete_user(phone: str) -> Tuple[bool, str]:
                 t.from_user_id = None
             if t.to_user_id == user.id:
                 t.to_user_id = None
-            t._metadata = (t._metadata or "") + " | user_deleted"
+            t.set_meta(user_deleted=True)
             db.session.add(t)
         db.session.delete(user)
         db.session.commit()
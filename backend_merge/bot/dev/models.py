@@ -74,10 +74,30 @@ class Transaction(db.Model):
     to_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
     amount = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(50), default="pending")
+    # Legacy free-text metadata (str(resp) reprs); kept for old rows, no longer written
     _metadata = db.Column(db.Text, nullable=True)
+    # Structured metadata, same keys as bot.models.Transaction; write through set_meta()
+    meta = db.Column("meta_json", db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     reverted = db.Column(db.Boolean, default=False, nullable=False)
 
     from_user = db.relationship("User", foreign_keys=[from_user_id])
     to_user = db.relationship("User", foreign_keys=[to_user_id])
+
+    META_FIELDS = (
+        "external_id", "external_status", "error_code", "failure_reason",
+        "sender_balance", "receiver_balance", "user_deleted", "provider",
+    )
+
+    def set_meta(self, **fields):
+        """Merge fields into `meta` (None values are ignored). Reassigns so the change is tracked."""
+        unknown = set(fields) - set(self.META_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown transaction metadata fields: {sorted(unknown)}")
+        merged = dict(self.meta or {})
+        merged.update({k: v for k, v in fields.items() if v is not None})
+        self.meta = merged
+
+    def get_meta(self, key: str, default=None):
+        return (self.meta or {}).get(key, default)
@@ -3,32 +3,137 @@
 Fake Bafoka API Server - EXACT MATCH with Real Bafoka Sandbox API
 All endpoints, field names, and response structures match the Swagger documentation
 Source: https://sandbox.bafoka.network/webjars/swagger-ui/index.html
+
+Storage: FAKE_BAFOKA_DB is a SQLite file (WAL, survives restarts; default
+bot/instance/fake_bafoka.db) or "memory" for a throwaway in-process store.
+Latency/fault profiles: FAKE_BAFOKA_FAULTS or /admin/faults (see fake_bafoka_faults.py).
+Settlement: FAKE_BAFOKA_SETTLEMENT=pending answers transfers "pending" and
+settles them later with a webhook callback (see fake_bafoka_callbacks.py).
+State snapshots / synthetic populations: /admin/snapshot, /admin/populate
+(see fake_bafoka_snapshot.py).
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import io
+import os
+import time
 import uuid
 from datetime import datetime
 
+try:
+    from .fake_bafoka_store import GROUPEMENT_MAP, open_store
+    from .fake_bafoka_faults import FaultInjector, load_profiles
+    from .fake_bafoka_callbacks import CallbackEmitter, parse_delay
+    from .fake_bafoka_snapshot import dump, generate_population, load
+except ImportError:
+    from bot.fake_bafoka_store import GROUPEMENT_MAP, open_store
+    from bot.fake_bafoka_faults import FaultInjector, load_profiles
+    from bot.fake_bafoka_callbacks import CallbackEmitter, parse_delay
+    from bot.fake_bafoka_snapshot import dump, generate_population, load
+
 app = Flask(__name__)
 
-# In-memory storage
-ACCOUNTS = {}  # phone -> account data
-TRANSACTIONS = {}  # tx_id -> transaction data
+STORE = open_store(os.getenv(
+    "FAKE_BAFOKA_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "fake_bafoka.db"),
+))
 
-# Groupement mapping (from real API /api/groupements)
-GROUPEMENT_MAP = {
-    1: ("Batoufam", "MBIP TSWEFAP"),
-    2: ("Fondjomekwet", "MBAM"),
-    3: ("Bameka", "MUNKAP")
-}
+FAULTS = FaultInjector(
+    load_profiles(os.getenv("FAKE_BAFOKA_FAULTS")),
+    seed=int(os.environ["FAKE_BAFOKA_FAULTS_SEED"]) if os.getenv("FAKE_BAFOKA_FAULTS_SEED") else None,
+)
 
-@app.route("/api/account-creation", methods=["POST"])
-def create_account():
+@app.before_request
+def inject_faults():
+    """Apply the active latency/fault profile to /api/* calls (never to /admin/*)."""
+    if not request.path.startswith("/api/"):
+        return None
+    delay, override = FAULTS.decide(request.path)
+    if delay:
+        time.sleep(delay)
+    if override:
+        status, body = override
+        resp = jsonify(body)
+        if status == 429:
+            resp.headers["Retry-After"] = "1"
+        return resp, status
+    return None
+
+@app.route("/admin/faults", methods=["GET", "PUT", "DELETE"])
+def admin_faults():
+    """Read, replace (PUT JSON body) or clear the fault profiles."""
+    if request.method == "PUT":
+        try:
+            FAULTS.set_profiles(request.get_json(force=True) or {})
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({"error": str(e)}), 400
+    elif request.method == "DELETE":
+        FAULTS.set_profiles({})
+    return jsonify({"profiles": FAULTS.profiles}), 200
+
+SETTLEMENT_MODE = os.getenv("FAKE_BAFOKA_SETTLEMENT", "instant").lower()
+CALLBACKS = CallbackEmitter.from_env(lambda tx_id, status, ok: STORE.settle(tx_id, status, ok))
+
+@app.route("/admin/settlement", methods=["GET", "PUT"])
+def admin_settlement():
+    """Settlement mode and callback emitter settings (PUT any of: mode, url, delay, failure_ratio, duplicate_ratio, reorder)."""
+    global SETTLEMENT_MODE
+    if request.method == "PUT":
+        data = request.get_json(force=True) or {}
+        try:
+            if "mode" in data:
+                if data["mode"] not in ("instant", "pending"):
+                    raise ValueError("mode must be instant or pending")
+                SETTLEMENT_MODE = data["mode"]
+            if "url" in data:
+                CALLBACKS.url = data["url"]
+            if "delay" in data:
+                CALLBACKS.delay = parse_delay(",".join(map(str, data["delay"])) if isinstance(data["delay"], list) else data["delay"])
+            for key in ("failure_ratio", "duplicate_ratio"):
+                if key in data:
+                    setattr(CALLBACKS, key, float(data[key]))
+            if "reorder" in data:
+                CALLBACKS.reorder = bool(data["reorder"])
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify({"mode": SETTLEMENT_MODE, "callbacks": CALLBACKS.config(), "stats": dict(CALLBACKS.stats, queued=CALLBACKS.pending())}), 200
+
+@app.route("/admin/snapshot", methods=["GET", "PUT"])
+def admin_snapshot():
+    """GET downloads the whole state as a gzipped snapshot; PUT (snapshot as body) replaces it."""
+    if request.method == "PUT":
+        try:
+            accounts, transactions = load(STORE, io.BytesIO(request.get_data()))
+        except (OSError, EOFError, ValueError, KeyError) as e:
+            return jsonify({"error": f"bad snapshot: {e}"}), 400
+        return jsonify({"accounts": accounts, "transactions": transactions}), 200
+
+    buf = io.BytesIO()
+    accounts, transactions = dump(STORE, buf)
+    resp = Response(buf.getvalue(), mimetype="application/gzip")
+    resp.headers["Content-Disposition"] = "attachment; filename=fake_bafoka.jsonl.gz"
+    resp.headers["X-Accounts"] = str(accounts)
+    resp.headers["X-Transactions"] = str(transactions)
+    return resp
+
+@app.route("/admin/populate", methods=["POST"])
+def admin_populate():
+    """Replace the state with per_groupement synthetic accounts (JSON: per_groupement, balance, seed)."""
+    data = request.get_json(force=True) or {}
+    try:
+        accounts = list(generate_population(
+            GROUPEMENT_MAP, int(data.get("per_groupement", 100)), data.get("balance", "fixed:1000"), data.get("seed")
+        ))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    accounts, transactions = STORE.replace_all(accounts, [])
+    return jsonify({"accounts": accounts, "transactions": transactions}), 200
+
+def _create_account(data: dict):
     """
     Create user account
     EXACT MATCH with real API: POST /api/account-creation
     Schema: AccountCreationRequest
     """
-    data = request.get_json() or {}
     phone = data.get("phoneNumber")
     full_name = data.get("fullName", "")
     age = str(data.get("age", "25"))  # STRING (real API requirement)
@@ -37,30 +142,30 @@ def create_account():
     blockchain_address = data.get("blockchainAddress", "")
     
     if not phone:
-        return jsonify({
+        return {
             "code": 400,
             "message": "phoneNumber is required",
             "data": None,
             "success": False
-        }), 400
+        }, 400
     
     # Check if account already exists
-    if phone in ACCOUNTS:
-        return jsonify({
+    if STORE.has_account(phone):
+        return {
             "code": 400,
             "message": "Phone number already used",
             "data": None,
             "success": False
-        }), 400
+        }, 400
     
     # Validate groupement_id
     if groupement_id not in GROUPEMENT_MAP:
-        return jsonify({
+        return {
             "code": 400,
             "message": "Groupement doesn't exist",
             "data": None,
             "success": False
-        }), 400
+        }, 400
     
     groupement_name, currency = GROUPEMENT_MAP[groupement_id]
     
@@ -70,7 +175,7 @@ def create_account():
     
     account_id = str(uuid.uuid4())
     
-    ACCOUNTS[phone] = {
+    account = {
         "id": account_id,
         "phoneNumber": phone,
         "fullName": full_name,
@@ -84,10 +189,18 @@ def create_account():
         "createdAt": datetime.utcnow().isoformat(),
         "status": "active"
     }
+    if not STORE.create_account(account):
+        # lost a race with a concurrent request for the same phone
+        return {
+            "code": 400,
+            "message": "Phone number already used",
+            "data": None,
+            "success": False
+        }, 400
     
     # Match real API response structure EXACTLY
     # Note: Real API returns success=False even on successful operations!
-    return jsonify({
+    return {
         "code": 200,
         "message": "Account created successfully",
         "data": {
@@ -99,37 +212,35 @@ def create_account():
             "groupement_id": groupement_id
         },
         "success": False  # Real API quirk - always False
-    }), 200
+    }, 200
 
-@app.route("/api/get-balance", methods=["POST"])
-def get_balance():
+def _get_balance(data: dict):
     """
     Get wallet balance
     EXACT MATCH with real API: POST /api/get-balance
     Schema: AccountCreationRequest (yes, uses full schema!)
     """
-    data = request.get_json() or {}
     phone = data.get("phoneNumber")
     
     if not phone:
-        return jsonify({
+        return {
             "code": 400,
             "message": "phoneNumber is required",
             "data": None,
             "success": False
-        }), 400
+        }, 400
     
-    account = ACCOUNTS.get(phone)
+    account = STORE.get_account(phone)
     if not account:
-        return jsonify({
+        return {
             "code": 400,
             "message": "Account not found",
             "data": None,
             "success": False
-        }), 400
+        }, 400
     
     # Match real API response structure
-    return jsonify({
+    return {
         "code": 200,
         "message": "Balance retrieved successfully",
         "data": {
@@ -140,53 +251,45 @@ def get_balance():
             "blockchainAddress": account.get("blockchainAddress", "")
         },
         "success": False  # Real API quirk
-    }), 200
+    }, 200
 
-@app.route("/api/initiate-transaction", methods=["POST"])
-def initiate_transaction():
+def _initiate_transaction(data: dict):
     """
     Transfer between accounts
     NOT IN REAL API - This is why fake API is required!
     """
-    data = request.get_json() or {}
     sender_phone = data.get("senderPhoneNumber")
     receiver_phone = data.get("receiverPhoneNumber")
     amount = data.get("amount")
     
     # Validation
     if not sender_phone or not receiver_phone or amount is None:
-        return jsonify({"error": "senderPhoneNumber, receiverPhoneNumber, and amount required"}), 400
+        return {"error": "senderPhoneNumber, receiverPhoneNumber, and amount required"}, 400
     
     try:
         amount = int(amount)
     except (ValueError, TypeError):
-        return jsonify({"error": "amount must be integer"}), 400
+        return {"error": "amount must be integer"}, 400
     
     if amount <= 0:
-        return jsonify({"error": "amount must be positive"}), 400
+        return {"error": "amount must be positive"}, 400
     
     # Check accounts exist
-    sender = ACCOUNTS.get(sender_phone)
-    receiver = ACCOUNTS.get(receiver_phone)
+    sender = STORE.get_account(sender_phone)
+    receiver = STORE.get_account(receiver_phone)
     
     if not sender:
-        return jsonify({"error": "Sender account not found"}), 404
+        return {"error": "Sender account not found"}, 404
     if not receiver:
-        return jsonify({"error": "Receiver account not found"}), 404
+        return {"error": "Receiver account not found"}, 404
     
     # Check same community
     if sender["groupement_id"] != receiver["groupement_id"]:
-        return jsonify({"error": "Transfers only within same community"}), 400
-    
-    # Check sufficient balance
-    if sender["balance"] < amount:
-        return jsonify({"error": "Insufficient balance"}), 400
-    
-    # Execute transaction
-    sender["balance"] -= amount
-    receiver["balance"] += amount
+        return {"error": "Transfers only within same community"}, 400
     
     # Create transaction record
+    pending = SETTLEMENT_MODE == "pending"
+    status = "pending" if pending else "completed"
     tx_id = f"TX-{uuid.uuid4().hex[:12].upper()}"
     transaction = {
         "tx_id": tx_id,
@@ -195,21 +298,105 @@ def initiate_transaction():
         "receiverPhoneNumber": receiver_phone,
         "amount": amount,
         "currency": sender["currency"],
-        "status": "completed",
+        "status": status,
         "timestamp": datetime.utcnow().isoformat(),
         "groupement_id": sender["groupement_id"]
     }
     
-    TRANSACTIONS[tx_id] = transaction
+    # Balance check + debit + credit + insert happen atomically in the store;
+    # pending transfers only hold the sender's funds until the callback worker settles them
+    ok, sender_balance, receiver_balance = STORE.transfer(transaction, settle=not pending)
+    if not ok:
+        return {"error": "Insufficient balance"}, 400
+    if pending:
+        CALLBACKS.schedule(tx_id)
     
-    return jsonify({
+    return {
         "success": True,
-        "message": "Transaction completed successfully",
+        "message": "Transaction pending settlement" if pending else "Transaction completed successfully",
         "tx_id": tx_id,
         "transaction_id": tx_id,
-        "status": "completed",
-        "senderBalance": sender["balance"],
-        "receiverBalance": receiver["balance"]
+        "status": status,
+        "senderBalance": sender_balance,
+        "receiverBalance": receiver_balance
+    }, 200
+
+@app.route("/api/account-creation", methods=["POST"])
+def create_account():
+    body, status = _create_account(request.get_json() or {})
+    return jsonify(body), status
+
+@app.route("/api/get-balance", methods=["POST"])
+def get_balance():
+    body, status = _get_balance(request.get_json() or {})
+    return jsonify(body), status
+
+@app.route("/api/initiate-transaction", methods=["POST"])
+def initiate_transaction():
+    body, status = _initiate_transaction(request.get_json() or {})
+    return jsonify(body), status
+
+# Batch variants (NOT IN REAL API): body is a list of the single-call
+# payloads, or {"items": [...]}; every item gets its own status and body.
+BATCH_MAX = int(os.getenv("FAKE_BAFOKA_BATCH_MAX", "1000"))
+
+def _batch(handler):
+    data = request.get_json(silent=True)
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({"error": "expected a JSON list or {\"items\": [...]}"}), 400
+    if len(items) > BATCH_MAX:
+        return jsonify({"error": f"at most {BATCH_MAX} items per batch"}), 413
+    results = []
+    for index, item in enumerate(items):
+        body, status = handler(item if isinstance(item, dict) else {})
+        results.append({"index": index, "status": status, "body": body})
+    ok = sum(1 for r in results if r["status"] < 400)
+    return jsonify({"results": results, "ok": ok, "failed": len(results) - ok}), 200
+
+@app.route("/api/batch/account-creation", methods=["POST"])
+def batch_create_account():
+    return _batch(_create_account)
+
+@app.route("/api/batch/get-balance", methods=["POST"])
+def batch_get_balance():
+    return _batch(_get_balance)
+
+@app.route("/api/batch/initiate-transaction", methods=["POST"])
+def batch_initiate_transaction():
+    return _batch(_initiate_transaction)
+
+PAGE_MAX = int(os.getenv("FAKE_BAFOKA_PAGE_MAX", "500"))
+
+@app.route("/api/transactions", methods=["GET"])
+def list_transactions():
+    """
+    Transaction history for one phone, newest first
+    NOT IN REAL API - paged with an opaque cursor (pass back nextCursor)
+    Query params: phoneNumber, cursor, limit (default 50)
+    """
+    phone = request.args.get("phoneNumber")
+    if not phone:
+        return jsonify({"code": 400, "message": "phoneNumber is required", "data": None, "success": False}), 400
+    try:
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+        limit = min(max(int(request.args.get("limit", 50)), 1), PAGE_MAX)
+    except ValueError:
+        return jsonify({"code": 400, "message": "cursor and limit must be integers", "data": None, "success": False}), 400
+    if not STORE.has_account(phone):
+        return jsonify({"code": 400, "message": "Account not found", "data": None, "success": False}), 400
+
+    transactions, next_cursor = STORE.list_transactions(phone, cursor, limit)
+    return jsonify({
+        "code": 200,
+        "message": "Transactions retrieved successfully",
+        "data": {
+            "phoneNumber": phone,
+            "transactions": transactions,
+            "nextCursor": str(next_cursor) if next_cursor is not None else None
+        },
+        "success": True
     }), 200
 
 @app.route("/api/groupements", methods=["GET"])
@@ -219,9 +406,7 @@ def list_groupements():
     EXACT MATCH with real API: GET /api/groupements
     """
     return jsonify([
-        {"id": 1, "name": "Batoufam"},
-        {"id": 2, "name": "Fondjomekwet"},
-        {"id": 3, "name": "Bameka"}
+        {"id": gid, "name": name} for gid, (name, _currency) in sorted(GROUPEMENT_MAP.items())
     ]), 200
 
 @app.route("/api/check-account", methods=["POST"])
@@ -234,7 +419,7 @@ def check_account():
     data = request.get_json() or {}
     phone = data.get("phoneNumber")
     
-    if phone and phone in ACCOUNTS:
+    if phone and STORE.has_account(phone):
         return "success", 200
     return "failed", 200
 
@@ -256,8 +441,8 @@ def recipient_info():
             "success": False
         }), 400
     
-    sender = ACCOUNTS.get(sender_phone)
-    recipient = ACCOUNTS.get(recipient_phone)
+    sender = STORE.get_account(sender_phone)
+    recipient = STORE.get_account(recipient_phone)
     
     if not recipient:
         return jsonify({
@@ -290,11 +475,13 @@ def recipient_info():
 @app.route("/api/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
+    accounts, transactions = STORE.counts()
     return jsonify({
         "status": "healthy",
         "service": "Fake Bafoka API - Exact Match",
-        "accounts": len(ACCOUNTS),
-        "transactions": len(TRANSACTIONS)
+        "store": STORE.kind,
+        "accounts": accounts,
+        "transactions": transactions
     }), 200
 
 @app.route("/", methods=["GET"])
@@ -311,7 +498,13 @@ def root():
             "groupements": "GET /api/groupements",
             "check_account": "POST /api/check-account",
             "recipient_info": "POST /api/recipient-info",
-            "health": "GET /api/health"
+            "transactions": "GET /api/transactions?phoneNumber=&cursor= (NOT IN REAL API)",
+            "batch": "POST /api/batch/{account-creation,get-balance,initiate-transaction} (NOT IN REAL API)",
+            "health": "GET /api/health",
+            "admin_faults": "GET|PUT|DELETE /admin/faults",
+            "admin_settlement": "GET|PUT /admin/settlement",
+            "admin_snapshot": "GET|PUT /admin/snapshot",
+            "admin_populate": "POST /admin/populate"
         }
     }), 200
 
@@ -0,0 +1,188 @@
+# fake_bafoka_callbacks.py
+"""
+Asynchronous settlement for the fake Bafoka server.
+
+With FAKE_BAFOKA_SETTLEMENT=pending, /api/initiate-transaction only puts the
+sender's funds on hold and answers "pending". A background worker later
+settles each transaction (credit the receiver, or refund the sender) and
+POSTs a status callback in the shape /api/bafoka/webhook expects:
+
+    {"data": {"tx_id": "...", "status": "completed" | "failed", "reason": "..."}}
+
+Env:
+- FAKE_BAFOKA_CALLBACK_URL (default: http://localhost:5000/api/bafoka/webhook)
+- FAKE_BAFOKA_CALLBACK_DELAY seconds, "fixed" or "min,max" (default: 1,5)
+- FAKE_BAFOKA_CALLBACK_FAILURE_RATIO share of transfers settled as failed (default: 0)
+- FAKE_BAFOKA_CALLBACK_DUPLICATE_RATIO share of callbacks delivered twice (default: 0)
+- FAKE_BAFOKA_CALLBACK_REORDER false keeps callbacks in initiation order (default: true)
+- FAKE_BAFOKA_CALLBACK_SEED makes the random draws reproducible
+Callbacks that cannot be delivered are retried with backoff, 5 attempts max.
+"""
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+
+LOG = logging.getLogger("fake_bafoka_callbacks")
+LOG.setLevel(logging.INFO)
+
+MAX_DELIVERY_ATTEMPTS = 5
+
+
+def parse_delay(raw: str) -> Tuple[float, float]:
+    parts = [float(p) for p in str(raw).split(",") if p.strip()]
+    if len(parts) == 1:
+        return parts[0], parts[0]
+    low, high = parts[:2]
+    return min(low, high), max(low, high)
+
+
+def _post(url: str, payload: Dict) -> None:
+    requests.post(url, json=payload, timeout=10).raise_for_status()
+
+
+class CallbackEmitter:
+    def __init__(
+        self,
+        settle: Callable[[str, str, bool], Optional[Dict]],
+        url: str,
+        delay: Tuple[float, float] = (1.0, 5.0),
+        failure_ratio: float = 0.0,
+        duplicate_ratio: float = 0.0,
+        reorder: bool = True,
+        seed: Optional[int] = None,
+        post: Callable[[str, Dict], None] = _post,
+        autostart: bool = True,
+    ):
+        self.settle = settle
+        self.url = url
+        self.delay = delay
+        self.failure_ratio = failure_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.reorder = reorder
+        self.post = post
+        self.autostart = autostart
+        self._rng = random.Random(seed)
+        self._queue = []  # heap of (due, seq, event)
+        self._seq = itertools.count()
+        self._last_due = 0.0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"scheduled": 0, "settled": 0, "failed_settlements": 0, "delivered": 0, "duplicates": 0, "delivery_errors": 0, "dropped": 0}
+
+    @classmethod
+    def from_env(cls, settle):
+        seed = os.getenv("FAKE_BAFOKA_CALLBACK_SEED")
+        return cls(
+            settle,
+            url=os.getenv("FAKE_BAFOKA_CALLBACK_URL", "http://localhost:5000/api/bafoka/webhook"),
+            delay=parse_delay(os.getenv("FAKE_BAFOKA_CALLBACK_DELAY", "1,5")),
+            failure_ratio=float(os.getenv("FAKE_BAFOKA_CALLBACK_FAILURE_RATIO", "0")),
+            duplicate_ratio=float(os.getenv("FAKE_BAFOKA_CALLBACK_DUPLICATE_RATIO", "0")),
+            reorder=os.getenv("FAKE_BAFOKA_CALLBACK_REORDER", "true").lower() == "true",
+            seed=int(seed) if seed else None,
+        )
+
+    def config(self) -> Dict:
+        return {
+            "url": self.url,
+            "delay": list(self.delay),
+            "failure_ratio": self.failure_ratio,
+            "duplicate_ratio": self.duplicate_ratio,
+            "reorder": self.reorder,
+        }
+
+    def _push(self, due: float, event: Dict) -> None:
+        heapq.heappush(self._queue, (due, next(self._seq), event))
+        self._cond.notify()
+
+    def schedule(self, tx_id: str, now: Optional[float] = None) -> None:
+        """Queue settlement + callback for a pending transaction."""
+        now = time.time() if now is None else now
+        with self._cond:
+            due = now + self._rng.uniform(*self.delay)
+            if not self.reorder:
+                due = max(due, self._last_due)
+                self._last_due = due
+            failed = self._rng.random() < self.failure_ratio
+            self._push(due, {"tx_id": tx_id, "failed": failed, "attempt": 0, "settle": True})
+            self.stats["scheduled"] += 1
+        self._ensure_worker()
+
+    def _pop_due(self, now: float) -> Optional[Dict]:
+        with self._cond:
+            if self._queue and self._queue[0][0] <= now:
+                return heapq.heappop(self._queue)[2]
+        return None
+
+    def _deliver(self, event: Dict, now: float) -> None:
+        if event["settle"]:
+            event["settle"] = False
+            status = "failed" if event["failed"] else "completed"
+            tx = self.settle(event["tx_id"], status, not event["failed"])
+            if tx is None:
+                self.stats["dropped"] += 1  # not pending any more (restored snapshot, manual fix)
+                return
+            self.stats["settled"] += 1
+            if event["failed"]:
+                self.stats["failed_settlements"] += 1
+            data = {"tx_id": tx["tx_id"], "status": status, "amount": tx["amount"]}
+            if event["failed"]:
+                data.update(reason="Settlement rejected (simulated)", error_code="SIMULATED_FAILURE")
+            event["payload"] = {"data": data}
+            with self._cond:
+                if self._rng.random() < self.duplicate_ratio:
+                    self.stats["duplicates"] += 1
+                    self._push(now + self._rng.uniform(*self.delay), dict(event, attempt=0))
+
+        try:
+            self.post(self.url, event["payload"])
+            self.stats["delivered"] += 1
+        except Exception as e:
+            self.stats["delivery_errors"] += 1
+            event["attempt"] += 1
+            if event["attempt"] >= MAX_DELIVERY_ATTEMPTS:
+                LOG.error("Giving up on callback for %s: %s", event["tx_id"], e)
+                return
+            with self._cond:
+                self._push(now + min(2 ** event["attempt"], 60), event)
+
+    def process_due(self, now: Optional[float] = None) -> int:
+        """Deliver everything due at `now` in this thread. Returns how many events ran."""
+        now = time.time() if now is None else now
+        ran = 0
+        while True:
+            event = self._pop_due(now)
+            if event is None:
+                return ran
+            self._deliver(event, now)
+            ran += 1
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                wait = self._queue[0][0] - time.time() if self._queue else None
+                if wait is None or wait > 0:
+                    self._cond.wait(wait)
+            try:
+                self.process_due()
+            except Exception:
+                LOG.exception("Callback worker iteration failed")
+
+    def _ensure_worker(self) -> None:
+        if not self.autostart:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="fake-bafoka-callbacks", daemon=True)
+                self._thread.start()
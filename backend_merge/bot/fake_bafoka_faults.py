@@ -0,0 +1,96 @@
+# fake_bafoka_faults.py
+"""
+Latency and fault injection for the fake Bafoka server.
+
+A profile set maps a request path (e.g. "/api/get-balance") or "*" (every
+other /api/ path) to:
+
+    {
+      "latency": {"dist": "fixed", "ms": 120}
+               | {"dist": "lognormal", "median_ms": 150, "sigma": 0.8, "max_ms": 10000},
+      "error_rate": 0.02,        # fraction answered with error_status
+      "error_status": 503,
+      "timeout_rate": 0.01,      # fraction that hang for timeout_ms, then 504
+      "timeout_ms": 30000,
+      "burst_429": {"every_s": 60, "duration_s": 5}   # 429 window at the start of each period
+    }
+
+Set with FAKE_BAFOKA_FAULTS (inline JSON or a path to a JSON file) or at
+runtime via GET/PUT/DELETE /admin/faults. FAKE_BAFOKA_FAULTS_SEED makes the
+random draws reproducible.
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+def load_profiles(raw: Optional[str]) -> Dict[str, Dict]:
+    if not raw:
+        return {}
+    if os.path.exists(raw):
+        with open(raw) as f:
+            raw = f.read()
+    profiles = json.loads(raw)
+    validate(profiles)
+    return profiles
+
+
+def validate(profiles: Dict) -> None:
+    if not isinstance(profiles, dict):
+        raise ValueError("profiles must be an object of path -> profile")
+    for path, profile in profiles.items():
+        latency = profile.get("latency")
+        if latency and latency.get("dist", "fixed") not in ("fixed", "lognormal"):
+            raise ValueError(f"{path}: latency.dist must be fixed or lognormal")
+        for key in ("error_rate", "timeout_rate"):
+            if not 0 <= float(profile.get(key, 0)) <= 1:
+                raise ValueError(f"{path}: {key} must be between 0 and 1")
+
+
+class FaultInjector:
+    def __init__(self, profiles: Optional[Dict[str, Dict]] = None, seed: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.profiles: Dict[str, Dict] = profiles or {}
+
+    def set_profiles(self, profiles: Dict[str, Dict]) -> None:
+        validate(profiles)
+        with self._lock:
+            self.profiles = profiles
+
+    def profile_for(self, path: str) -> Optional[Dict]:
+        return self.profiles.get(path) or self.profiles.get("*")
+
+    def _latency_ms(self, latency: Dict) -> float:
+        if latency.get("dist", "fixed") == "lognormal":
+            with self._lock:
+                ms = self._rng.lognormvariate(math.log(float(latency.get("median_ms", 100))), float(latency.get("sigma", 0.5)))
+            return min(ms, float(latency.get("max_ms", 60000)))
+        return float(latency.get("ms", 0))
+
+    def decide(self, path: str, now: Optional[float] = None) -> Tuple[float, Optional[Tuple[int, Dict]]]:
+        """(seconds to sleep, (status, body) to answer with instead, or None to proceed)."""
+        profile = self.profile_for(path)
+        if not profile:
+            return 0.0, None
+
+        burst = profile.get("burst_429")
+        if burst:
+            now = time.time() if now is None else now
+            if now % float(burst.get("every_s", 60)) < float(burst.get("duration_s", 5)):
+                return 0.0, (429, {"code": 429, "message": "Too many requests (injected)", "data": None, "success": False})
+
+        delay = self._latency_ms(profile["latency"]) / 1000 if profile.get("latency") else 0.0
+        with self._lock:
+            roll = self._rng.random()
+        timeout_rate = float(profile.get("timeout_rate", 0))
+        if roll < timeout_rate:
+            return delay + float(profile.get("timeout_ms", 30000)) / 1000, (504, {"code": 504, "message": "Gateway timeout (injected)", "data": None, "success": False})
+        if roll < timeout_rate + float(profile.get("error_rate", 0)):
+            status = int(profile.get("error_status", 503))
+            return delay, (status, {"code": status, "message": "Upstream error (injected)", "data": None, "success": False})
+        return delay, None
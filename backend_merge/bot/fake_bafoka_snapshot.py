@@ -0,0 +1,191 @@
+# fake_bafoka_snapshot.py
+"""
+Snapshot / restore and synthetic data for the fake Bafoka server.
+
+A snapshot is gzipped JSON lines: a header naming the columns, then one JSON
+array per account and per transaction (transactions in seq order, so paging
+cursors and history order survive a round trip). Loading replaces the whole
+store in one transaction.
+
+    python -m bot.fake_bafoka_snapshot dump state.jsonl.gz
+    python -m bot.fake_bafoka_snapshot load state.jsonl.gz
+    python -m bot.fake_bafoka_snapshot generate --per-groupement 10000 --balance lognormal:500,1.2 --out pop.jsonl.gz
+
+Without --url the CLI works on the FAKE_BAFOKA_DB file directly; with
+--url http://localhost:9000 it goes through GET/PUT /admin/snapshot of a
+running server (needed for a memory store).
+
+Balance distributions: "fixed:N", "uniform:LOW,HIGH", "lognormal:MEDIAN,SIGMA".
+"""
+import argparse
+import gzip
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from .fake_bafoka_store import ACCOUNT_FIELDS, GROUPEMENT_MAP, TRANSACTION_FIELDS, open_store
+except ImportError:
+    from bot.fake_bafoka_store import ACCOUNT_FIELDS, GROUPEMENT_MAP, TRANSACTION_FIELDS, open_store
+
+FORMAT = "fake_bafoka_snapshot/1"
+
+
+def write_snapshot(fileobj, accounts: Iterable[Dict], transactions: Iterable[Dict]) -> Tuple[int, int]:
+    """Write gzipped snapshot lines to a binary file object. Returns (accounts, transactions)."""
+    account_keys = [key for key, _ in ACCOUNT_FIELDS]
+    tx_keys = [key for key, _ in TRANSACTION_FIELDS]
+    counts = [0, 0]
+    with gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=5) as gz:
+        out = io.TextIOWrapper(gz, encoding="utf-8")
+        out.write(json.dumps({"format": FORMAT, "created_at": time.time(), "accounts": account_keys, "transactions": tx_keys}) + "\n")
+        for i, (kind, keys, rows) in enumerate((("a", account_keys, accounts), ("t", tx_keys, transactions))):
+            for row in rows:
+                out.write(json.dumps([kind] + [row.get(k) for k in keys], separators=(",", ":")) + "\n")
+                counts[i] += 1
+        out.flush()
+        out.detach()
+    return counts[0], counts[1]
+
+
+def read_snapshot(fileobj) -> Tuple[List[Dict], Iterator[Dict]]:
+    """(accounts, transactions) from a snapshot file object; transactions are streamed."""
+    lines = io.TextIOWrapper(gzip.GzipFile(fileobj=fileobj, mode="rb"), encoding="utf-8")
+    header = json.loads(next(lines))
+    if header.get("format") != FORMAT:
+        raise ValueError(f"not a fake Bafoka snapshot (format={header.get('format')!r})")
+    keys = {"a": header["accounts"], "t": header["transactions"]}
+
+    accounts: List[Dict] = []
+    first_tx: List[Dict] = []
+    for line in lines:
+        kind, *values = json.loads(line)
+        row = dict(zip(keys[kind], values))
+        if kind == "t":
+            first_tx.append(row)
+            break
+        accounts.append(row)
+
+    def _transactions() -> Iterator[Dict]:
+        yield from first_tx
+        for line in lines:
+            _kind, *values = json.loads(line)
+            yield dict(zip(keys["t"], values))
+
+    return accounts, _transactions()
+
+
+def dump(store, fileobj) -> Tuple[int, int]:
+    return write_snapshot(fileobj, store.iter_accounts(), store.iter_transactions())
+
+
+def load(store, fileobj) -> Tuple[int, int]:
+    accounts, transactions = read_snapshot(fileobj)
+    return store.replace_all(accounts, transactions)
+
+
+def balance_sampler(spec: str, rng: random.Random) -> Callable[[], int]:
+    """'fixed:100' | 'uniform:0,1000' | 'lognormal:500,1.0' -> function returning a balance."""
+    dist, _, raw = spec.partition(":")
+    params = [float(p) for p in raw.split(",") if p.strip()]
+    try:
+        if dist == "fixed":
+            return lambda: int(params[0])
+        if dist == "uniform":
+            low, high = int(params[0]), int(params[1])
+            return lambda: rng.randint(low, high)
+        if dist == "lognormal":
+            mu, sigma = math.log(params[0]), params[1]
+            return lambda: int(rng.lognormvariate(mu, sigma))
+    except IndexError:
+        pass
+    raise ValueError(f"bad balance distribution {spec!r}; use fixed:N, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+
+
+def generate_population(groupements: Dict[int, Tuple[str, str]], per_groupement: int, balance: str = "fixed:0", seed: Optional[int] = None) -> Iterator[Dict]:
+    """
+    per_groupement accounts for each {id: (name, currency)}. Phones are
+    deterministic (+2376<id><7-digit index>) so benchmarks can address them.
+    """
+    rng = random.Random(seed)
+    sample = balance_sampler(balance, rng)
+    created = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for gid, (name, currency) in sorted(groupements.items()):
+        for i in range(per_groupement):
+            yield {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "phoneNumber": f"+2376{gid}{i:07d}",
+                "fullName": f"Synthetic {name} {i}",
+                "age": str(rng.randint(18, 80)),
+                "sex": rng.choice("MF"),
+                "groupement_id": gid,
+                "groupementName": name,
+                "blockchainAddress": f"0x{rng.getrandbits(160):040x}",
+                "balance": sample(),
+                "currency": currency,
+                "createdAt": created,
+                "status": "active",
+            }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Dump, load or generate fake Bafoka state")
+    parser.add_argument("--db", default=os.getenv("FAKE_BAFOKA_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "fake_bafoka.db")))
+    parser.add_argument("--url", default=None, help="running fake server (uses /admin/snapshot instead of --db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("dump").add_argument("path")
+    sub.add_parser("load").add_argument("path")
+    gen = sub.add_parser("generate", help="replace the state with a synthetic population")
+    gen.add_argument("--per-groupement", type=int, required=True)
+    gen.add_argument("--balance", default="fixed:1000")
+    gen.add_argument("--seed", type=int, default=None)
+    gen.add_argument("--out", default=None, help="write a snapshot file instead of loading it")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    if args.command == "generate":
+        buf = io.BytesIO()
+        write_snapshot(buf, generate_population(GROUPEMENT_MAP, args.per_groupement, args.balance, args.seed), [])
+        if args.out:
+            with open(args.out, "wb") as f:
+                f.write(buf.getvalue())
+            print(f"Wrote {args.out}")
+            return 0
+        args.command, payload = "load", buf.getvalue()
+    elif args.command == "load":
+        with open(args.path, "rb") as f:
+            payload = f.read()
+
+    if args.url:
+        import requests
+        endpoint = args.url.rstrip("/") + "/admin/snapshot"
+        if args.command == "dump":
+            r = requests.get(endpoint, timeout=600)
+            r.raise_for_status()
+            with open(args.path, "wb") as f:
+                f.write(r.content)
+            counts = (r.headers.get("X-Accounts"), r.headers.get("X-Transactions"))
+        else:
+            r = requests.put(endpoint, data=payload, headers={"Content-Type": "application/gzip"}, timeout=600)
+            r.raise_for_status()
+            counts = (r.json()["accounts"], r.json()["transactions"])
+    else:
+        store = open_store(args.db)
+        if args.command == "dump":
+            with open(args.path, "wb") as f:
+                counts = dump(store, f)
+        else:
+            counts = load(store, io.BytesIO(payload))
+
+    print(f"{args.command}: {counts[0]} accounts, {counts[1]} transactions in {time.time() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
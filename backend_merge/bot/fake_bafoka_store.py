@@ -0,0 +1,381 @@
+# fake_bafoka_store.py
+"""
+Storage engines for the fake Bafoka server.
+
+Both engines expose the same small API and keep the wire shapes used by
+fake_bafoka.py (camelCase account / transaction dicts):
+
+- MemoryStore: dicts behind one lock. Fast, gone on restart; for unit tests.
+- SqliteStore: one SQLite file in WAL mode, a connection per thread, and
+  balance moves done as a single conditional UPDATE inside BEGIN IMMEDIATE,
+  so concurrent transfers can never overdraw or lose an update.
+
+Transactions are numbered in insertion order (seq) and indexed per phone
+(sender and receiver side), so list_transactions() pages newest-first with a
+seq cursor in O(log n + page) however many rows there are.
+
+open_store(target): "memory" (or ":memory:") -> MemoryStore, anything else
+is a file path for SqliteStore.
+"""
+import bisect
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+ACCOUNT_FIELDS = (
+    ("id", "id"),
+    ("phoneNumber", "phone"),
+    ("fullName", "full_name"),
+    ("age", "age"),
+    ("sex", "sex"),
+    ("groupement_id", "groupement_id"),
+    ("groupementName", "groupement_name"),
+    ("blockchainAddress", "blockchain_address"),
+    ("balance", "balance"),
+    ("currency", "currency"),
+    ("createdAt", "created_at"),
+    ("status", "status"),
+)
+TRANSACTION_FIELDS = (
+    ("tx_id", "tx_id"),
+    ("senderPhoneNumber", "sender"),
+    ("receiverPhoneNumber", "receiver"),
+    ("amount", "amount"),
+    ("currency", "currency"),
+    ("status", "status"),
+    ("timestamp", "timestamp"),
+    ("groupement_id", "groupement_id"),
+)
+
+# Groupement mapping (from real API /api/groupements)
+GROUPEMENT_MAP = {
+    1: ("Batoufam", "MBIP TSWEFAP"),
+    2: ("Fondjomekwet", "MBAM"),
+    3: ("Bameka", "MUNKAP")
+}
+
+# (ok, sender_balance, receiver_balance)
+TransferResult = Tuple[bool, Optional[int], Optional[int]]
+# (transactions newest first, cursor for the next page or None)
+TransactionPage = Tuple[List[Dict], Optional[int]]
+
+
+class MemoryStore:
+    kind = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.accounts: Dict[str, Dict] = {}
+        self.transactions: Dict[str, Dict] = {}
+        self._next_seq = 1
+        # phone -> ([seq, ...], [tx_id, ...]), both ascending by seq
+        self._by_phone: Dict[str, Tuple[List[int], List[str]]] = {}
+
+    def create_account(self, account: Dict) -> bool:
+        with self._lock:
+            if account["phoneNumber"] in self.accounts:
+                return False
+            self.accounts[account["phoneNumber"]] = dict(account)
+            return True
+
+    def get_account(self, phone: str) -> Optional[Dict]:
+        with self._lock:
+            account = self.accounts.get(phone)
+            return dict(account) if account else None
+
+    def has_account(self, phone: str) -> bool:
+        return phone in self.accounts
+
+    def credit(self, phone: str, amount: int) -> Optional[int]:
+        """Add amount (may be negative); new balance, or None if missing / would go below zero."""
+        with self._lock:
+            account = self.accounts.get(phone)
+            if account is None or account["balance"] + amount < 0:
+                return None
+            account["balance"] += amount
+            return account["balance"]
+
+    def transfer(self, tx: Dict, settle: bool = True) -> TransferResult:
+        """
+        Debit sender / credit receiver / store tx, all or nothing. Fails if
+        funds are short. settle=False only debits the sender (funds on hold)
+        and leaves the receiver's credit to settle().
+        """
+        amount = tx["amount"]
+        with self._lock:
+            sender = self.accounts.get(tx["senderPhoneNumber"])
+            receiver = self.accounts.get(tx["receiverPhoneNumber"])
+            if sender is None or receiver is None or sender["balance"] < amount:
+                return False, None, None
+            sender["balance"] -= amount
+            if settle:
+                receiver["balance"] += amount
+            self._insert_transaction(tx)
+            return True, sender["balance"], receiver["balance"]
+
+    def _insert_transaction(self, tx: Dict) -> None:
+        self._next_seq = self._index_transaction(tx, self._next_seq, self.transactions, self._by_phone)
+
+    @staticmethod
+    def _index_transaction(tx: Dict, seq: int, transactions: Dict[str, Dict], by_phone: Dict) -> int:
+        """Add tx as number seq to the given maps; returns the next seq."""
+        transactions[tx["tx_id"]] = dict(tx, transaction_id=tx["tx_id"])
+        for phone in {tx["senderPhoneNumber"], tx["receiverPhoneNumber"]}:
+            seqs, tx_ids = by_phone.setdefault(phone, ([], []))
+            seqs.append(seq)
+            tx_ids.append(tx["tx_id"])
+        return seq + 1
+
+    def settle(self, tx_id: str, status: str, succeeded: bool) -> Optional[Dict]:
+        """Finish a pending transfer: credit the receiver, or refund the sender. None if not pending."""
+        with self._lock:
+            tx = self.transactions.get(tx_id)
+            if tx is None or tx["status"] != "pending":
+                return None
+            party = tx["receiverPhoneNumber"] if succeeded else tx["senderPhoneNumber"]
+            self.accounts[party]["balance"] += tx["amount"]
+            tx["status"] = status
+            return dict(tx)
+
+    def get_transaction(self, tx_id: str) -> Optional[Dict]:
+        with self._lock:
+            tx = self.transactions.get(tx_id)
+            return dict(tx) if tx else None
+
+    def list_transactions(self, phone: str, cursor: Optional[int] = None, limit: int = 50) -> TransactionPage:
+        """Transactions sent or received by phone, newest first, older than cursor."""
+        with self._lock:
+            seqs, tx_ids = self._by_phone.get(phone, ([], []))
+            end = len(seqs) if cursor is None else bisect.bisect_left(seqs, cursor)
+            start = max(0, end - limit)
+            page = [dict(self.transactions[tx_id]) for tx_id in reversed(tx_ids[start:end])]
+            return page, (seqs[start] if start > 0 else None)
+
+    def counts(self) -> Tuple[int, int]:
+        return len(self.accounts), len(self.transactions)
+
+    def iter_accounts(self) -> Iterator[Dict]:
+        with self._lock:
+            accounts = [dict(a) for a in self.accounts.values()]
+        return iter(accounts)
+
+    def iter_transactions(self) -> Iterator[Dict]:
+        """All transactions in insertion (seq) order."""
+        with self._lock:
+            transactions = [dict(tx) for tx in self.transactions.values()]
+        return iter(transactions)
+
+    def replace_all(self, accounts: Iterable[Dict], transactions: Iterable[Dict]) -> Tuple[int, int]:
+        """
+        Swap the whole state for the given rows (transactions in seq order).
+        Everything is built aside first, so a bad input leaves the store untouched.
+        """
+        new_accounts = {a["phoneNumber"]: dict(a) for a in accounts}
+        new_transactions: Dict[str, Dict] = {}
+        by_phone: Dict[str, Tuple[List[int], List[str]]] = {}
+        next_seq = 1
+        for tx in transactions:
+            next_seq = self._index_transaction(tx, next_seq, new_transactions, by_phone)
+        with self._lock:
+            self.accounts, self.transactions, self._by_phone, self._next_seq = new_accounts, new_transactions, by_phone, next_seq
+            return self.counts()
+
+
+class SqliteStore:
+    kind = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS accounts (
+            phone TEXT PRIMARY KEY,
+            id TEXT NOT NULL,
+            full_name TEXT,
+            age TEXT,
+            sex TEXT,
+            groupement_id INTEGER,
+            groupement_name TEXT,
+            blockchain_address TEXT,
+            balance INTEGER NOT NULL DEFAULT 0 CHECK (balance >= 0),
+            currency TEXT,
+            created_at TEXT,
+            status TEXT
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_id TEXT NOT NULL UNIQUE,
+            sender TEXT NOT NULL,
+            receiver TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            currency TEXT,
+            status TEXT,
+            timestamp TEXT,
+            groupement_id INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS ix_transactions_sender ON transactions (sender, seq);
+        CREATE INDEX IF NOT EXISTS ix_transactions_receiver ON transactions (receiver, seq);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit; multi-statement writes open BEGIN IMMEDIATE explicitly
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row, fields) -> Optional[Dict]:
+        if row is None:
+            return None
+        return {key: row[col] for key, col in fields}
+
+    def create_account(self, account: Dict) -> bool:
+        cols = ", ".join(col for _, col in ACCOUNT_FIELDS)
+        marks = ", ".join("?" for _ in ACCOUNT_FIELDS)
+        cur = self._conn().execute(
+            f"INSERT OR IGNORE INTO accounts ({cols}) VALUES ({marks})",
+            [account.get(key) for key, _ in ACCOUNT_FIELDS],
+        )
+        return cur.rowcount == 1
+
+    def get_account(self, phone: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM accounts WHERE phone = ?", (phone,)).fetchone()
+        return self._to_dict(row, ACCOUNT_FIELDS)
+
+    def has_account(self, phone: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM accounts WHERE phone = ?", (phone,)).fetchone() is not None
+
+    def credit(self, phone: str, amount: int) -> Optional[int]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute("UPDATE accounts SET balance = balance + ? WHERE phone = ? AND balance + ? >= 0", (amount, phone, amount))
+            row = conn.execute("SELECT balance FROM accounts WHERE phone = ?", (phone,)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row["balance"] if cur.rowcount == 1 else None
+
+    def transfer(self, tx: Dict, settle: bool = True) -> TransferResult:
+        conn = self._conn()
+        amount = tx["amount"]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            debited = conn.execute(
+                "UPDATE accounts SET balance = balance - ? WHERE phone = ? AND balance >= ?",
+                (amount, tx["senderPhoneNumber"], amount),
+            ).rowcount
+            credited = debited and conn.execute(
+                "UPDATE accounts SET balance = balance + ? WHERE phone = ?",
+                (amount if settle else 0, tx["receiverPhoneNumber"]),
+            ).rowcount
+            if not (debited and credited):
+                conn.execute("ROLLBACK")
+                return False, None, None
+            cols = ", ".join(col for _, col in TRANSACTION_FIELDS)
+            marks = ", ".join("?" for _ in TRANSACTION_FIELDS)
+            conn.execute(f"INSERT INTO transactions ({cols}) VALUES ({marks})", [tx.get(key) for key, _ in TRANSACTION_FIELDS])
+            balances = dict(conn.execute(
+                "SELECT phone, balance FROM accounts WHERE phone IN (?, ?)",
+                (tx["senderPhoneNumber"], tx["receiverPhoneNumber"]),
+            ).fetchall())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True, balances[tx["senderPhoneNumber"]], balances[tx["receiverPhoneNumber"]]
+
+    def settle(self, tx_id: str, status: str, succeeded: bool) -> Optional[Dict]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT * FROM transactions WHERE tx_id = ? AND status = 'pending'", (tx_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "UPDATE accounts SET balance = balance + ? WHERE phone = ?",
+                (row["amount"], row["receiver"] if succeeded else row["sender"]),
+            )
+            conn.execute("UPDATE transactions SET status = ? WHERE tx_id = ?", (status, tx_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get_transaction(tx_id)
+
+    def _tx_dict(self, row) -> Optional[Dict]:
+        tx = self._to_dict(row, TRANSACTION_FIELDS)
+        if tx:
+            tx["transaction_id"] = tx["tx_id"]
+        return tx
+
+    def get_transaction(self, tx_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM transactions WHERE tx_id = ?", (tx_id,)).fetchone()
+        return self._tx_dict(row)
+
+    def list_transactions(self, phone: str, cursor: Optional[int] = None, limit: int = 50) -> TransactionPage:
+        # one range scan per index, merged; UNION also folds self-transfers into one row
+        before = 2 ** 63 - 1 if cursor is None else cursor
+        rows = self._conn().execute(
+            """
+            SELECT * FROM (SELECT * FROM transactions WHERE sender = ? AND seq < ? ORDER BY seq DESC LIMIT ?)
+            UNION
+            SELECT * FROM (SELECT * FROM transactions WHERE receiver = ? AND seq < ? ORDER BY seq DESC LIMIT ?)
+            ORDER BY seq DESC LIMIT ?
+            """,
+            (phone, before, limit + 1, phone, before, limit + 1, limit + 1),
+        ).fetchall()
+        page = rows[:limit]
+        return [self._tx_dict(r) for r in page], (page[-1]["seq"] if len(rows) > limit else None)
+
+    def iter_accounts(self) -> Iterator[Dict]:
+        for row in self._conn().execute("SELECT * FROM accounts"):
+            yield self._to_dict(row, ACCOUNT_FIELDS)
+
+    def iter_transactions(self) -> Iterator[Dict]:
+        for row in self._conn().execute("SELECT * FROM transactions ORDER BY seq"):
+            yield self._tx_dict(row)
+
+    def replace_all(self, accounts: Iterable[Dict], transactions: Iterable[Dict]) -> Tuple[int, int]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM accounts")
+            conn.execute("DELETE FROM transactions")
+            conn.execute("DELETE FROM sqlite_sequence WHERE name = 'transactions'")
+            for table, fields, rows in (("accounts", ACCOUNT_FIELDS, accounts), ("transactions", TRANSACTION_FIELDS, transactions)):
+                cols = ", ".join(col for _, col in fields)
+                marks = ", ".join("?" for _ in fields)
+                conn.executemany(f"INSERT INTO {table} ({cols}) VALUES ({marks})", ([r.get(key) for key, _ in fields] for r in rows))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.counts()
+
+    def counts(self) -> Tuple[int, int]:
+        conn = self._conn()
+        return (
+            conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0],
+            conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0],
+        )
+
+
+def open_store(target: str):
+    if target in ("memory", ":memory:"):
+        return MemoryStore()
+    return SqliteStore(target)
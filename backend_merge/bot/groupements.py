@@ -0,0 +1,208 @@
+# groupements.py
+"""
+Single registry of communities (Bafoka "groupements").
+
+Source of truth is GET /api/groupements. The registry starts from the last
+disk snapshot (or the built-in defaults below when there is none), so startup
+never waits on the network. Lookups are dict hits; when the data is older
+than GROUPEMENTS_TTL_SECONDS a lookup schedules a background refresh and
+keeps answering from what it has.
+
+The API only returns {id, name}; currency names are not in it, so they come
+from DEFAULT_CURRENCIES (or a "currency" field, should the API add one).
+
+Env:
+- GROUPEMENTS_TTL_SECONDS (default: 3600)
+- GROUPEMENTS_SNAPSHOT_PATH (default: bot/instance/groupements.json)
+- GROUPEMENTS_AUTO_REFRESH set to false to stay on snapshot/defaults (offline, tests)
+"""
+import os
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+LOG = logging.getLogger("groupements")
+LOG.setLevel(logging.INFO)
+
+TTL_SECONDS = float(os.getenv("GROUPEMENTS_TTL_SECONDS", "3600"))
+AUTO_REFRESH = os.getenv("GROUPEMENTS_AUTO_REFRESH", "true").lower() == "true"
+SNAPSHOT_PATH = os.getenv(
+    "GROUPEMENTS_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "groupements.json"),
+)
+
+# Last known /api/groupements response, used until the first successful fetch
+DEFAULT_GROUPEMENTS = [
+    {"id": 1, "name": "Batoufam"},
+    {"id": 2, "name": "Fondjomekwet"},
+    {"id": 3, "name": "Bameka"},
+]
+DEFAULT_CURRENCIES = {
+    "BATOUFAM": "MBIP TSWEFAP",
+    "FONDJOMEKWET": "MBAM",
+    "BAMEKA": "MUNKAP",
+}
+# Spelling variants users type -> canonical key
+ALIASES = {
+    "FONDJOMENKWET": "FONDJOMEKWET",
+}
+DEFAULT_COMMUNITY = "BAMEKA"
+
+
+class GroupementRegistry:
+    def __init__(self, fetch=None, snapshot_path: Optional[str] = SNAPSHOT_PATH, ttl: float = TTL_SECONDS, auto_refresh: bool = AUTO_REFRESH):
+        self._fetch = fetch
+        self._snapshot_path = snapshot_path
+        self._ttl = ttl
+        self._auto_refresh = auto_refresh
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._loaded_at = 0.0
+        self._by_key: Dict[str, Dict] = {}
+        self._by_id: Dict[int, Dict] = {}
+        self._install(self._read_snapshot() or DEFAULT_GROUPEMENTS)
+
+    # ---- loading ----
+
+    def _install(self, items: List[Dict]) -> None:
+        by_key, by_id = {}, {}
+        for item in items:
+            key = str(item["name"]).strip().upper()
+            entry = {
+                "id": int(item["id"]),
+                "name": item["name"],
+                "key": key,
+                "currency": item.get("currency") or DEFAULT_CURRENCIES.get(key),
+            }
+            by_key[key] = entry
+            by_id[entry["id"]] = entry
+        # swap whole dicts so readers never see a half-built registry
+        self._by_key, self._by_id = by_key, by_id
+
+    def _read_snapshot(self) -> Optional[List[Dict]]:
+        if not self._snapshot_path or not os.path.exists(self._snapshot_path):
+            return None
+        try:
+            with open(self._snapshot_path) as f:
+                data = json.load(f)
+            self._loaded_at = data.get("fetched_at", 0.0)
+            return data["groupements"]
+        except Exception as e:
+            LOG.warning("Ignoring unreadable groupements snapshot %s: %s", self._snapshot_path, e)
+            return None
+
+    def _write_snapshot(self, items: List[Dict]) -> None:
+        if not self._snapshot_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._snapshot_path), exist_ok=True)
+            tmp = f"{self._snapshot_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"fetched_at": self._loaded_at, "groupements": items}, f)
+            os.replace(tmp, self._snapshot_path)
+        except Exception as e:
+            LOG.warning("Failed to write groupements snapshot: %s", e)
+
+    def refresh(self) -> bool:
+        """Fetch from the API now (blocking). Returns False and keeps old data on failure."""
+        fetch = self._fetch
+        if fetch is None:
+            from .bafoka_client import get_groupements as fetch
+        try:
+            items = [g for g in fetch() if isinstance(g, dict) and "id" in g and "name" in g]
+            if not items:
+                raise ValueError("empty groupements list")
+        except Exception as e:
+            LOG.warning("Groupements refresh failed, keeping cached registry: %s", e)
+            with self._lock:
+                # back off for a full TTL rather than retrying on every lookup
+                self._loaded_at = time.time()
+            return False
+        with self._lock:
+            self._install(items)
+            self._loaded_at = time.time()
+        self._write_snapshot(items)
+        LOG.info("Loaded %d groupements", len(items))
+        return True
+
+    def refresh_async(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=_run, name="groupements-refresh", daemon=True).start()
+
+    def _check_ttl(self) -> None:
+        if self._auto_refresh and time.time() - self._loaded_at > self._ttl:
+            self.refresh_async()
+
+    def refresh_if_stale(self) -> None:
+        """Start a background refresh if the data is past its TTL (never blocks)."""
+        self._check_ttl()
+
+    # ---- lookups ----
+
+    def canonicalize(self, value: Optional[str]) -> Optional[str]:
+        """Community name (any case, known alias or numeric id) -> canonical key, or None."""
+        if value is None or value == "":
+            return None
+        self._check_ttl()
+        raw = str(value).strip()
+        if raw.isdigit():
+            entry = self._by_id.get(int(raw))
+            return entry["key"] if entry else None
+        key = raw.upper()
+        key = ALIASES.get(key, key)
+        return key if key in self._by_key else None
+
+    def currency_for(self, community: Optional[str]) -> Optional[str]:
+        key = self.canonicalize(community)
+        return self._by_key[key]["currency"] if key else None
+
+    def groupement_id_for(self, community: Optional[str], default: Optional[str] = DEFAULT_COMMUNITY) -> Optional[int]:
+        key = self.canonicalize(community) or (self.canonicalize(default) if default else None)
+        return self._by_key[key]["id"] if key else None
+
+    def community_for_id(self, groupement_id) -> Optional[str]:
+        self._check_ttl()
+        try:
+            entry = self._by_id.get(int(groupement_id))
+        except (TypeError, ValueError):
+            return None
+        return entry["key"] if entry else None
+
+    def communities(self) -> List[str]:
+        self._check_ttl()
+        return sorted(self._by_key)
+
+    def all(self) -> List[Dict]:
+        self._check_ttl()
+        return [dict(e) for e in sorted(self._by_id.values(), key=lambda e: e["id"])]
+
+
+_registry: Optional[GroupementRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> GroupementRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = GroupementRegistry()
+    return _registry
+
+
+def set_registry(registry: Optional[GroupementRegistry]) -> None:
+    """Swap the process-wide registry (tests, or a custom fetcher)."""
+    global _registry
+    _registry = registry
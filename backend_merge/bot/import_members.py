@@ -0,0 +1,237 @@
+# import_members.py
+"""
+Bulk member import for community onboarding days.
+
+    python -m bot.import_members members.csv [--chunk-size 500] [--concurrency 16]
+
+CSV columns (header row required; aliases in brackets):
+    phone [phoneNumber], name [fullName], community [groupement_id], age, skill, local_name
+
+Phase 1 validates rows and bulk-inserts users, one commit per chunk.
+Phase 2 creates Bafoka wallets through a bounded thread pool; each result
+is committed as soon as its call returns, so a crash never loses an address
+the API already handed out. Wallets that still fail are handed to the
+background wallet_jobs queue for retries.
+
+Progress is saved to a checkpoint file (default: <csv>.checkpoint.json) after
+every chunk, so re-running the same command resumes where it stopped.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .db import db
+from .models import User, WalletJob
+from . import core_logic as core
+from . import community_stats
+from . import wallet_jobs
+from . import groupements
+
+LOG = logging.getLogger("import_members")
+LOG.setLevel(logging.INFO)
+
+PHONE_RE = re.compile(r"^\+?\d{8,15}$")
+
+def _field(row: Dict[str, str], *names: str) -> str:
+    for name in names:
+        value = row.get(name)
+        if value is not None and value.strip():
+            return value.strip()
+    return ""
+
+
+def validate_row(row: Dict[str, str], canonicalize) -> Tuple[Optional[Dict], Optional[str]]:
+    """Return (user_fields, None) for a good row or (None, reason) for a bad one."""
+    phone = _field(row, "phone", "phoneNumber").replace(" ", "")
+    if not PHONE_RE.match(phone):
+        return None, f"invalid phone {phone!r}"
+
+    # canonicalize() also accepts a numeric groupement id
+    community = _field(row, "community") or _field(row, "groupement_id")
+    canon = canonicalize(community)
+    if not canon:
+        return None, f"invalid community {community!r}"
+
+    age = _field(row, "age") or "25"
+    if not age.isdigit() or not 0 < int(age) < 130:
+        return None, f"invalid age {age!r}"
+
+    return {
+        "phone": phone,
+        "name": _field(row, "name", "fullName") or None,
+        "skill": _field(row, "skill") or None,
+        "community": canon,
+        "local_name": _field(row, "local_name") or None,
+        "age": age,
+    }, None
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class Checkpoint:
+    """Tiny JSON progress file: last inserted CSV row and running totals."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {"inserted_through_row": 0, "inserted": 0, "skipped": 0, "invalid": 0, "wallets_ok": 0, "wallets_queued": 0}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state.update(json.load(f))
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def insert_users(rows: List[Tuple[int, Dict[str, str]]], checkpoint: Checkpoint, chunk_size: int) -> Dict[str, str]:
+    """Phase 1. Returns {phone: age} for every valid row in the file (inserted now or earlier)."""
+    members: Dict[str, str] = {}
+    for chunk in _chunks(rows, chunk_size):
+        valid = {}
+        for row_no, row in chunk:
+            fields, error = validate_row(row, core.canonicalize_community)
+            if error:
+                if row_no > checkpoint.state["inserted_through_row"]:
+                    LOG.warning("Row %d skipped: %s", row_no, error)
+                    checkpoint.state["invalid"] += 1
+                continue
+            members.setdefault(fields["phone"], fields["age"])
+            if row_no > checkpoint.state["inserted_through_row"] and fields["phone"] not in valid:
+                valid[fields["phone"]] = fields
+
+        if valid:
+            existing = {p for (p,) in db.session.query(User.phone).filter(User.phone.in_(list(valid)))}
+            new = [f for p, f in valid.items() if p not in existing]
+            checkpoint.state["skipped"] += len(valid) - len(new)
+            db.session.bulk_insert_mappings(User, [
+                {
+                    "phone": f["phone"],
+                    "name": f["name"],
+                    "skill": f["skill"],
+                    "community": f["community"],
+                    "bafoka_local_name": f["local_name"] or core.currency_for_community(f["community"]),
+                    "bafoka_balance": 0,
+                    "wallet_status": "pending",
+                }
+                for f in new
+            ])
+            per_community: Dict[str, int] = {}
+            for f in new:
+                per_community[f["community"]] = per_community.get(f["community"], 0) + 1
+            for community, n in per_community.items():
+                community_stats.bump(community, total_members=n)
+            db.session.commit()
+            checkpoint.state["inserted"] += len(new)
+
+        checkpoint.state["inserted_through_row"] = max(checkpoint.state["inserted_through_row"], chunk[-1][0])
+        checkpoint.save()
+        LOG.info("Inserted through row %d (%d new users so far)", checkpoint.state["inserted_through_row"], checkpoint.state["inserted"])
+    return members
+
+
+def _pending_users(phones: List[str]):
+    """Imported users that still have neither a wallet nor a queued wallet job."""
+
+    return (
+        User.query
+        .outerjoin(WalletJob, WalletJob.user_id == User.id)
+        .filter(User.phone.in_(phones), User.wallet_status == "pending", User.bafoka_wallet_id.is_(None), WalletJob.id.is_(None))
+        .all()
+    )
+
+
+def create_wallets(members: Dict[str, str], checkpoint: Checkpoint, chunk_size: int, concurrency: int) -> None:
+    """Phase 2. Creates wallets for imported users still pending without a queued job."""
+
+    def _create(args):
+        phone, name, groupement_id, age = args
+        try:
+            return phone, core.provision_wallet(phone, name, groupement_id, age), None
+        except Exception as e:
+            return phone, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for chunk in _chunks(list(members), chunk_size):
+            users = _pending_users(chunk)
+            if not users:
+                continue
+            by_phone = {u.phone: u for u in users}
+            work = [
+                (u.phone, u.name, groupements.get_registry().groupement_id_for(u.community), members[u.phone])
+                for u in users
+            ]
+            futures = [pool.submit(_create, args) for args in work]
+            for future in as_completed(futures):
+                phone, address, error = future.result()
+                user = by_phone[phone]
+                if address:
+                    user.bafoka_wallet_id = address
+                    user.wallet_status = "ready"
+                    checkpoint.state["wallets_ok"] += 1
+                else:
+                    LOG.warning("Wallet for %s failed, queued for retry: %s", phone, error)
+                    job = wallet_jobs.enqueue(user, groupements.get_registry().groupement_id_for(user.community), members[phone])
+                    job.attempts = 1
+                    job.last_error = error
+                    checkpoint.state["wallets_queued"] += 1
+                # the upstream account exists now; a later crash must not lose its address
+                db.session.commit()
+            checkpoint.save()
+            LOG.info("Wallets: %d created, %d queued for retry", checkpoint.state["wallets_ok"], checkpoint.state["wallets_queued"])
+
+
+def enqueue_pending(members: Dict[str, str], chunk_size: int) -> None:
+    """--no-wallets: hand every still-pending imported user to the wallet queue."""
+    for chunk in _chunks(list(members), chunk_size):
+        for u in _pending_users(chunk):
+            wallet_jobs.enqueue(u, groupements.get_registry().groupement_id_for(u.community), members[u.phone])
+        db.session.commit()
+
+
+def run_import(csv_path: str, chunk_size: int = 500, concurrency: int = 16, checkpoint_path: Optional[str] = None, wallets: bool = True) -> Dict:
+    """Run both phases inside the current app context. Returns the checkpoint totals."""
+    checkpoint = Checkpoint(checkpoint_path or f"{csv_path}.checkpoint.json")
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        rows = list(enumerate(csv.DictReader(f), start=1))
+
+    members = insert_users(rows, checkpoint, chunk_size)
+    if wallets:
+        create_wallets(members, checkpoint, chunk_size, concurrency)
+    else:
+        enqueue_pending(members, chunk_size)
+    return dict(checkpoint.state)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-import community members from a CSV file")
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-size", type=int, default=500, help="rows per insert commit / wallet batch")
+    parser.add_argument("--concurrency", type=int, default=16, help="parallel create_wallet calls")
+    parser.add_argument("--checkpoint", default=None, help="progress file (default: <csv>.checkpoint.json)")
+    parser.add_argument("--no-wallets", action="store_true", help="only insert users; leave wallets to the background queue")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    from .app import create_app  # heavy (voice/whisper imports); only needed for the CLI
+
+    wallet_jobs.WORKER_ENABLED = False  # this process exits when done; the server's worker handles retries
+    app = create_app()
+    with app.app_context():
+        totals = run_import(args.csv_path, args.chunk_size, args.concurrency, args.checkpoint, wallets=not args.no_wallets)
+    print(json.dumps(totals, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# ledger.py
+"""
+Append-only double-entry ledger for local Bafoka balances.
+
+users.bafoka_balance stays the fast "current balance" mirror, but every change
+to it goes through this module, which also writes one debit and one credit
+LedgerEntry per movement. Every CHECKPOINT_INTERVAL entries per user a
+BalanceCheckpoint is stored, so a historical balance is one checkpoint lookup
+plus a tail scan of at most CHECKPOINT_INTERVAL rows.
+
+Functions here only add rows to the session; callers own the commit.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from .db import db
+from .models import User, Transaction, LedgerEntry, BalanceCheckpoint
+
+CHECKPOINT_INTERVAL = max(1, int(os.getenv("LEDGER_CHECKPOINT_INTERVAL", "50")))
+# Attempts at claiming the next seq when a concurrent posting took it first
+SEQ_ATTEMPTS = 5
+
+
+def _next_seq(user: User) -> int:
+    last = (
+        db.session.query(LedgerEntry.seq)
+        .filter(LedgerEntry.user_id == user.id)
+        .order_by(LedgerEntry.seq.desc())
+        .first()
+    )
+    return (last[0] if last else 0) + 1
+
+
+def _append(user: Optional[User], tx: Optional[Transaction], kind: str, amount: int, now: datetime) -> Optional[LedgerEntry]:
+    """Apply a signed amount to user's balance and record it as a ledger entry."""
+    if user is None:
+        return None
+    opening = user.bafoka_balance or 0
+    balance = opening + amount
+    # The balance UPDATE is flushed by begin_nested() below. On SQLite that
+    # write is what opens the transaction, so the SAVEPOINT nests inside it
+    # instead of starting (and on RELEASE committing) one of its own.
+    user.bafoka_balance = balance
+    db.session.add(user)
+    # Claim seq in a savepoint: a concurrent posting for the same user that took
+    # it first trips the unique (user_id, seq) index, and we retry with the next one
+    for attempt in range(SEQ_ATTEMPTS):
+        seq = _next_seq(user)
+        try:
+            with db.session.begin_nested():
+                if seq == 1:
+                    # Opening checkpoint: balances that predate the ledger (seeds, manual edits)
+                    db.session.add(BalanceCheckpoint(user_id=user.id, seq=0, balance=opening, created_at=now))
+                entry = LedgerEntry(
+                    transaction_id=tx.id if tx is not None else None,
+                    user_id=user.id,
+                    seq=seq,
+                    kind=kind,
+                    direction="credit" if amount > 0 else "debit",
+                    amount=amount,
+                    balance_after=balance,
+                    created_at=now,
+                )
+                db.session.add(entry)
+                if seq % CHECKPOINT_INTERVAL == 0:
+                    db.session.add(BalanceCheckpoint(user_id=user.id, seq=seq, balance=balance, created_at=now))
+            break
+        except IntegrityError:
+            if attempt == SEQ_ATTEMPTS - 1:
+                raise
+    return entry
+
+
+def post_transfer(tx: Transaction, from_user: Optional[User], to_user: Optional[User], amount: int) -> None:
+    """Debit sender, credit recipient."""
+    now = datetime.utcnow()
+    _append(from_user, tx, "transfer", -amount, now)
+    _append(to_user, tx, "transfer", amount, now)
+
+
+def post_revert(tx: Transaction, from_user: Optional[User], to_user: Optional[User], amount: int) -> None:
+    """
+    Undo a transfer with compensating entries (credit sender, debit recipient).
+    Either user may be None if the account was deleted in the meantime.
+    """
+    now = datetime.utcnow()
+    _append(from_user, tx, "revert", amount, now)
+    _append(to_user, tx, "revert", -amount, now)
+
+
+def balance_as_of(user_id: int, at: Optional[datetime] = None) -> Optional[int]:
+    """
+    Balance of a user at time `at` (default: now), reconstructed from the
+    nearest checkpoint plus the ledger entries written after it.
+    Returns None if the user does not exist.
+    """
+    user = User.query.get(user_id)
+    if not user:
+        return None
+    if at is None:
+        return user.bafoka_balance or 0
+
+    cp = (
+        BalanceCheckpoint.query
+        .filter(BalanceCheckpoint.user_id == user_id, BalanceCheckpoint.created_at <= at)
+        .order_by(BalanceCheckpoint.created_at.desc(), BalanceCheckpoint.seq.desc())
+        .first()
+    )
+    if cp is None:
+        # Before the user's first ledger entry: the opening balance applies
+        opening = (
+            BalanceCheckpoint.query
+            .filter(BalanceCheckpoint.user_id == user_id)
+            .order_by(BalanceCheckpoint.seq.asc())
+            .first()
+        )
+        return opening.balance if opening else (user.bafoka_balance or 0)
+
+    tail = (
+        db.session.query(db.func.coalesce(db.func.sum(LedgerEntry.amount), 0))
+        .filter(
+            LedgerEntry.user_id == user_id,
+            LedgerEntry.seq > cp.seq,
+            LedgerEntry.created_at <= at,
+        )
+        .scalar()
+    )
+    return cp.balance + int(tail or 0)
+
+
+def forget_user(user_id: int) -> None:
+    """
+    Detach ledger history from a user that is being deleted. Entries are kept
+    (append-only) but anonymised; checkpoints are derived data and dropped.
+    """
+    LedgerEntry.query.filter_by(user_id=user_id).update({"user_id": None}, synchronize_session=False)
+    BalanceCheckpoint.query.filter_by(user_id=user_id).delete(synchronize_session=False)
@@ -15,6 +15,8 @@ class User(db.Model):
 
     # Start local mirror at 0 — we'll add 1000 only when external credit succeeds.
     bafoka_balance = db.Column(db.Integer, default=0, nullable=False)
+    # pending | ready | failed — wallet creation runs in the background (see wallet_jobs.py)
+    wallet_status = db.Column(db.String(20), default="pending", nullable=False)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
@@ -61,10 +63,138 @@ class Transaction(db.Model):
     to_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
     amount = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(50), default="pending")
+    # Legacy free-text metadata (str(resp) reprs); kept for old rows, no longer written
     _metadata = db.Column(db.Text, nullable=True)
+    # Structured metadata, see META_FIELDS; write through set_meta()
+    meta = db.Column("meta_json", db.JSON, nullable=True)
+    # Generated from meta_json so ops filters hit an index instead of parsing text
+    external_status = db.Column(db.String(50), db.Computed("json_extract(meta_json, '$.external_status')", persisted=False))
+    error_code = db.Column(db.String(80), db.Computed("json_extract(meta_json, '$.error_code')", persisted=False))
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     reverted = db.Column(db.Boolean, default=False, nullable=False)
 
     from_user = db.relationship("User", foreign_keys=[from_user_id])
     to_user = db.relationship("User", foreign_keys=[to_user_id])
+
+    # History lookups and delete_user filter by party, newest first
+    __table_args__ = (
+        db.Index("ix_bafoka_transactions_from_created", "from_user_id", "created_at"),
+        db.Index("ix_bafoka_transactions_to_created", "to_user_id", "created_at"),
+        db.Index("ix_bafoka_transactions_external_status", "external_status"),
+        db.Index("ix_bafoka_transactions_error_code", "error_code"),
+    )
+
+    # Known keys of `meta`:
+    #   external_id, external_status, error_code, failure_reason,
+    #   sender_balance, receiver_balance, user_deleted, provider (raw payload)
+    META_FIELDS = (
+        "external_id", "external_status", "error_code", "failure_reason",
+        "sender_balance", "receiver_balance", "user_deleted", "provider",
+    )
+
+    def set_meta(self, **fields):
+        """Merge fields into `meta` (None values are ignored). Reassigns so the change is tracked."""
+        unknown = set(fields) - set(self.META_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown transaction metadata fields: {sorted(unknown)}")
+        merged = dict(self.meta or {})
+        merged.update({k: v for k, v in fields.items() if v is not None})
+        self.meta = merged
+
+    def get_meta(self, key: str, default=None):
+        return (self.meta or {}).get(key, default)
+
+    @property
+    def external_id(self):
+        return self.get_meta("external_id")
+
+    @property
+    def sender_balance(self):
+        value = self.get_meta("sender_balance")
+        return int(value) if value is not None else None
+
+    @property
+    def failure_reason(self):
+        return self.get_meta("failure_reason")
+
+    @property
+    def user_deleted(self) -> bool:
+        return bool(self.get_meta("user_deleted", False))
+
+
+class LedgerEntry(db.Model):
+    """
+    Append-only double-entry ledger. Every transfer or revert writes one debit
+    and one credit row; rows are never updated after insert.
+    seq is a per-user running counter used to place balance checkpoints.
+    """
+    __tablename__ = "ledger_entries"
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey("bafoka_transactions.id"), nullable=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    seq = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # transfer | revert
+    direction = db.Column(db.String(10), nullable=False)  # debit | credit
+    amount = db.Column(db.Integer, nullable=False)  # signed: debit < 0, credit > 0
+    balance_after = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_ledger_entries_user_seq", "user_id", "seq", unique=True),
+        db.Index("ix_ledger_entries_user_created", "user_id", "created_at"),
+    )
+
+
+class BalanceCheckpoint(db.Model):
+    """Snapshot of a user's balance after ledger entry number `seq`."""
+    __tablename__ = "balance_checkpoints"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_balance_checkpoints_user_created", "user_id", "created_at"),
+    )
+
+
+class CommunityStats(db.Model):
+    """
+    Running per-community counters (mirrors the contract's CommunityStatsUpdated
+    event). Maintained incrementally in the same DB transaction as the change
+    they count, so reads are a primary-key lookup.
+    """
+    __tablename__ = "community_stats"
+    community = db.Column(db.String(120), primary_key=True)
+    total_members = db.Column(db.Integer, default=0, nullable=False)
+    total_offers = db.Column(db.Integer, default=0, nullable=False)
+    total_agreements = db.Column(db.Integer, default=0, nullable=False)
+    total_transactions = db.Column(db.Integer, default=0, nullable=False)
+    total_volume = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class WalletJob(db.Model):
+    """
+    Persistent wallet-provisioning job, one per user. Picked up by the
+    background worker when next_attempt_at is due; while a worker holds a job
+    next_attempt_at doubles as its lease expiry.
+    """
+    __tablename__ = "wallet_jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
+    groupement_id = db.Column(db.Integer, nullable=False)
+    age = db.Column(db.String(10), nullable=False, default="25")
+    status = db.Column(db.String(20), default="pending", nullable=False)  # pending | running | done | failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    user = db.relationship("User")
+
+    __table_args__ = (
+        db.Index("ix_wallet_jobs_status_next", "status", "next_attempt_at"),
+    )
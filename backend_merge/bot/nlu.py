@@ -15,6 +15,7 @@ def extract_intent_and_entities(text: str) -> Tuple[str, dict]:
     Supported intents:
     - register: User wants to register
     - balance: User wants to check balance
+    - history: User wants to see past transfers
     - transfer: User wants to send money
     - offer: User wants to post a service offer
     - search: User wants to find services
@@ -52,6 +53,19 @@ def extract_intent_and_entities(text: str) -> Tuple[str, dict]:
             
             return ('register', entities)
     
+    # INTENT: Transaction history (checked before balance/transfer: "did my payment go through?").
+    # Only the user's own records: "I offer history lessons" must still reach the offer flow.
+    history_patterns = [
+        r'^\W*(?:history|transactions|statement)\W*$',
+        r'\b(?:my|show|see|view)\b.*\b(?:history|transactions|statement)\b',
+        r'did my (?:payment|transfer)',
+        r'(?:payment|transfer) go through',
+    ]
+    
+    for pattern in history_patterns:
+        if re.search(pattern, text_lower):
+            return ('history', entities)
+    
     # INTENT: Balance Check - IMPROVED
     balance_patterns = [
         r'balance|how much|my money|check.*balance|what.*balance',
@@ -179,6 +193,9 @@ def natural_language_to_command(text: str, phone: str) -> str:
     elif intent == 'balance':
         return '/balance'
     
+    elif intent == 'history':
+        return '/history'
+    
     elif intent == 'transfer':
         # Need both amount and recipient
         if 'amount' in entities and 'to_phone' in entities:
@@ -222,6 +239,7 @@ def natural_language_to_command(text: str, phone: str) -> str:
         return (
             "I didn't quite understand that. You can:\n"
             "• Say 'check my balance' to see your balance\n"
+            "• Say 'show my history' to see your recent transfers\n"
             "• Say 'register me, my name is John from Bameka, I'm 25, I do farming' to create an account\n"
             "• Say 'transfer 100 to +237...' to send money\n"
             "• Say 'I offer plumbing for 500' to post a service\n"
@@ -0,0 +1,39 @@
+# notify.py
+"""
+Outbound chat messages (WhatsApp via Twilio REST).
+Needs TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_FROM; without
+them messages are only logged, which is what dev and tests want.
+"""
+import os
+import logging
+
+LOG = logging.getLogger("notify")
+LOG.setLevel(logging.INFO)
+
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
+TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM", "")  # e.g. whatsapp:+14155238886
+
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        from twilio.rest import Client
+        _client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    return _client
+
+
+def send_message(phone: str, text: str) -> bool:
+    """Best-effort: returns False instead of raising when the message can't be sent."""
+    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_FROM):
+        LOG.info("Notification for %s (Twilio not configured): %s", phone, text)
+        return False
+    try:
+        to = phone if phone.startswith("whatsapp:") else f"whatsapp:{phone}"
+        _get_client().messages.create(from_=TWILIO_WHATSAPP_FROM, to=to, body=text)
+        return True
+    except Exception as e:
+        LOG.warning("Failed to notify %s: %s", phone, e)
+        return False
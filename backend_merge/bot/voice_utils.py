@@ -1,9 +1,44 @@
+# voice_utils.py
+"""
+Speech in / speech out for the voice endpoint: Whisper transcription (local)
+and gTTS synthesis.
+
+The Whisper model is loaded once per process under a lock. With
+WHISPER_PRELOAD=true, create_app() loads it in the background and runs one
+warm-up inference on a second of silence, so the first voice note after a
+deploy does not pay for the load; /api/ready answers 503 until that is done.
+
+Transcription runs in a separate process pool (TranscriptionService), one
+model per worker, so Whisper's CPU use cannot starve the request threads
+serving text webhooks. Jobs beyond workers + queue size are refused at once
+with TranscriptionBusy instead of piling up.
+
+Env:
+- WHISPER_MODEL_NAME tiny | base | small | medium | large (default: base)
+- WHISPER_PRELOAD load + warm up at startup (default: false, load on first use)
+- TRANSCRIBE_WORKERS worker processes, 0 = transcribe in the request thread (default: 1)
+- TRANSCRIBE_QUEUE_MAX jobs allowed to wait for a free worker (default: 4)
+- TRANSCRIBE_TORCH_THREADS torch threads per worker (default: cpu count / workers)
+- TRANSCRIBE_TIMEOUT seconds to wait for a result (default: 120)
+- VOICE_MAX_BYTES / VOICE_MAX_SECONDS input limits, checked before and during decode (default: 10 MiB / 120)
+- VOICE_DOWNLOAD_TIMEOUT connect/read timeout for audio URLs (default: 30)
+"""
 import os
+import json
 import logging
 import uuid
 import shutil
 import subprocess
-import tempfile
+import threading
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, Iterable, Optional, Set, Union
+
+import numpy as np
+import torch
 import whisper
 from gtts import gTTS
 import requests
@@ -11,9 +46,29 @@ import requests
 LOG = logging.getLogger("voice_utils")
 LOG.setLevel(logging.INFO)
 
-# Global model variable to load it once (lazy loading recommended if startup time is critical)
-# Available models: tiny, base, small, medium, large
+MODEL_NAME = os.getenv("WHISPER_MODEL_NAME", "base")
+PRELOAD = os.getenv("WHISPER_PRELOAD", "false").lower() == "true"
+WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "1"))
+QUEUE_MAX = int(os.getenv("TRANSCRIBE_QUEUE_MAX", "4"))
+TORCH_THREADS = int(os.getenv("TRANSCRIBE_TORCH_THREADS", "0")) or max(1, (os.cpu_count() or 1) // max(WORKERS, 1))
+TIMEOUT = float(os.getenv("TRANSCRIBE_TIMEOUT", "120"))
+MAX_BYTES = int(os.getenv("VOICE_MAX_BYTES", str(10 * 1024 * 1024)))
+MAX_SECONDS = float(os.getenv("VOICE_MAX_SECONDS", "120"))
+DOWNLOAD_TIMEOUT = float(os.getenv("VOICE_DOWNLOAD_TIMEOUT", "30"))
+# Bytes held for the ffprobe header check; everything after streams into ffmpeg
+PROBE_BYTES = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+# Last bytes of ffmpeg's stderr kept for the error message
+STDERR_TAIL = 4 * 1024
+SAMPLE_RATE = 16000
+# One second of silence, already a 16 kHz float32 array: ffmpeg is skipped, so
+# this warms up the model only, not the decode path
+SILENT_CLIP = np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+# Loaded once per process by get_model()
 WHISPER_MODEL = None
+_model_lock = threading.Lock()
+_status: Dict = {"state": "idle", "model": MODEL_NAME, "error": None, "load_seconds": None, "warmup_seconds": None}
 
 def ensure_ffmpeg_available():
     """Raise a helpful error if ffmpeg isn't found by Python."""
@@ -30,120 +85,439 @@ def ensure_ffmpeg_available():
 def get_model():
     global WHISPER_MODEL
     if WHISPER_MODEL is None:
-        LOG.info("Loading Whisper model 'base'...")
-        WHISPER_MODEL = whisper.load_model("base")
-        LOG.info("Whisper model loaded.")
+        with _model_lock:
+            # concurrent first callers wait here for the one load instead of loading copies
+            if WHISPER_MODEL is None:
+                _status["state"] = "loading"
+                LOG.info(f"Loading Whisper model '{MODEL_NAME}'...")
+                started = time.monotonic()
+                try:
+                    model = whisper.load_model(MODEL_NAME)
+                except Exception as e:
+                    _status.update(state="failed", error=str(e))
+                    raise
+                _status.update(state="loaded", error=None, load_seconds=round(time.monotonic() - started, 3))
+                WHISPER_MODEL = model
+                LOG.info(f"Whisper model loaded in {_status['load_seconds']}s.")
     return WHISPER_MODEL
 
-def convert_to_wav(input_path: str, output_path: str):
+
+def warm_up() -> None:
+    """Load the model (if needed) and run one inference on silence."""
+    model = get_model()
+    _status["state"] = "warming"
+    started = time.monotonic()
+    try:
+        model.transcribe(SILENT_CLIP, fp16=False, language="en")
+    except Exception as e:
+        _status.update(state="failed", error=str(e))
+        raise
+    _status.update(state="ready", error=None, warmup_seconds=round(time.monotonic() - started, 3))
+    LOG.info(f"Whisper warm-up done in {_status['warmup_seconds']}s.")
+
+
+def preload(background: bool = True) -> Optional[threading.Thread]:
+    """
+    Load + warm up now, or in a daemon thread when background=True. With a
+    worker pool this starts the workers (each loads and warms its own model).
+    """
+    if background:
+        thread = threading.Thread(target=_preload_quietly, name="whisper-preload", daemon=True)
+        thread.start()
+        return thread
+    _preload()
+    return None
+
+
+def _preload() -> None:
+    if WORKERS > 0:
+        get_service().start()
+    else:
+        warm_up()
+
+
+def _preload_quietly() -> None:
+    try:
+        _preload()
+    except Exception:
+        LOG.exception("Whisper preload failed; the model will be loaded on first use")
+
+
+class TranscriptionBusy(RuntimeError):
+    """All workers busy and the queue is full; the caller should ask the user to retry."""
+
+
+def _init_worker(model_name: str, torch_threads: int) -> None:
+    """Pool initializer: pin torch threads, then load + warm up this worker's model."""
+    global MODEL_NAME
+    MODEL_NAME = model_name
+    torch.set_num_threads(torch_threads)
+    warm_up()
+
+
+def _worker_pid(hold: float) -> int:
+    # holding the worker a moment makes the next ping go to a different one
+    time.sleep(hold)
+    return os.getpid()
+
+
+def _transcribe_in_worker(audio) -> str:
+    # the voice endpoint sends samples already decoded; raw bytes are decoded here
+    return _transcribe_local(audio)
+
+
+class TranscriptionService:
+    """
+    Process pool for Whisper. At most workers + queue_max jobs are accepted at
+    a time; submit() raises TranscriptionBusy right away beyond that.
+    """
+
+    def __init__(self, workers: int = WORKERS, queue_max: int = QUEUE_MAX, torch_threads: int = TORCH_THREADS, model_name: str = MODEL_NAME):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.torch_threads = torch_threads
+        self.model_name = model_name
+        self._slots = threading.BoundedSemaphore(workers + queue_max)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "in_flight": 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs torch threads can deadlock
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.torch_threads),
+                )
+            return self._executor
+
+    def _discard(self, executor: Optional[ProcessPoolExecutor], error: BaseException) -> None:
+        """Drop a broken pool so the next submit starts a fresh one, and report it in /api/ready."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        _status.update(state="failed", error=str(error) or type(error).__name__)
+
+    def _done(self, future: Future) -> None:
+        self._slots.release()
+        failed = future.cancelled() or future.exception() is not None
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            self.stats["failed" if failed else "completed"] += 1
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                # a worker died (OOM, segfault); next submit starts a fresh pool
+                self._executor = None
+        if not failed and _status["state"] == "failed":
+            _status.update(state="ready", error=None)  # a fresh pool is serving again
+
+    def submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise TranscriptionBusy("Voice transcription is busy, please try again in a moment")
+        pool = None
+        try:
+            pool = self._pool()
+            future = pool.submit(fn, *args)
+        except Exception as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard(pool, e)
+            raise
+        with self._lock:
+            self.stats["submitted"] += 1
+            self.stats["in_flight"] += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def transcribe(self, audio, timeout: float = TIMEOUT) -> str:
+        return self.submit(_transcribe_in_worker, audio).result(timeout)
+
+    def start(self, timeout: float = 600) -> None:
+        """Bring every worker up and wait until each has a warm model."""
+        _status["state"] = "warming"
+        started = time.monotonic()
+        pool = None
+        pids: Set[int] = set()
+        try:
+            pool = self._pool()
+            # Each worker runs the initializer (load + warm-up) before its first job;
+            # ping until every one of them has answered
+            while len(pids) < self.workers:
+                pings = [pool.submit(_worker_pid, 0.2) for _ in range(self.workers - len(pids))]
+                for ping in pings:
+                    remaining = started + timeout - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"only {len(pids)} of {self.workers} transcription workers came up in {timeout}s")
+                    pids.add(ping.result(remaining))
+        except Exception as e:
+            self._discard(pool, e)
+            raise
+        for pid in sorted(pids):
+            LOG.info(f"Transcription worker {pid} ready")
+        _status.update(state="ready", error=None, warmup_seconds=round(time.monotonic() - started, 3))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_service: Optional[TranscriptionService] = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> TranscriptionService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = TranscriptionService()
+    return _service
+
+
+def is_ready() -> bool:
+    return _status["state"] == "ready"
+
+
+def readiness() -> Dict:
+    """Model state for /api/ready: idle | loading | loaded | warming | ready | failed."""
+    info = dict(_status, preload=PRELOAD, workers=WORKERS)
+    if WORKERS > 0 and _service is not None:
+        info["pool"] = dict(_service.stats, queue_max=_service.queue_max)
+    return info
+
+class AudioRejected(ValueError):
+    """Input refused before decoding: too big, too long or not audio. status is the HTTP code to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+DECODE_CMD = [
+    "ffmpeg",
+    "-hide_banner",
+    "-loglevel", "error",
+    "-i", "pipe:0",          # input from stdin
+    "-f", "s16le",           # raw 16-bit little-endian PCM
+    "-ac", "1",              # mono (1 audio channel)
+    "-ar", str(SAMPLE_RATE), # 16 kHz sample rate
+    "pipe:1",                # output to stdout
+]
+
+
+def probe_audio(head: bytes) -> Optional[float]:
+    """
+    ffprobe the first bytes of a payload. Raises AudioRejected if there is no
+    audio stream; returns the duration when the header declares one.
     """
-    Convert any audio file to WAV (mono, 16kHz, 16-bit PCM) using ffmpeg.
-    This format is optimal for speech recognition models like Whisper.
+    if shutil.which("ffprobe") is None:
+        raise RuntimeError("ffprobe not found in PATH available to Python (it ships with ffmpeg).")
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "stream=codec_type:format=duration", "-of", "json", "pipe:0"]
+    try:
+        # a truncated input makes ffprobe exit non-zero, but it still reports what the header holds
+        result = subprocess.run(cmd, input=head, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10)
+        info = json.loads(result.stdout or b"{}")
+    except (subprocess.TimeoutExpired, ValueError):
+        raise AudioRejected("Could not read the audio header", 415)
+    if not any(stream.get("codec_type") == "audio" for stream in info.get("streams", [])):
+        raise AudioRejected("Payload is not audio", 415)
+    try:
+        return float(info.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        return None  # streamed containers (ogg/opus) often carry no duration
+
+
+def stream_decode(chunks: Iterable[bytes], max_bytes: int = MAX_BYTES, max_seconds: float = MAX_SECONDS, timeout: float = 60, probe_all: bool = False) -> np.ndarray:
+    """
+    Decode an audio byte stream to what Whisper consumes: 16 kHz mono float32
+    in [-1, 1]. One ffmpeg process, stdin -> stdout, nothing on disk.
+
+    The first PROBE_BYTES (all of it with probe_all, for payloads already in
+    memory) are held and checked with ffprobe before ffmpeg starts; after that
+    chunks go straight into ffmpeg's stdin, whose pipe buffer is the only
+    buffer (a slow decoder slows the download down). If the head alone does
+    not probe as audio (an m4a/mp4 with its moov atom at the end), the rest is
+    buffered, up to max_bytes, and probed whole before giving up. The input is
+    cut off past max_bytes and the decoder killed past max_seconds of PCM or
+    after timeout seconds, so neither side ever holds more than the limits allow.
     """
     ensure_ffmpeg_available()
-    
-    cmd = [
-        "ffmpeg",
-        "-y",                    # overwrite output if exists
-        "-i", input_path,        # input file
-        "-ac", "1",              # mono (1 audio channel)
-        "-ar", "16000",          # 16 kHz sample rate
-        "-sample_fmt", "s16",    # 16-bit PCM
-        output_path
-    ]
-    
+    chunks = iter(chunks)
+
+    head = bytearray()
+    complete = True
+    for chunk in chunks:
+        head += chunk
+        if len(head) > max_bytes or (len(head) >= PROBE_BYTES and not probe_all):
+            complete = False
+            break
+    if not head:
+        raise AudioRejected("Empty audio payload")
+    if len(head) > max_bytes:
+        raise AudioRejected(f"Audio larger than {max_bytes} bytes", 413)
     try:
-        LOG.info(f"Converting {input_path} to WAV format...")
-        result = subprocess.run(
-            cmd, 
-            check=True, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE,
-            timeout=60  # 60 second timeout for conversion
-        )
-        LOG.info(f"Successfully converted to {output_path}")
-    except subprocess.CalledProcessError as e:
-        LOG.error(f"ffmpeg conversion failed. stderr: {e.stderr.decode(errors='ignore')}")
-        raise RuntimeError(f"Audio conversion failed: {e.stderr.decode(errors='ignore')}")
-    except subprocess.TimeoutExpired:
-        LOG.error("ffmpeg conversion timed out")
-        raise RuntimeError("Audio conversion timed out after 60 seconds")
+        duration = probe_audio(bytes(head))
+    except AudioRejected:
+        if complete:
+            raise
+        for chunk in chunks:
+            head += chunk
+            if len(head) > max_bytes:
+                raise AudioRejected(f"Audio larger than {max_bytes} bytes", 413)
+        duration = probe_audio(bytes(head))
+    if duration and duration > max_seconds:
+        raise AudioRejected(f"Audio longer than {max_seconds:g} seconds", 413)
+
+    proc = subprocess.Popen(DECODE_CMD, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    max_pcm = int(max_seconds * SAMPLE_RATE) * 2
+    pcm = bytearray()
+    stderr_tail: Deque[bytes] = deque(maxlen=STDERR_TAIL // 1024)
+    too_long = threading.Event()
+    timed_out = threading.Event()
+
+    def _read_pcm():
+        while True:
+            block = proc.stdout.read(CHUNK_SIZE)
+            if not block:
+                return
+            pcm.extend(block)
+            if len(pcm) > max_pcm:
+                too_long.set()
+                proc.kill()
+                return
+
+    def _drain_stderr():
+        # ffmpeg blocks once the stderr pipe is full; keep it flowing, remember the end
+        for block in iter(lambda: proc.stderr.read(1024), b""):
+            stderr_tail.append(block)
+
+    def _expire():
+        timed_out.set()
+        proc.kill()  # unblocks a write into a decoder that stopped reading
+
+    readers = [threading.Thread(target=_read_pcm, name="ffmpeg-pcm", daemon=True),
+               threading.Thread(target=_drain_stderr, name="ffmpeg-stderr", daemon=True)]
+    for thread in readers:
+        thread.start()
+    watchdog = threading.Timer(timeout, _expire)
+    watchdog.daemon = True
+    watchdog.start()
+    try:
+        received = len(head)
+        try:
+            proc.stdin.write(head)
+            for chunk in chunks:
+                received += len(chunk)
+                if received > max_bytes:
+                    raise AudioRejected(f"Audio larger than {max_bytes} bytes", 413)
+                if too_long.is_set() or timed_out.is_set():
+                    break
+                proc.stdin.write(chunk)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass  # ffmpeg quit early (killed for length or time, or bad data); reported below
+    except Exception:
+        proc.kill()
+        raise
+    finally:
+        returncode = proc.wait()
+        watchdog.cancel()
+        for thread in readers:
+            thread.join()
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            try:
+                pipe.close()
+            except (OSError, ValueError):
+                pass
+
+    if timed_out.is_set() and returncode != 0:
+        raise RuntimeError(f"Audio conversion timed out after {timeout:g} seconds")
+    if too_long.is_set():
+        raise AudioRejected(f"Audio longer than {max_seconds:g} seconds", 413)
+    if returncode != 0:
+        stderr = b"".join(stderr_tail).decode(errors="ignore")
+        LOG.error(f"ffmpeg decode failed. stderr: {stderr}")
+        raise RuntimeError(f"Audio conversion failed: {stderr}")
+    return pcm_to_float32(bytes(pcm))
 
-def download_audio(url: str, save_dir: str = "temp_audio") -> str:
+
+def decode_audio(data: bytes, max_bytes: int = MAX_BYTES, max_seconds: float = MAX_SECONDS) -> np.ndarray:
+    """Decode in-memory audio (e.g. an upload) with the same checks as a download."""
+    return stream_decode([data], max_bytes, max_seconds, probe_all=True)
+
+
+def pcm_to_float32(pcm: bytes) -> np.ndarray:
+    """s16le bytes -> float32 samples scaled to [-1, 1] (same as whisper.load_audio)."""
+    return np.frombuffer(pcm, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def _is_audio_type(content_type: str) -> bool:
+    return content_type.startswith(("audio/", "video/")) or content_type in ("application/ogg", "application/octet-stream")
+
+
+def fetch_audio(url: str, max_bytes: int = MAX_BYTES, max_seconds: float = MAX_SECONDS) -> np.ndarray:
     """
-    Downloads audio from a URL and saves it locally.
-    Returns the path to the saved file.
+    Stream audio from a URL straight into the decoder; returns float32 samples.
+    Refuses (AudioRejected) non-audio Content-Types and a Content-Length over
+    max_bytes before reading the body.
     """
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-    
     try:
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        # Guess extension or default to .ogg (common for WhatsApp)
-        ext = ".ogg"
-        content_type = response.headers.get("Content-Type", "")
-        if "audio/mp4" in content_type:
-            ext = ".m4a"
-        elif "audio/mpeg" in content_type:
-            ext = ".mp3"
-        elif "audio/ogg" in content_type or "audio/opus" in content_type:
-            ext = ".ogg"
-        elif "audio/wav" in content_type:
-            ext = ".wav"
-            
-        filename = f"{uuid.uuid4()}{ext}"
-        filepath = os.path.join(save_dir, filename)
-        
-        with open(filepath, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        LOG.info(f"Downloaded audio to {filepath}")
-        return filepath
+        with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type and not _is_audio_type(content_type):
+                raise AudioRejected(f"Expected audio, got {content_type}", 415)
+            length = response.headers.get("Content-Length", "")
+            if length.isdigit() and int(length) > max_bytes:
+                raise AudioRejected(f"Audio larger than {max_bytes} bytes", 413)
+
+            samples = stream_decode(response.iter_content(chunk_size=CHUNK_SIZE), max_bytes, max_seconds)
+        LOG.info(f"Fetched and decoded {len(samples) / SAMPLE_RATE:.1f}s of audio")
+        return samples
     except Exception as e:
-        LOG.error(f"Failed to download audio: {e}")
+        LOG.error(f"Failed to fetch audio: {e}")
         raise
 
-def transcribe_audio(filepath: str) -> str:
+def transcribe_audio(audio: Union[bytes, str, np.ndarray]) -> str:
+    """
+    Transcribe audio (raw file bytes, a path, or samples from fetch_audio) to
+    text, on the worker pool when TRANSCRIBE_WORKERS > 0. Raises
+    TranscriptionBusy when the pool's queue is full.
+    """
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            audio = f.read()
+    if WORKERS > 0:
+        return get_service().transcribe(audio)
+    return _transcribe_local(audio)
+
+
+def _transcribe_local(audio: Union[bytes, np.ndarray]) -> str:
     """
-    Uses local OpenAI Whisper to transcribe audio file to text.
-    Automatically converts any audio format to WAV using ffmpeg before transcription.
+    Uses local OpenAI Whisper to transcribe audio to text. Bytes are decoded
+    in memory and the samples passed straight to the model, so Whisper does
+    not run its own ffmpeg pass on a temporary file.
     """
-    wav_path = None
     try:
-        # Check if input is already WAV, if not convert it
-        if not filepath.lower().endswith('.wav'):
-            # Create temporary WAV file
-            fd, wav_path = tempfile.mkstemp(suffix=".wav")
-            os.close(fd)  # close file descriptor, ffmpeg will write the file
-            
-            # Convert to WAV format
-            convert_to_wav(filepath, wav_path)
-            transcribe_path = wav_path
-        else:
-            transcribe_path = filepath
-        
-        # Load Whisper model and transcribe
+        samples = audio if isinstance(audio, np.ndarray) else decode_audio(audio)
         model = get_model()
-        LOG.info(f"Transcribing audio from {transcribe_path}...")
-        result = model.transcribe(transcribe_path)
+        LOG.info(f"Transcribing {len(samples) / SAMPLE_RATE:.1f}s of audio...")
+        result = model.transcribe(samples)
         text = result["text"].strip()
         LOG.info(f"Transcribed text: {text}")
         return text
-        
+
     except Exception as e:
         LOG.error(f"Transcription failed: {e}")
         raise
-    finally:
-        # Cleanup temporary WAV file if it was created
-        if wav_path and os.path.exists(wav_path):
-            try:
-                os.remove(wav_path)
-                LOG.info(f"Cleaned up temporary WAV file: {wav_path}")
-            except Exception as cleanup_error:
-                LOG.warning(f"Failed to cleanup temp file {wav_path}: {cleanup_error}")
 
 def generate_speech(text: str, save_dir: str = "static/audio") -> str:
     """
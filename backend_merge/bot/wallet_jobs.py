@@ -0,0 +1,166 @@
+# wallet_jobs.py
+"""
+Background wallet provisioning.
+
+register_user() only enqueues a WalletJob (same commit as the user row) and
+returns; a daemon thread started by create_app() drains due jobs, calls the
+Bafoka API, and retries failures with exponential backoff. The user's
+wallet_status moves pending -> ready | failed, and they get a chat message
+once the wallet exists.
+
+Env:
+- WALLET_WORKER_ENABLED (default: true)
+- WALLET_WORKER_INTERVAL seconds between idle polls (default: 2)
+- WALLET_MAX_ATTEMPTS (default: 6)
+- WALLET_RETRY_BASE_SECONDS / WALLET_RETRY_MAX_SECONDS backoff bounds (default: 5 / 600)
+"""
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from .db import db
+from .models import User, WalletJob
+from . import notify
+from . import groupements
+
+LOG = logging.getLogger("wallet_jobs")
+LOG.setLevel(logging.INFO)
+
+WORKER_ENABLED = os.getenv("WALLET_WORKER_ENABLED", "true").lower() == "true"
+WORKER_INTERVAL = float(os.getenv("WALLET_WORKER_INTERVAL", "2"))
+MAX_ATTEMPTS = int(os.getenv("WALLET_MAX_ATTEMPTS", "6"))
+RETRY_BASE_SECONDS = float(os.getenv("WALLET_RETRY_BASE_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("WALLET_RETRY_MAX_SECONDS", "600"))
+# How long a claimed job stays invisible to other workers
+LEASE_SECONDS = 120
+
+_wakeup = threading.Event()
+
+
+def enqueue(user: User, groupement_id: int, age: Optional[str] = None) -> WalletJob:
+    """Queue wallet creation for a user. Does not commit."""
+    job = WalletJob(user=user, groupement_id=groupement_id, age=str(age) if age else "25", next_attempt_at=datetime.utcnow())
+    user.wallet_status = "pending"
+    db.session.add(job)
+    return job
+
+
+def requeue_missing() -> int:
+    """Queue a job for every user that has neither a wallet nor a job (pre-queue rows). Does not commit."""
+    users = (
+        User.query
+        .outerjoin(WalletJob, WalletJob.user_id == User.id)
+        .filter(User.bafoka_wallet_id.is_(None), WalletJob.id.is_(None))
+        .all()
+    )
+    for user in users:
+        enqueue(user, groupements.get_registry().groupement_id_for(user.community))
+    return len(users)
+
+
+def kick() -> None:
+    """Wake the worker now instead of at its next poll (call after the enqueue commit)."""
+    _wakeup.set()
+
+
+def backoff_seconds(attempts: int) -> float:
+    return min(RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), RETRY_MAX_SECONDS)
+
+
+def _claim(job: WalletJob, now: datetime) -> bool:
+    """Take a lease on the job; False if another worker got there first."""
+    claimed = (
+        WalletJob.query
+        .filter(WalletJob.id == job.id, WalletJob.next_attempt_at == job.next_attempt_at)
+        .update({"status": "running", "next_attempt_at": now + timedelta(seconds=LEASE_SECONDS)}, synchronize_session=False)
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Client errors (bad request, phone already used) fail the same way on every attempt."""
+    from . import core_logic as core
+
+    if isinstance(error, core.WalletRejected):
+        return True
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+def run_job(job: WalletJob) -> None:
+    from . import core_logic as core  # core_logic imports this module
+
+    user = job.user
+    if user is None:
+        db.session.delete(job)
+        db.session.commit()
+        return
+    job.attempts += 1
+    try:
+        address = core.provision_wallet(user.phone, user.name, job.groupement_id, job.age)
+    except Exception as e:
+        job.last_error = str(e)
+        if job.attempts >= MAX_ATTEMPTS or _is_permanent(e):
+            LOG.error("Wallet creation for %s failed permanently after %d attempts: %s", user.phone, job.attempts, e)
+            job.status = "failed"
+            user.wallet_status = "failed"
+        else:
+            delay = backoff_seconds(job.attempts)
+            LOG.warning("Wallet creation for %s failed (attempt %d), retrying in %.0fs: %s", user.phone, job.attempts, delay, e)
+            job.status = "pending"
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+        return
+
+    job.status = "done"
+    job.last_error = None
+    user.bafoka_wallet_id = address
+    user.wallet_status = "ready"
+    db.session.commit()
+    LOG.info("Bafoka wallet created for %s: %s", user.phone, address)
+    notify.send_message(user.phone, f"Your {user.bafoka_local_name or 'Bafoka'} wallet is ready! Address: {address}\nSend /balance to check it.")
+
+
+def process_due(limit: int = 20) -> int:
+    """Run up to `limit` due jobs in this thread. Returns how many were attempted."""
+    now = datetime.utcnow()
+    due = (
+        WalletJob.query
+        .filter(WalletJob.status.in_(("pending", "running")), WalletJob.next_attempt_at <= now)
+        .order_by(WalletJob.next_attempt_at)
+        .limit(limit)
+        .all()
+    )
+    ran = 0
+    for job in due:
+        if not _claim(job, now):
+            continue
+        db.session.refresh(job)
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def _worker_loop(app) -> None:
+    while True:
+        ran = 0
+        try:
+            with app.app_context():
+                ran = process_due()
+                db.session.remove()
+        except Exception:
+            LOG.exception("Wallet worker iteration failed")
+        if not ran:
+            _wakeup.wait(WORKER_INTERVAL)
+            _wakeup.clear()
+
+
+def start_worker(app) -> Optional[threading.Thread]:
+    if not WORKER_ENABLED:
+        return None
+    thread = threading.Thread(target=_worker_loop, args=(app,), name="wallet-jobs", daemon=True)
+    thread.start()
+    return thread
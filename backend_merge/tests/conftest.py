@@ -7,3 +7,12 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+
+# Tests drive background wallet provisioning explicitly (wallet_jobs.process_due)
+os.environ.setdefault("WALLET_WORKER_ENABLED", "false")
+# Community registry stays on built-in defaults (no network, no snapshot writes)
+os.environ.setdefault("GROUPEMENTS_AUTO_REFRESH", "false")
+# No background health probes against the real/fake Bafoka hosts
+os.environ.setdefault("BAFOKA_PROBE_INTERVAL", "0")
+# fake_bafoka keeps its state in memory during tests
+os.environ.setdefault("FAKE_BAFOKA_DB", "memory")
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from bot import bafoka_client as bc
+
+web = pytest.importorskip("aiohttp.web")
+
+
+async def _serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def _upstreams(state):
+    async def balance(request):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        body = await request.json()
+        return web.json_response({"balance": 7, "phone": body["phoneNumber"]})
+
+    async def check(request):
+        body = await request.json()
+        return web.Response(text="success" if body["phoneNumber"].endswith("1") else "failed")
+
+    async def broken(request):
+        return web.Response(status=503)
+
+    fake = web.Application()
+    fake.router.add_post("/api/get-balance", balance)
+    fake.router.add_post("/api/check-account", check)
+    real = web.Application()
+    real.router.add_route("*", "/{tail:.*}", broken)
+    return real, fake
+
+
+@pytest.fixture()
+def breakers(monkeypatch):
+    monkeypatch.setattr(bc, "USE_FAKE_API", False)
+    monkeypatch.setattr(bc, "_balances", {})
+    monkeypatch.setattr(bc, "_balance_gen", {})
+
+    def _install(real_url, fake_url):
+        monkeypatch.setattr(bc, "REAL", bc.CircuitBreaker("real", real_url, "/v3/api-docs"))
+        monkeypatch.setattr(bc, "FAKE", bc.CircuitBreaker("fake", fake_url, "/api/health"))
+
+    return _install
+
+
+def test_fan_out_with_fallback_and_concurrency_cap(breakers):
+    state = {"in_flight": 0, "peak": 0}
+
+    async def scenario():
+        real_app, fake_app = _upstreams(state)
+        real_runner, real_url = await _serve(real_app)
+        fake_runner, fake_url = await _serve(fake_app)
+        breakers(real_url, fake_url)
+        try:
+            async with bc.AsyncBafokaClient(concurrency=5) as client:
+                phones = [f"+2376000000{i:02d}" for i in range(40)]
+                balances = await asyncio.gather(*(client.get_balance(p) for p in phones))
+                checks = await asyncio.gather(client.check_account("+237600000001"), client.check_account("+237600000002"))
+        finally:
+            await real_runner.cleanup()
+            await fake_runner.cleanup()
+        return phones, balances, checks
+
+    phones, balances, checks = asyncio.run(scenario())
+    assert [b["phone"] for b in balances] == phones
+    assert state["peak"] <= 5
+    assert bc.REAL.state == "open"  # 503s tripped the shared breaker; the rest went straight to fake
+    assert checks == [True, False]
+    assert bc._balances[phones[0]][1]["balance"] == 7
+
+
+def test_fails_fast_when_circuits_open(breakers):
+    breakers("http://127.0.0.1:9", "http://127.0.0.1:9")
+    for b in (bc.REAL, bc.FAKE):
+        for _ in range(bc.BREAKER_FAILURES):
+            b.record_failure("down")
+
+    async def scenario():
+        async with bc.AsyncBafokaClient() as client:
+            await client.get_balance("+237600000001")
+
+    with pytest.raises(bc.BafokaUnavailable):
+        asyncio.run(scenario())
+
+
+def test_cancelled_trial_is_released(breakers):
+    async def hang(request):
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", hang)
+        runner, url = await _serve(app)
+        breakers(url, url)
+        for _ in range(bc.BREAKER_FAILURES):
+            bc.REAL.record_failure("down")
+        bc.REAL.opened_at = 0.0
+        try:
+            async with bc.AsyncBafokaClient() as client:
+                task = asyncio.ensure_future(client.get_balance("+237600000001"))
+                await asyncio.sleep(0.2)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+    assert bc.REAL.state == "half_open" and bc.REAL.allow()
@@ -0,0 +1,91 @@
+import pytest
+import requests
+
+from bot import bafoka_client as bc
+from bot import fake_bafoka
+from bot.fake_bafoka_store import MemoryStore
+
+
+class _FlaskSession:
+    """requests.Session stand-in that sends everything to the fake app in-process."""
+
+    def __init__(self, calls):
+        self.client = fake_bafoka.app.test_client()
+        self.calls = calls
+
+    def request(self, method, url, json=None, timeout=None):
+        path = url.split("://", 1)[1].split("/", 1)[1]
+        self.calls.append("/" + path)
+        r = self.client.open("/" + path, method=method, json=json)
+        resp = requests.Response()
+        resp.status_code = r.status_code
+        resp._content = r.data
+        resp.url = url
+        return resp
+
+
+@pytest.fixture()
+def fake(monkeypatch):
+    calls = []
+    store = MemoryStore()
+    monkeypatch.setattr(fake_bafoka, "STORE", store)
+    monkeypatch.setattr(bc, "USE_FAKE_API", True)
+    monkeypatch.setattr(bc, "FAKE", bc.CircuitBreaker("fake", bc.FAKE_API_URL, "/api/health"))
+    monkeypatch.setattr(bc, "get_session", lambda base: _FlaskSession(calls))
+    monkeypatch.setattr(bc, "_balances", {})
+    return store, calls
+
+
+def test_batches_are_one_round_trip_against_fake(fake):
+    store, calls = fake
+    results = bc.batch_create_wallet([
+        {"phoneNumber": "+237600000001", "fullName": "A", "groupement_id": 3},
+        {"phoneNumber": "+237600000002", "fullName": "B", "groupement_id": 3},
+        {"phoneNumber": "+237600000003", "fullName": "C", "groupement_id": 99},
+    ])
+    assert [r["ok"] for r in results] == [True, True, False]
+    assert results[2]["error"] == "Groupement doesn't exist"
+
+    store.credit("+237600000001", 100)
+    transfers = bc.batch_transfer([("+237600000001", "+237600000002", 60), ("+237600000001", "+237600000002", 60)])
+    assert [r["ok"] for r in transfers] == [True, False]
+    assert transfers[0]["response"]["senderBalance"] == 40
+
+    balances = bc.batch_get_balance(["+237600000001", "+237600000002", "+237600000009"])
+    assert [r["response"]["data"]["balance"] for r in balances[:2]] == [40, 60]
+    assert not balances[2]["ok"]
+    assert calls == ["/api/batch/account-creation", "/api/batch/initiate-transaction", "/api/batch/get-balance"]
+    assert bc.get_balance("+237600000002")["cached"] is True
+
+
+def test_real_route_falls_back_to_concurrent_single_calls(fake, monkeypatch):
+    monkeypatch.setattr(bc, "USE_FAKE_API", False)
+    seen = []
+    monkeypatch.setattr(bc, "_fetch_balance", lambda phone: seen.append(phone) or {"balance": len(phone)})
+    results = bc.batch_get_balance([f"+23760000000{i}" for i in range(5)])
+    assert all(r["ok"] for r in results) and sorted(seen) == sorted(f"+23760000000{i}" for i in range(5))
+    assert fake[1] == []
+
+
+def test_fake_batch_endpoint_validates_input(fake):
+    client = fake_bafoka.app.test_client()
+    assert client.post("/api/batch/get-balance", json={"nope": 1}).status_code == 400
+    body = client.post("/api/batch/get-balance", json=[{"phoneNumber": "+1"}]).get_json()
+    assert body["failed"] == 1 and body["results"][0]["status"] == 400
+
+
+def test_batch_balance_does_not_overwrite_racing_invalidation(fake, monkeypatch):
+    store, calls = fake
+    monkeypatch.setattr(bc, "_balance_gen", {})
+    bc.batch_create_wallet([{"phoneNumber": p, "fullName": "", "groupement_id": 3} for p in ("+237600000001", "+237600000002")])
+    real_batch = bc._fake_batch
+
+    def _overlapping(path, payloads, writes):
+        results = real_batch(path, payloads, writes)
+        bc.invalidate_balance("+237600000001")  # a transfer/webhook lands while the batch is in flight
+        return results
+
+    monkeypatch.setattr(bc, "_fake_batch", _overlapping)
+    bc.batch_get_balance(["+237600000001", "+237600000002"])
+    assert "+237600000001" not in bc._balances
+    assert "+237600000002" in bc._balances
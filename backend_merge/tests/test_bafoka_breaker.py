@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+import requests
+
+from bot import bafoka_client as bc
+
+
+class _Resp:
+    def __init__(self, status, body=None):
+        self.status_code = status
+        self._body = body or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._body
+
+
+class _Session:
+    """Routes by base URL to a per-host handler; records every hit."""
+
+    def __init__(self, handlers, hits):
+        self.handlers = handlers
+        self.hits = hits
+
+    def request(self, method, url, json=None, timeout=None):
+        host = "real" if url.startswith(bc.BAFOKA_API_URL) else "fake"
+        self.hits.append(host)
+        return self.handlers[host]()
+
+    def get(self, url, timeout=None):
+        return self.request("GET", url)
+
+
+@pytest.fixture()
+def upstream(monkeypatch):
+    handlers = {"real": lambda: _Resp(200, {"where": "real"}), "fake": lambda: _Resp(200, {"where": "fake"})}
+    hits = []
+    monkeypatch.setattr(bc, "REAL", bc.CircuitBreaker("real", bc.BAFOKA_API_URL, "/v3/api-docs"))
+    monkeypatch.setattr(bc, "FAKE", bc.CircuitBreaker("fake", bc.FAKE_API_URL, "/api/health"))
+    monkeypatch.setattr(bc, "USE_FAKE_API", False)
+    monkeypatch.setattr(bc, "get_session", lambda base: _Session(handlers, hits))
+    return handlers, hits
+
+
+def _down():
+    raise requests.exceptions.ConnectTimeout("timed out")
+
+
+def test_open_circuit_skips_dead_endpoint(upstream):
+    handlers, hits = upstream
+    handlers["real"] = _down
+    for _ in range(bc.BREAKER_FAILURES):
+        assert bc.get_groupements() == {"where": "fake"}
+    assert bc.REAL.state == "open"
+
+    hits.clear()
+    assert bc.get_groupements() == {"where": "fake"}
+    assert hits == ["fake"]
+    info = bc.get_current_api_info()
+    assert info["api_type"] == "FAKE" and info["endpoints"]["real"]["state"] == "open"
+
+
+def test_half_open_trial_closes_on_recovery(upstream):
+    handlers, hits = upstream
+    handlers["real"] = _down
+    for _ in range(bc.BREAKER_FAILURES):
+        bc.get_groupements()
+    bc.REAL.opened_at -= bc.BREAKER_RESET_SECONDS
+
+    handlers["real"] = lambda: _Resp(200, {"where": "real"})
+    assert bc.get_groupements() == {"where": "real"}
+    assert bc.REAL.state == "closed"
+    assert bc.get_current_api_info()["api_type"] == "REAL"
+
+
+def test_fails_fast_when_everything_is_open(upstream):
+    handlers, hits = upstream
+    handlers["real"] = handlers["fake"] = lambda: _Resp(503)
+    for _ in range(bc.BREAKER_FAILURES):
+        with pytest.raises(requests.exceptions.HTTPError):
+            bc.get_balance("+237600000001")
+
+    hits.clear()
+    with pytest.raises(bc.BafokaUnavailable):
+        bc.get_balance("+237600000001")
+    assert hits == []
+
+
+def test_slow_real_api_routes_to_fake_first(upstream):
+    handlers, hits = upstream
+    bc.REAL.record_success(bc.SLOW_MS * 2)
+    assert bc.get_groupements() == {"where": "fake"}
+    assert bc.get_current_api_info()["routing"] == ["fake", "real"]
+
+
+def _half_open(breaker):
+    for _ in range(bc.BREAKER_FAILURES):
+        breaker.record_failure("down")
+    breaker.opened_at = 0.0  # reset window long gone
+
+
+def test_unexpected_error_releases_half_open_trial(upstream):
+    handlers, hits = upstream
+    _half_open(bc.REAL)
+
+    def _bug():
+        raise TypeError("bad body")
+
+    handlers["real"] = _bug
+    with pytest.raises(TypeError):
+        bc.get_groupements()
+    assert bc.REAL.state == "half_open"
+    assert bc.REAL.allow()  # the next call gets a fresh trial instead of being refused forever
+
+
+def test_call_admitted_while_closed_keeps_anothers_trial(upstream):
+    handlers, hits = upstream
+    entered, release = threading.Event(), threading.Event()
+
+    def _slow():
+        entered.set()
+        release.wait(2)
+        raise TypeError("bad body")  # ends without recording an outcome
+
+    handlers["real"] = _slow
+    slow = threading.Thread(target=lambda: pytest.raises(TypeError, bc._send_http, "GET", "/api/groupements"))
+    slow.start()
+    assert entered.wait(2)
+
+    _half_open(bc.REAL)
+    allowed, trial = bc.REAL.admit()
+    assert allowed and trial is not None  # the probe is on its way
+    handlers["real"] = lambda: _Resp(200)
+    release.set()
+    slow.join()
+    assert not bc.REAL.allow()  # still exactly one trial in flight
+
+    bc.REAL.release_trial(trial)
+    assert bc.REAL.allow()
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+import requests
+
+from bot import bafoka_client as bc
+
+
+@pytest.fixture()
+def live(monkeypatch):
+    """Stands in for the network underneath the cassette layer."""
+    calls = []
+
+    def _send_http(method, path, payload=None, fake_payload=None, fake_only=False):
+        calls.append(path)
+        time.sleep(0.02)
+        if path == "/api/initiate-transaction":
+            raise requests.exceptions.HTTPError("400 Client Error")
+        return {"balance": 10 * len(calls)}
+
+    monkeypatch.setattr(bc, "_send_http", _send_http)
+    monkeypatch.setattr(bc, "_balances", {})
+    monkeypatch.setattr(bc, "_balance_gen", {})
+    yield calls
+    bc.use_cassette(None)
+
+
+@pytest.mark.parametrize("name", ["tape.jsonl", "tape.jsonl.gz"])
+def test_record_then_replay_without_network(live, tmp_path, name):
+    path = str(tmp_path / name)
+    bc.use_cassette(path, "record")
+    bc.invalidate_balance("+237600000001")
+    assert bc.get_balance("+237600000001")["balance"] == 10
+    bc.invalidate_balance("+237600000001")
+    assert bc.get_balance("+237600000001")["balance"] == 20
+    with pytest.raises(RuntimeError):
+        bc.transfer("+237600000001", "+237600000002", 5)
+    assert len(live) == 3
+
+    bc.use_cassette(path, "replay", latency_scale=0)
+    live.clear()
+    bc.invalidate_balance("+237600000001")
+    assert bc.get_balance("+237600000001")["balance"] == 10
+    bc.invalidate_balance("+237600000001")
+    assert bc.get_balance("+237600000001")["balance"] == 20
+    with pytest.raises(RuntimeError):
+        bc.transfer("+237600000001", "+237600000002", 5)
+    assert live == []
+
+    with pytest.raises(bc.CassetteMiss):
+        bc.get_groupements()
+
+
+def test_replay_simulates_recorded_latency(live, tmp_path):
+    path = str(tmp_path / "tape.jsonl")
+    bc.use_cassette(path, "record")
+    bc.get_groupements()
+
+    bc.use_cassette(path, "replay", latency_scale=1.0)
+    started = time.monotonic()
+    bc.get_groupements()
+    assert time.monotonic() - started >= 0.018
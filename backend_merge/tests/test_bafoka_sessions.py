@@ -0,0 +1,58 @@
+import socket
+import threading
+
+import pytest
+import requests
+
+from bot import bafoka_client
+
+
+def test_one_session_per_base_url():
+    bafoka_client.close_sessions()
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(bafoka_client.get_session("http://fake.test/"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(s) for s in seen}) == 1
+    assert bafoka_client.get_session("http://other.test") is not seen[0]
+    bafoka_client.close_sessions()
+
+
+def test_only_read_posts_are_retried():
+    session = bafoka_client.get_session("http://fake.test")
+    balance = session.get_adapter("http://fake.test/api/get-balance").max_retries
+    create = session.get_adapter("http://fake.test/api/account-creation").max_retries
+    assert balance.is_retry("POST", 503) and balance.is_retry("GET", 503)
+    assert not create.is_retry("POST", 503) and create.is_retry("GET", 503)
+    assert session.get_adapter("http://fake.test/api/get-balance")._pool_maxsize == bafoka_client.POOL_SIZE
+    bafoka_client.close_sessions()
+
+
+def test_read_timeout_is_not_retried():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    accepted = []
+
+    def _accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            accepted.append(conn)  # never answers
+
+    threading.Thread(target=_accept, daemon=True).start()
+    base = f"http://127.0.0.1:{server.getsockname()[1]}"
+    session = bafoka_client.get_session(base)
+    try:
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            session.post(f"{base}/api/get-balance", json={}, timeout=(1, 0.2))
+        assert len(accepted) == 1
+    finally:
+        server.close()
+        for conn in accepted:
+            conn.close()
+        bafoka_client.close_sessions()
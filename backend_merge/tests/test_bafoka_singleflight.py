@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from bot import bafoka_client as bc
+
+
+def _burst(n, fn):
+    results, errors = [], []
+
+    def _run():
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+@pytest.fixture()
+def gate(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def _send(method, path, payload=None, fake_payload=None, fake_only=False):
+        calls.append((method, path))
+        release.wait(2)
+        if path == "/api/check-account":
+            raise RuntimeError("upstream exploded")
+        return [{"id": 1, "name": "Batoufam"}]
+
+    monkeypatch.setattr(bc, "_send", _send)
+    monkeypatch.setattr(bc, "_flight_stats", {"leaders": 0, "coalesced": 0})
+    return release, calls
+
+
+def _settle(n_waiting):
+    # let the followers reach flight.done.wait()
+    deadline = time.time() + 2
+    while time.time() < deadline and bc.singleflight_stats()["leaders"] + bc.singleflight_stats()["coalesced"] < n_waiting:
+        time.sleep(0.005)
+
+
+def test_identical_reads_share_one_request(gate):
+    release, calls = gate
+    threads, results, errors = _burst(6, bc.get_groupements)
+    _settle(6)
+    release.set()
+    for t in threads:
+        t.join()
+    assert calls == [("GET", "/api/groupements")]
+    assert len(results) == 6 and not errors
+    assert bc.singleflight_stats() == {"leaders": 1, "coalesced": 5, "in_flight": 0}
+
+
+def test_errors_are_shared_and_writes_never_coalesce(gate):
+    release, calls = gate
+    threads, results, errors = _burst(3, lambda: bc._call("POST", "/api/check-account", {"phoneNumber": "+237600000001"}))
+    _settle(3)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and len(errors) == 3
+
+    calls.clear()
+    for _ in range(2):
+        bc._call("POST", "/api/account-creation", {"phoneNumber": "+237600000001"})
+    assert len(calls) == 2
+
+
+def test_balance_read_after_invalidate_does_not_join_older_flight(monkeypatch):
+    phone = "+237600000001"
+    release, parked = threading.Event(), threading.Event()
+    upstream = {"balance": 1000}
+
+    def _send(method, path, payload=None, fake_payload=None, fake_only=False):
+        answer = dict(upstream)
+        if not parked.is_set():
+            parked.set()
+            release.wait(2)  # the pre-transfer read is still in flight
+        return answer
+
+    monkeypatch.setattr(bc, "_send", _send)
+    monkeypatch.setattr(bc, "_balances", {})
+    monkeypatch.setattr(bc, "_balance_gen", {})
+    threads, results, _errors = _burst(1, lambda: bc.get_balance(phone))
+    assert parked.wait(2)
+
+    upstream["balance"] = 900
+    bc.invalidate_balance(phone)  # the transfer lands
+    fresh = bc.get_balance(phone)
+    assert fresh["balance"] == 900 and fresh["cached"] is False
+
+    release.set()
+    for t in threads:
+        t.join()
+    assert results[0]["balance"] == 1000  # started before the transfer
+    assert bc.get_balance(phone)["balance"] == 900
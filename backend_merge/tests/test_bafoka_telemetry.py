@@ -0,0 +1,69 @@
+import pytest
+import requests
+
+from bot import app as app_module
+from bot import bafoka_client as bc
+
+
+class _Resp:
+    def __init__(self, status, body=None):
+        self.status_code = status
+        self._body = body if body is not None else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture()
+def upstream(monkeypatch):
+    handlers = {"real": lambda: _Resp(200, {"ok": 1}), "fake": lambda: _Resp(200, {"ok": 1})}
+
+    class _Session:
+        def request(self, method, url, json=None, timeout=None):
+            return handlers["real" if url.startswith(bc.BAFOKA_API_URL) else "fake"]()
+
+    monkeypatch.setattr(bc, "REAL", bc.CircuitBreaker("real", bc.BAFOKA_API_URL, "/v3/api-docs"))
+    monkeypatch.setattr(bc, "FAKE", bc.CircuitBreaker("fake", bc.FAKE_API_URL, "/api/health"))
+    monkeypatch.setattr(bc, "USE_FAKE_API", False)
+    monkeypatch.setattr(bc, "get_session", lambda base: _Session())
+    monkeypatch.setattr(bc, "_balances", {})
+    bc.reset_stats()
+    yield handlers
+    bc.reset_stats()
+
+
+def _timeout():
+    raise requests.exceptions.ReadTimeout("read timed out")
+
+
+def test_outcomes_split_by_api(upstream):
+    bc.get_groupements()
+    upstream["real"] = lambda: _Resp(404)
+    bc.get_groupements()
+    upstream["real"] = _timeout
+    bc.get_groupements()
+
+    groupements = bc.stats()["endpoints"]["/api/groupements"]
+    assert groupements["real"]["outcomes"] == {"ok": 1, "http-error": 1, "timeout": 1}
+    assert groupements["fake"]["outcomes"] == {"fallback": 2}
+    latency = groupements["real"]["latency_ms"]
+    assert latency["count"] == 3 and sum(latency["buckets"].values()) == 3
+    assert latency["p50"] is not None
+
+
+def test_unavailable_and_metrics_endpoint(upstream, tmp_path, monkeypatch):
+    for b in (bc.REAL, bc.FAKE):
+        for _ in range(bc.BREAKER_FAILURES):
+            b.record_failure("down")
+    with pytest.raises(bc.BafokaUnavailable):
+        bc.check_account("+237600000001")
+
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    client = app_module.create_app().test_client()
+    body = client.get("/api/metrics").get_json()["bafoka"]
+    assert body["endpoints"]["/api/check-account"]["none"]["outcomes"] == {"unavailable": 1}
+    assert body["breakers"]["real"]["state"] == "open"
@@ -0,0 +1,145 @@
+import itertools
+import time
+
+import pytest
+
+from bot import app as app_module
+from bot import bafoka_client as bc
+from bot import core_logic as core
+from bot import wallet_jobs
+from bot.db import db
+from bot.models import User
+
+
+@pytest.fixture()
+def upstream(monkeypatch):
+    calls = []
+    balances = {}
+
+    def _fetch(phone):
+        calls.append(phone)
+        return {"balance": balances.get(phone, 0), "currency": "MUNKAP"}
+
+    monkeypatch.setattr(bc, "_fetch_balance", _fetch)
+    monkeypatch.setattr(bc, "_balances", {})
+    monkeypatch.setattr(bc, "_balance_gen", {})
+    return calls, balances
+
+
+def test_ttl_hit_and_flag(upstream):
+    calls, balances = upstream
+    balances["+237600000001"] = 40
+    first = bc.get_balance("+237600000001")
+    second = bc.get_balance("+237600000001")
+    assert (first["balance"], first["cached"]) == (40, False)
+    assert (second["balance"], second["cached"]) == (40, True)
+    assert calls == ["+237600000001"]
+
+
+def test_stale_while_revalidate(upstream, monkeypatch):
+    calls, balances = upstream
+    bc.get_balance("+237600000001")
+    balances["+237600000001"] = 99
+    fetched_at, response = bc._balances["+237600000001"]
+    bc._balances["+237600000001"] = (fetched_at - bc.BALANCE_TTL_SECONDS - 1, response)
+
+    stale = bc.get_balance("+237600000001")
+    assert (stale["balance"], stale["cached"]) == (0, True)
+    for _ in range(100):
+        if bc._balances["+237600000001"][1]["balance"] == 99:
+            break
+        time.sleep(0.01)
+    assert bc.get_balance("+237600000001")["balance"] == 99
+
+
+def test_transfer_and_webhook_invalidate(upstream, tmp_path, monkeypatch):
+    calls, balances = upstream
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    counter = itertools.count(1)
+    monkeypatch.setattr(core, "create_wallet", lambda **kw: {"code": 200, "data": {"blockchainAddress": f"0x{kw['phoneNumber']}"}})
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": f"tx-{next(counter)}", "status": "pending"})
+    test_app = app_module.create_app()
+    with test_app.app_context():
+        core.register_user("+237600000001", name="A", community="BAMEKA")
+        core.register_user("+237600000002", name="B", community="BAMEKA")
+        wallet_jobs.process_due()
+        User.query.filter_by(phone="+237600000001").update({"bafoka_balance": 500})
+        db.session.commit()
+
+        client = test_app.test_client()
+        assert client.get("/api/balance?phone=%2B237600000001").get_json()["external_balance_cached"] is False
+        assert client.get("/api/balance?phone=%2B237600000001").get_json()["external_balance_cached"] is True
+
+        core.transfer_bafoka("+237600000001", "+237600000002", 10)
+        assert "+237600000001" not in bc._balances
+        bc.get_balance("+237600000002")
+
+        resp = client.post("/api/bafoka/webhook", json={"data": {"tx_id": "tx-1", "status": "success"}})
+        assert resp.status_code == 200
+        assert "+237600000002" not in bc._balances
+        db.session.remove()
+
+
+def test_dev_webhook_invalidates_dev_cache(tmp_path, monkeypatch):
+    from bot.dev import app as dev_app_module
+    from bot.dev import api_client as dev_api
+    from bot.dev import bafoka_client as dev_bc
+    from bot.dev.db import db as dev_db
+    from bot.dev.models import Transaction as DevTransaction, User as DevUser
+
+    monkeypatch.setenv("DEV_DATABASE_URL", f"sqlite:///{tmp_path / 'dev.db'}")
+    monkeypatch.setattr(dev_bc, "_balances", {})
+    upstream = {"tok-a": 100, "tok-b": 0}
+    monkeypatch.setattr(dev_api, "get_user_balance", lambda token: {"balance": upstream[token]})
+    dev_app = dev_app_module.create_app()
+    with dev_app.app_context():
+        a = DevUser(phone="+237600000001", auth_token="tok-a")
+        b = DevUser(phone="+237600000002", auth_token="tok-b")
+        dev_db.session.add_all([a, b])
+        dev_db.session.commit()
+        dev_db.session.add(DevTransaction(tx_id="tx-1", from_user_id=a.id, to_user_id=b.id, amount=30))
+        dev_db.session.commit()
+        dev_db.session.remove()
+
+    assert dev_bc.get_balance("tok-b") == {"balance": 0, "cached": False}
+    upstream.update({"tok-a": 70, "tok-b": 30})
+    resp = dev_app.test_client().post("/api/bafoka/webhook", json={"data": {"tx_id": "tx-1", "status": "completed"}})
+    assert resp.status_code == 200
+    assert dev_bc.get_balance("tok-b") == {"balance": 30, "cached": False}
+
+
+def test_dev_fetch_racing_invalidate_is_not_cached(monkeypatch):
+    from bot.dev import api_client as dev_api
+    from bot.dev import bafoka_client as dev_bc
+
+    monkeypatch.setattr(dev_bc, "_balances", {})
+    monkeypatch.setattr(dev_bc, "_balance_gen", {})
+    upstream = {"balance": 100}
+
+    def _fetch(token):
+        answer = dict(upstream)
+        upstream["balance"] = 70
+        dev_bc.invalidate_balance(token)  # a purchase lands while this read is in flight
+        return answer
+
+    monkeypatch.setattr(dev_api, "get_user_balance", _fetch)
+    assert dev_bc.get_balance("tok-a") == {"balance": 100, "cached": False}
+    assert "tok-a" not in dev_bc._balances
+
+    monkeypatch.setattr(dev_api, "get_user_balance", lambda token: dict(upstream))
+    assert dev_bc.get_balance("tok-a") == {"balance": 70, "cached": False}
+    assert dev_bc.get_balance("tok-a") == {"balance": 70, "cached": True}
+
+
+def test_dev_stale_balance_is_served_while_refreshing(monkeypatch):
+    from bot.dev import api_client as dev_api
+    from bot.dev import bafoka_client as dev_bc
+
+    monkeypatch.setattr(dev_bc, "_balances", {"tok-a": (time.time() - dev_bc.BALANCE_TTL_SECONDS - 1, {"balance": 5})})
+    monkeypatch.setattr(dev_bc, "_balance_gen", {})
+    monkeypatch.setattr(dev_api, "get_user_balance", lambda token: {"balance": 6})
+    assert dev_bc.get_balance("tok-a") == {"balance": 5, "cached": True}
+    deadline = time.time() + 2
+    while time.time() < deadline and dev_bc._balances["tok-a"][1]["balance"] != 6:
+        time.sleep(0.01)
+    assert dev_bc.get_balance("tok-a") == {"balance": 6, "cached": True}
@@ -0,0 +1,84 @@
+import itertools
+
+import pytest
+
+from bot import app as app_module
+from bot import community_stats
+from bot import core_logic as core
+from bot import wallet_jobs
+from bot.db import db
+from bot.models import CommunityStats, User
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    counter = itertools.count(1)
+    monkeypatch.setattr(core, "create_wallet", lambda **kw: {"code": 200, "data": {"blockchainAddress": f"0x{kw['phoneNumber']}"}})
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": f"tx-{next(counter)}", "status": "pending"})
+    test_app = app_module.create_app()
+    with test_app.app_context():
+        yield test_app.test_client()
+        db.session.remove()
+
+
+def _stats(client, name="bameka"):
+    resp = client.get(f"/api/communities/{name}/stats")
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_counters_follow_writes(client):
+    core.register_user("+237600000001", name="A", community="BAMEKA")
+    core.register_user("+237600000002", name="B", community="BAMEKA")
+    core.register_user("+237600000003", name="C", community="BATOUFAM")
+    offer = core.create_offer_for_user("+237600000001", "Fix door", title="Door")
+    core.initiate_agreement(offer.id, "+237600000002")
+
+    wallet_jobs.process_due()
+    User.query.filter_by(phone="+237600000001").update({"bafoka_balance": 500})
+    db.session.commit()
+    core.transfer_bafoka("+237600000001", "+237600000002", 120)
+    core.transfer_bafoka("+237600000001", "+237600000002", 30)
+    core.adjust_balances_on_external_update("tx-2", "failed")
+
+    stats = _stats(client)
+    assert {k: stats[k] for k in ("members", "offers", "agreements", "transactions", "volume")} == {
+        "members": 2, "offers": 1, "agreements": 1, "transactions": 1, "volume": 120,
+    }
+    assert _stats(client, "Batoufam")["members"] == 1
+
+    core.delete_user("+237600000001")
+    stats = _stats(client)
+    assert (stats["members"], stats["offers"], stats["agreements"]) == (1, 0, 0)
+
+
+def test_rebuild_matches_incremental(client):
+    core.register_user("+237600000001", name="A", community="BAMEKA")
+    core.register_user("+237600000002", name="B", community="BAMEKA")
+    wallet_jobs.process_due()
+    User.query.filter_by(phone="+237600000001").update({"bafoka_balance": 500})
+    db.session.commit()
+    core.transfer_bafoka("+237600000001", "+237600000002", 75)
+    before = _stats(client)
+
+    community_stats.rebuild()
+    after = _stats(client)
+    assert {k: v for k, v in before.items() if k != "updated_at"} == {k: v for k, v in after.items() if k != "updated_at"}
+
+
+def test_unknown_and_empty_communities(client):
+    assert client.get("/api/communities/atlantis/stats").status_code == 404
+    assert _stats(client, "fondjomekwet")["members"] == 0
+
+
+def test_first_bump_tolerates_a_concurrent_first_insert(client, monkeypatch):
+    # another registration created the row after this one found it missing
+    db.session.add(CommunityStats(community="BAMEKA", total_members=1, total_offers=0, total_agreements=0, total_transactions=0, total_volume=0))
+    db.session.commit()
+    monkeypatch.setattr(type(CommunityStats.query), "get", lambda query, ident: None)
+
+    community_stats.bump("BAMEKA", total_members=1)
+    db.session.commit()
+    monkeypatch.undo()
+    assert _stats(client)["members"] == 2
@@ -0,0 +1,112 @@
+import uuid
+
+import pytest
+
+from bot import app as app_module
+from bot import core_logic as core
+from bot import fake_bafoka
+from bot import wallet_jobs
+from bot.db import db
+from bot.fake_bafoka_callbacks import CallbackEmitter
+from bot.fake_bafoka_store import MemoryStore
+from bot.models import Transaction, User
+
+
+def _account(phone, balance=0):
+    return {"id": str(uuid.uuid4()), "phoneNumber": phone, "fullName": "", "age": "25", "sex": "M", "groupement_id": 3,
+            "groupementName": "Bameka", "blockchainAddress": "0x0", "balance": balance, "currency": "MUNKAP",
+            "createdAt": "", "status": "active"}
+
+
+@pytest.fixture()
+def fake(monkeypatch):
+    store = MemoryStore()
+    store.create_account(_account("+237600000001", 100))
+    store.create_account(_account("+237600000002"))
+    posted = []
+    emitter = CallbackEmitter(lambda tx_id, status, ok: store.settle(tx_id, status, ok), url="http://hook",
+                              delay=(1, 5), seed=3, post=lambda url, payload: posted.append(payload), autostart=False)
+    monkeypatch.setattr(fake_bafoka, "STORE", store)
+    monkeypatch.setattr(fake_bafoka, "CALLBACKS", emitter)
+    monkeypatch.setattr(fake_bafoka, "SETTLEMENT_MODE", "pending")
+    return store, emitter, posted, fake_bafoka.app.test_client()
+
+
+def _send(client, amount):
+    return client.post("/api/initiate-transaction", json={"senderPhoneNumber": "+237600000001", "receiverPhoneNumber": "+237600000002", "amount": amount}).get_json()
+
+
+def test_pending_then_settled_by_callback(fake):
+    store, emitter, posted, client = fake
+    emitter.failure_ratio = 0
+    body = _send(client, 30)
+    assert body["status"] == "pending" and body["senderBalance"] == 70 and body["receiverBalance"] == 0
+
+    assert emitter.process_due() == 0  # not due yet
+    emitter.process_due(now=float("inf"))
+    assert posted == [{"data": {"tx_id": body["tx_id"], "status": "completed", "amount": 30}}]
+    assert store.get_account("+237600000002")["balance"] == 30
+    assert store.settle(body["tx_id"], "completed", True) is None  # settles once
+
+
+def test_failures_refund_and_duplicates_reorder(fake):
+    store, emitter, posted, client = fake
+    emitter.failure_ratio, emitter.duplicate_ratio = 0.5, 0.5
+    tx_ids = [_send(client, 10)["tx_id"] for _ in range(10)]
+    emitter.process_due(now=float("inf"))
+    emitter.process_due(now=float("inf"))
+
+    final = {p["data"]["tx_id"]: p["data"]["status"] for p in posted}
+    assert set(final) == set(tx_ids)
+    completed = sum(1 for s in final.values() if s == "completed")
+    assert 0 < completed < 10
+    assert emitter.stats["duplicates"] > 0 and len(posted) == 10 + emitter.stats["duplicates"]
+    assert [p["data"]["tx_id"] for p in posted[:10]] != tx_ids  # delivery order differs from initiation order
+    assert store.get_account("+237600000001")["balance"] == 100 - 10 * completed
+    assert store.get_account("+237600000002")["balance"] == 10 * completed
+
+
+def test_in_order_mode_and_delivery_retry(fake):
+    store, emitter, posted, client = fake
+    emitter.reorder = False
+    tx_ids = [_send(client, 5)["tx_id"] for _ in range(5)]
+    attempts = []
+
+    def _flaky(url, payload):
+        attempts.append(payload)
+        if len(attempts) == 1:
+            raise ConnectionError("webhook down")
+        posted.append(payload)
+
+    emitter.post = _flaky
+    emitter.process_due(now=float("inf"))
+    emitter.process_due(now=float("inf"))
+    assert [p["data"]["tx_id"] for p in posted] == tx_ids[1:] + tx_ids[:1]
+    assert emitter.stats["delivery_errors"] == 1
+
+
+def test_callbacks_drive_our_webhook(fake, tmp_path, monkeypatch):
+    store, emitter, posted, fake_client = fake
+    emitter.failure_ratio = 1.0
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(core, "create_wallet", lambda **kw: {"code": 200, "data": {"blockchainAddress": "0xabc"}})
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: fake_client.post("/api/initiate-transaction", json={"senderPhoneNumber": f, "receiverPhoneNumber": t, "amount": a}).get_json())
+    test_app = app_module.create_app()
+    client = test_app.test_client()
+    emitter.post = lambda url, payload: client.post("/api/bafoka/webhook", json=payload)
+    with test_app.app_context():
+        core.register_user("+237600000001", name="A", community="BAMEKA")
+        core.register_user("+237600000002", name="B", community="BAMEKA")
+        wallet_jobs.process_due()
+        User.query.filter_by(phone="+237600000001").update({"bafoka_balance": 100})
+        db.session.commit()
+
+        res = core.transfer_bafoka("+237600000001", "+237600000002", 40)
+        assert res["status"] == "pending"
+        emitter.process_due(now=float("inf"))
+
+        db.session.expire_all()
+        tx = Transaction.query.filter_by(tx_id=res["tx_id"]).one()
+        assert (tx.status, tx.reverted, tx.error_code) == ("failed", True, "SIMULATED_FAILURE")
+        assert User.query.filter_by(phone="+237600000001").one().bafoka_balance == 100
+        db.session.remove()
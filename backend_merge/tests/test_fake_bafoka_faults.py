@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+from bot import fake_bafoka
+from bot.fake_bafoka_faults import FaultInjector, load_profiles
+
+
+@pytest.fixture()
+def client():
+    yield fake_bafoka.app.test_client()
+    fake_bafoka.FAULTS.set_profiles({})
+
+
+def test_admin_endpoint_applies_profiles(client):
+    resp = client.put("/admin/faults", json={"/api/get-balance": {"error_rate": 1, "error_status": 502}, "*": {"latency": {"dist": "fixed", "ms": 30}}})
+    assert resp.status_code == 200
+
+    assert client.post("/api/get-balance", json={"phoneNumber": "+1"}).status_code == 502
+    started = time.monotonic()
+    assert client.get("/api/groupements").status_code == 200
+    assert time.monotonic() - started >= 0.03
+
+    assert client.put("/admin/faults", json={"*": {"error_rate": 2}}).status_code == 400
+    client.delete("/admin/faults")
+    assert client.get("/admin/faults").get_json() == {"profiles": {}}
+
+
+def test_rates_and_lognormal_are_reproducible():
+    profiles = {"*": {"latency": {"dist": "lognormal", "median_ms": 100, "sigma": 0.5}, "error_rate": 0.1, "timeout_rate": 0.05, "timeout_ms": 1}}
+    a, b = FaultInjector(profiles, seed=7), FaultInjector(profiles, seed=7)
+    draws = [a.decide("/api/get-balance") for _ in range(2000)]
+    assert draws == [b.decide("/api/get-balance") for _ in range(2000)]
+
+    statuses = [override[0] for _, override in draws if override]
+    assert 0.03 < statuses.count(504) / 2000 < 0.07
+    assert 0.07 < statuses.count(503) / 2000 < 0.13
+    median = sorted(delay for delay, override in draws if not override)[len(draws) // 3]
+    assert 0.05 < median < 0.2
+
+
+def test_429_burst_window_and_env_loading(tmp_path):
+    path = tmp_path / "faults.json"
+    path.write_text('{"/api/initiate-transaction": {"burst_429": {"every_s": 60, "duration_s": 5}}}')
+    injector = FaultInjector(load_profiles(str(path)))
+    assert injector.decide("/api/initiate-transaction", now=120.0)[1][0] == 429
+    assert injector.decide("/api/initiate-transaction", now=130.0) == (0.0, None)
+    assert injector.decide("/api/get-balance", now=120.0) == (0.0, None)
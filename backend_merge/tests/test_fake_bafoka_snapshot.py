@@ -0,0 +1,116 @@
+import io
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from bot import fake_bafoka
+from bot import fake_bafoka_snapshot as snap
+from bot.fake_bafoka_store import open_store
+
+
+def _tx(sender, receiver, amount):
+    tx_id = f"TX-{uuid.uuid4().hex[:12].upper()}"
+    return {"tx_id": tx_id, "transaction_id": tx_id, "senderPhoneNumber": sender, "receiverPhoneNumber": receiver,
+            "amount": amount, "currency": "MUNKAP", "status": "completed", "timestamp": "2024-01-01T00:00:00", "groupement_id": 3}
+
+
+@pytest.mark.parametrize("source,target", [("memory", "sqlite"), ("sqlite", "memory")])
+def test_round_trip_keeps_balances_and_history_order(tmp_path, source, target):
+    src = open_store("memory" if source == "memory" else str(tmp_path / "src.db"))
+    src.replace_all(snap.generate_population(fake_bafoka.GROUPEMENT_MAP, 5, "fixed:100", seed=1), [])
+    phones = [a["phoneNumber"] for a in src.iter_accounts() if a["groupement_id"] == 3]
+    for i in range(12):
+        src.transfer(_tx(phones[i % 5], phones[(i + 1) % 5], 3))
+
+    buf = io.BytesIO()
+    assert snap.dump(src, buf) == (15, 12)
+    dst = open_store("memory" if target == "memory" else str(tmp_path / "dst.db"))
+    dst.create_account(dict(next(src.iter_accounts()), phoneNumber="+stale"))
+    assert snap.load(dst, io.BytesIO(buf.getvalue())) == (15, 12)
+
+    assert not dst.has_account("+stale")
+    assert sorted(a["balance"] for a in dst.iter_accounts()) == sorted(a["balance"] for a in src.iter_accounts())
+    assert dst.list_transactions(phones[0], limit=3) == src.list_transactions(phones[0], limit=3)
+    assert [t["tx_id"] for t in dst.iter_transactions()] == [t["tx_id"] for t in src.iter_transactions()]
+
+
+def test_population_is_deterministic_and_follows_distribution():
+    groups = {1: ("Batoufam", "MBIP TSWEFAP"), 3: ("Bameka", "MUNKAP")}
+    accounts = list(snap.generate_population(groups, 2000, "uniform:100,200", seed=7))
+    assert len(accounts) == 4000 and len({a["phoneNumber"] for a in accounts}) == 4000
+    assert all(100 <= a["balance"] <= 200 for a in accounts)
+    assert accounts == list(snap.generate_population(groups, 2000, "uniform:100,200", seed=7))
+
+    skewed = sorted(a["balance"] for a in snap.generate_population(groups, 2000, "lognormal:500,1", seed=7))
+    assert 400 < skewed[len(skewed) // 2] < 600 and skewed[-1] > 5000
+    with pytest.raises(ValueError):
+        snap.balance_sampler("zipf:2", None)
+
+
+def test_admin_snapshot_and_populate(monkeypatch):
+    monkeypatch.setattr(fake_bafoka, "STORE", open_store("memory"))
+    client = fake_bafoka.app.test_client()
+
+    assert client.post("/admin/populate", json={"per_groupement": 1000, "balance": "fixed:50", "seed": 3}).get_json() == {"accounts": 3000, "transactions": 0}
+    body = client.post("/api/get-balance", json={"phoneNumber": "+237630000999"}).get_json()
+    assert body["data"]["balance"] == 50 and body["data"]["groupement_id"] == 3
+
+    dumped = client.get("/admin/snapshot")
+    assert dumped.headers["X-Accounts"] == "3000" and dumped.mimetype == "application/gzip"
+    monkeypatch.setattr(fake_bafoka, "STORE", open_store("memory"))
+    assert client.put("/admin/snapshot", data=dumped.data).get_json() == {"accounts": 3000, "transactions": 0}
+    assert client.put("/admin/snapshot", data=b"not a snapshot").status_code == 400
+    assert client.post("/admin/populate", json={"balance": "weird"}).status_code == 400
+
+
+def test_cli_generate_dump_load(tmp_path, capsys):
+    db, out = str(tmp_path / "fake.db"), str(tmp_path / "state.jsonl.gz")
+    assert snap.main(["--db", db, "generate", "--per-groupement", "20", "--seed", "1"]) == 0
+    assert snap.main(["--db", db, "dump", out]) == 0
+    assert open_store(db).counts() == (60, 0)
+    assert snap.main(["--db", str(tmp_path / "other.db"), "load", out]) == 0
+    assert open_store(str(tmp_path / "other.db")).counts() == (60, 0)
+    assert "load: 60 accounts, 0 transactions" in capsys.readouterr().out
+
+
+def test_cli_generate_does_not_start_the_server(tmp_path):
+    # Importing bot.fake_bafoka opens its default store, so the CLI must not pull it in.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import sys; from bot import fake_bafoka_snapshot as snap; "
+        f"snap.main(['--db', {str(tmp_path / 'fake.db')!r}, 'generate', '--per-groupement', '2']); "
+        "assert 'bot.fake_bafoka' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=root, check=True, capture_output=True)
+    assert open_store(str(tmp_path / "fake.db")).counts() == (6, 0)
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_truncated_snapshot_leaves_store_untouched(tmp_path, kind):
+    src = open_store("memory")
+    src.replace_all(snap.generate_population(fake_bafoka.GROUPEMENT_MAP, 2000, "fixed:100", seed=1), [])
+    phones = [a["phoneNumber"] for a in src.iter_accounts() if a["groupement_id"] == 3]
+    for i in range(2000):
+        src.transfer(_tx(phones[i], phones[i - 1], 1))
+    buf = io.BytesIO()
+    snap.dump(src, buf)
+    truncated = buf.getvalue()[: len(buf.getvalue()) * 3 // 4]
+
+    dst = open_store("memory" if kind == "memory" else str(tmp_path / "dst.db"))
+    dst.replace_all(snap.generate_population(fake_bafoka.GROUPEMENT_MAP, 1, "fixed:5", seed=2), [])
+    with pytest.raises(EOFError):
+        snap.load(dst, io.BytesIO(truncated))
+    assert dst.counts() == (3, 0)
+    assert dst.get_account("+237630000000")["balance"] == 5
+
+
+def test_admin_snapshot_rejects_truncated_upload(monkeypatch):
+    monkeypatch.setattr(fake_bafoka, "STORE", open_store("memory"))
+    client = fake_bafoka.app.test_client()
+    client.post("/admin/populate", json={"per_groupement": 3000, "seed": 1})
+    data = client.get("/admin/snapshot").data
+    assert client.put("/admin/snapshot", data=data[: len(data) // 2]).status_code == 400
+    assert fake_bafoka.STORE.counts() == (9000, 0)
@@ -0,0 +1,129 @@
+import threading
+import uuid
+
+import pytest
+
+from bot.fake_bafoka_store import open_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return open_store("memory" if request.param == "memory" else str(tmp_path / "fake.db"))
+
+
+def _account(phone, balance=0):
+    return {"id": str(uuid.uuid4()), "phoneNumber": phone, "fullName": "", "age": "25", "sex": "M",
+            "groupement_id": 3, "groupementName": "Bameka", "blockchainAddress": "0x0", "balance": balance,
+            "currency": "MUNKAP", "createdAt": "2024-01-01T00:00:00", "status": "active"}
+
+
+def _tx(sender, receiver, amount):
+    tx_id = f"TX-{uuid.uuid4().hex[:12].upper()}"
+    return {"tx_id": tx_id, "transaction_id": tx_id, "senderPhoneNumber": sender, "receiverPhoneNumber": receiver,
+            "amount": amount, "currency": "MUNKAP", "status": "completed", "timestamp": "2024-01-01T00:00:00", "groupement_id": 3}
+
+
+def test_accounts_and_transfer(store):
+    assert store.create_account(_account("+1", 100))
+    assert not store.create_account(_account("+1"))
+    assert store.create_account(_account("+2"))
+
+    tx = _tx("+1", "+2", 30)
+    assert store.transfer(tx) == (True, 70, 30)
+    assert store.get_transaction(tx["tx_id"])["amount"] == 30
+    assert store.transfer(_tx("+1", "+2", 500)) == (False, None, None)
+    assert store.get_account("+1")["balance"] == 70
+    assert store.credit("+2", -31) is None and store.credit("+2", 5) == 35
+    assert store.counts() == (2, 1)
+
+
+def test_concurrent_transfers_never_overdraw(store):
+    store.create_account(_account("+1", 1000))
+    store.create_account(_account("+2"))
+    results = []
+
+    def _worker():
+        for _ in range(25):
+            results.append(store.transfer(_tx("+1", "+2", 7))[0])
+
+    threads = [threading.Thread(target=_worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ok = sum(results)
+    assert ok == 1000 // 7
+    assert store.get_account("+1")["balance"] == 1000 - 7 * ok
+    assert store.get_account("+2")["balance"] == 7 * ok
+    assert store.counts()[1] == ok
+
+
+def test_sqlite_survives_reopen(tmp_path):
+    path = str(tmp_path / "fake.db")
+    store = open_store(path)
+    store.create_account(_account("+1", 10))
+    assert open_store(path).get_account("+1")["balance"] == 10
+
+
+def _pages(store, phone, limit):
+    cursor, seen = None, []
+    while True:
+        page, cursor = store.list_transactions(phone, cursor, limit)
+        seen.append([tx["tx_id"] for tx in page])
+        if cursor is None:
+            return seen
+
+
+def test_list_transactions_pages_newest_first(store):
+    for phone in ("+1", "+2", "+3"):
+        store.create_account(_account(phone, 1000))
+    mine = []
+    for i in range(23):
+        tx = _tx("+1", "+2", 1) if i % 2 else _tx("+3", "+1", 1)
+        store.transfer(tx)
+        mine.append(tx["tx_id"])
+        store.transfer(_tx("+2", "+3", 1))  # not +1's
+
+    pages = _pages(store, "+1", 5)
+    assert [len(p) for p in pages] == [5, 5, 5, 5, 3]
+    assert [tx_id for page in pages for tx_id in page] == mine[::-1]
+    assert _pages(store, "+1", 23) == [mine[::-1]]
+    assert store.list_transactions("+9") == ([], None)
+
+
+def test_list_transactions_uses_phone_indexes(tmp_path):
+    store = open_store(str(tmp_path / "fake.db"))
+    conn = store._conn()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO transactions (tx_id, sender, receiver, amount, status) VALUES (?, ?, ?, 1, 'completed')",
+        ((f"TX-{i}", f"+{i % 5000}", f"+{(i + 1) % 5000}", ) for i in range(200_000)),
+    )
+    conn.execute("COMMIT")
+    page, cursor = store.list_transactions("+42", limit=10)
+    assert len(page) == 10 and all("+42" in (tx["senderPhoneNumber"], tx["receiverPhoneNumber"]) for tx in page)
+    assert len(store.list_transactions("+42", cursor, 100)[0]) == 70
+
+    plan = " ".join(row[-1] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE sender = ? AND seq < ? ORDER BY seq DESC LIMIT 10", ("+42", 10 ** 9)))
+    assert "ix_transactions_sender" in plan and "TEMP B-TREE" not in plan
+
+
+def test_transactions_endpoint(monkeypatch):
+    from bot import fake_bafoka
+
+    store = open_store("memory")
+    monkeypatch.setattr(fake_bafoka, "STORE", store)
+    store.create_account(_account("+1", 100))
+    store.create_account(_account("+2"))
+    for _ in range(3):
+        store.transfer(_tx("+1", "+2", 1))
+    client = fake_bafoka.app.test_client()
+
+    first = client.get("/api/transactions?phoneNumber=%2B2&limit=2").get_json()["data"]
+    assert len(first["transactions"]) == 2 and first["nextCursor"]
+    rest = client.get(f"/api/transactions?phoneNumber=%2B2&cursor={first['nextCursor']}").get_json()["data"]
+    assert len(rest["transactions"]) == 1 and rest["nextCursor"] is None
+    assert client.get("/api/transactions?phoneNumber=%2B9").status_code == 400
+    assert client.get("/api/transactions?phoneNumber=%2B1&cursor=abc").status_code == 400
@@ -0,0 +1,82 @@
+import json
+import time
+
+import pytest
+
+from bot import core_logic as core
+from bot import groupements
+from bot.groupements import GroupementRegistry
+
+
+@pytest.fixture()
+def registry(tmp_path):
+    reg = GroupementRegistry(fetch=lambda: [], snapshot_path=str(tmp_path / "groupements.json"), auto_refresh=False)
+    groupements.set_registry(reg)
+    yield reg
+    groupements.set_registry(None)
+
+
+def test_defaults_cover_both_directions(registry):
+    assert registry.canonicalize("bameka") == "BAMEKA"
+    assert registry.canonicalize("Fondjomenkwet") == "FONDJOMEKWET"
+    assert registry.canonicalize("2") == "FONDJOMEKWET"
+    assert registry.canonicalize("atlantis") is None
+    assert registry.groupement_id_for("batoufam") == 1
+    assert registry.groupement_id_for(None) == 3
+    assert registry.community_for_id(3) == "BAMEKA"
+    assert registry.community_for_id(99) is None
+    assert registry.currency_for("BAMEKA") == "MUNKAP"
+
+
+def test_refresh_installs_api_data_and_snapshot(tmp_path):
+    path = tmp_path / "groupements.json"
+    reg = GroupementRegistry(fetch=lambda: [{"id": 1, "name": "Batoufam"}, {"id": 4, "name": "Bangang"}], snapshot_path=str(path), auto_refresh=False)
+    assert reg.refresh() is True
+    assert reg.community_for_id(4) == "BANGANG"
+    assert reg.canonicalize("BAMEKA") is None
+    assert reg.currency_for("batoufam") == "MBIP TSWEFAP"
+
+    # A new process starts from the snapshot without calling the API
+    def _boom():
+        raise AssertionError("should not fetch")
+
+    warm = GroupementRegistry(fetch=_boom, snapshot_path=str(path), auto_refresh=False)
+    assert warm.groupement_id_for("bangang") == 4
+    assert json.loads(path.read_text())["groupements"][1]["name"] == "Bangang"
+
+
+def test_failed_refresh_keeps_data_and_backs_off(tmp_path):
+    calls = []
+
+    def _down():
+        calls.append(1)
+        raise RuntimeError("api down")
+
+    reg = GroupementRegistry(fetch=_down, snapshot_path=None, ttl=60)
+    reg.refresh_async()
+    for _ in range(50):
+        if calls and not reg._refreshing:
+            break
+        time.sleep(0.01)
+    assert reg.canonicalize("bameka") == "BAMEKA"
+    assert len(calls) == 1  # the failure counts as a load for TTL purposes
+
+
+def test_refresh_if_stale_fetches_in_background(tmp_path):
+    fetched = []
+    reg = GroupementRegistry(fetch=lambda: fetched.append(1) or [{"id": 5, "name": "Bangou"}], snapshot_path=None, ttl=60, auto_refresh=True)
+    reg.refresh_if_stale()
+    for _ in range(50):
+        if fetched and not reg._refreshing:
+            break
+        time.sleep(0.01)
+    reg.refresh_if_stale()  # fresh now: no second fetch
+    assert fetched == [1] and reg.community_for_id(5) == "BANGOU"
+
+
+def test_core_helpers_use_registry(registry):
+    registry._install([{"id": 7, "name": "Bangang", "currency": "NKAP"}])
+    assert core.canonicalize_community("bangang") == "BANGANG"
+    assert core.currency_for_community("BANGANG") == "NKAP"
+    with pytest.raises(ValueError, match="Allowed: BANGANG"):
+        core.register_user("+237600000001", community="BAMEKA")
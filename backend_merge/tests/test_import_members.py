@@ -0,0 +1,100 @@
+import json
+import threading
+
+import pytest
+
+from bot import app as app_module
+from bot import community_stats
+from bot import core_logic as core
+from bot import import_members
+from bot.db import db
+from bot.models import User, WalletJob
+
+CSV = """phone,name,community,age,skill
++237600000001,Alice,BAMEKA,30,Farming
++237600000002,Bob,bameka,,Plumbing
+not-a-phone,Carl,BAMEKA,20,
++237600000003,Dan,ATLANTIS,20,
++237600000004,Eve,BATOUFAM,41,Tailor
++237600000001,Alice again,BAMEKA,30,
+"""
+
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    test_app = app_module.create_app()
+    with test_app.app_context():
+        yield test_app
+        db.session.remove()
+
+
+@pytest.fixture()
+def members_csv(tmp_path):
+    path = tmp_path / "members.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def test_import_inserts_valid_rows_and_creates_wallets(app, members_csv, monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def _create_wallet(**kw):
+        with lock:
+            calls.append(kw)
+        if kw["phoneNumber"] == "+237600000002":
+            raise RuntimeError("sandbox 503")
+        return {"code": 200, "data": {"blockchainAddress": f"0x{kw['phoneNumber'][-4:]}"}}
+
+    monkeypatch.setattr(core, "create_wallet", _create_wallet)
+    totals = import_members.run_import(members_csv, chunk_size=2, concurrency=4)
+
+    assert (totals["inserted"], totals["invalid"], totals["wallets_ok"], totals["wallets_queued"]) == (3, 2, 2, 1)
+    assert {u.phone: u.wallet_status for u in User.query} == {
+        "+237600000001": "ready", "+237600000002": "pending", "+237600000004": "ready",
+    }
+    assert User.query.filter_by(phone="+237600000001").one().name == "Alice"
+    job = WalletJob.query.one()
+    assert (job.user.phone, job.attempts, job.last_error) == ("+237600000002", 1, "sandbox 503")
+    assert {c["phoneNumber"]: c["groupement_id"] for c in calls}["+237600000004"] == 1
+    assert community_stats.get_stats("BAMEKA")["members"] == 2
+
+    with open(f"{members_csv}.checkpoint.json") as f:
+        assert json.load(f)["inserted_through_row"] == 6
+
+
+def test_import_resumes_from_checkpoint(app, members_csv, monkeypatch):
+    monkeypatch.setattr(core, "create_wallet", lambda **kw: {"code": 200, "data": {"blockchainAddress": "0xA"}})
+    import_members.run_import(members_csv, chunk_size=2, wallets=False)
+    assert WalletJob.query.count() == 3
+
+    # re-run: nothing inserted twice, no wallet calls for queued users
+    monkeypatch.setattr(core, "create_wallet", lambda **kw: pytest.fail("unexpected create_wallet"))
+    totals = import_members.run_import(members_csv, chunk_size=2)
+    assert totals["inserted"] == 3 and totals["invalid"] == 2
+    assert User.query.count() == 3
+
+
+def test_validate_row_accepts_groupement_id():
+    fields, error = import_members.validate_row({"phoneNumber": "+237 600 000 009", "groupement_id": "2"}, core.canonicalize_community)
+    assert error is None
+    assert (fields["phone"], fields["community"], fields["age"]) == ("+237600000009", "FONDJOMEKWET", "25")
+
+
+def test_wallets_created_before_a_crash_are_kept(app, members_csv, monkeypatch):
+    calls = []
+
+    def _create_wallet(**kw):
+        calls.append(kw["phoneNumber"])
+        if len(calls) == 3:
+            raise KeyboardInterrupt  # the import dies mid-chunk
+        return {"code": 200, "data": {"blockchainAddress": f"0x{kw['phoneNumber'][-4:]}"}}
+
+    monkeypatch.setattr(core, "create_wallet", _create_wallet)
+    with pytest.raises(KeyboardInterrupt):
+        import_members.run_import(members_csv, chunk_size=10, concurrency=1)
+    db.session.rollback()
+
+    ready = {u.phone: u.bafoka_wallet_id for u in User.query.filter_by(wallet_status="ready")}
+    assert ready == {phone: f"0x{phone[-4:]}" for phone in calls[:2]}
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot import app as app_module
+from bot import core_logic as core
+from bot import ledger
+from bot.db import db
+from bot.models import User, LedgerEntry, BalanceCheckpoint
+
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": f"tx-{f}-{t}-{a}-{datetime.utcnow().timestamp()}", "status": "pending"})
+    test_app = app_module.create_app()
+    with test_app.app_context():
+        yield test_app
+        db.session.remove()
+
+
+def _users(balance=1000):
+    a = User(phone="+237600000001", community="BAMEKA", bafoka_wallet_id="0xA", bafoka_balance=balance)
+    b = User(phone="+237600000002", community="BAMEKA", bafoka_wallet_id="0xB", bafoka_balance=0)
+    db.session.add_all([a, b])
+    db.session.commit()
+    return a, b
+
+
+def test_transfer_writes_debit_and_credit(app):
+    a, b = _users()
+    core.transfer_bafoka(a.phone, b.phone, 100)
+
+    entries = LedgerEntry.query.order_by(LedgerEntry.id).all()
+    assert [(e.user_id, e.direction, e.amount) for e in entries] == [(a.id, "debit", -100), (b.id, "credit", 100)]
+    assert a.bafoka_balance == 900 and b.bafoka_balance == 100
+    # opening checkpoints capture pre-ledger balances
+    assert {(c.user_id, c.seq, c.balance) for c in BalanceCheckpoint.query} == {(a.id, 0, 1000), (b.id, 0, 0)}
+
+
+def test_failed_webhook_posts_revert_once(app):
+    a, b = _users()
+    res = core.transfer_bafoka(a.phone, b.phone, 250)
+    core.adjust_balances_on_external_update(res["tx_id"], "failed")
+    core.adjust_balances_on_external_update(res["tx_id"], "error")
+
+    assert a.bafoka_balance == 1000 and b.bafoka_balance == 0
+    kinds = [(e.kind, e.amount) for e in LedgerEntry.query.filter_by(user_id=a.id).order_by(LedgerEntry.seq)]
+    assert kinds == [("transfer", -250), ("revert", 250)]
+
+
+def test_balance_as_of_uses_checkpoints(app, monkeypatch):
+    monkeypatch.setattr(ledger, "CHECKPOINT_INTERVAL", 3)
+    a, b = _users()
+    before = datetime.utcnow() - timedelta(seconds=1)
+    for _ in range(7):
+        core.transfer_bafoka(a.phone, b.phone, 10)
+    middle = datetime.utcnow()
+    core.transfer_bafoka(a.phone, b.phone, 10)
+
+    assert BalanceCheckpoint.query.filter_by(user_id=a.id).count() == 3  # seq 0, 3, 6
+    assert ledger.balance_as_of(a.id, before) == 1000
+    assert ledger.balance_as_of(a.id, middle) == 930
+    assert ledger.balance_as_of(a.id) == 920
+    assert ledger.balance_as_of(b.id, middle) == 70
+
+
+def test_ledger_balance_endpoint_converts_offsets_to_utc(app):
+    a, b = _users()
+    core.transfer_bafoka(a.phone, b.phone, 100)
+    created = LedgerEntry.query.filter_by(user_id=a.id).one().created_at
+    client = app.test_client()
+
+    # one minute before the transfer, written in UTC+01:00: naive reading would be an hour late
+    before = (created - timedelta(minutes=1) + timedelta(hours=1)).isoformat() + "+01:00"
+    body = client.get("/api/ledger/balance", query_string={"phone": a.phone, "at": before}).get_json()
+    assert body["balance"] == 1000
+    assert body["at"] == (created - timedelta(minutes=1)).isoformat()
+    after = (created + timedelta(minutes=1)).isoformat() + "Z"
+    assert client.get("/api/ledger/balance", query_string={"phone": a.phone, "at": after}).get_json()["balance"] == 900
+
+
+def test_seq_collision_is_retried(app, monkeypatch):
+    a, b = _users()
+    core.transfer_bafoka(a.phone, b.phone, 100)
+
+    real_next_seq = ledger._next_seq
+    stale = iter([1])  # another posting already took seq 1 for a
+
+    monkeypatch.setattr(ledger, "_next_seq", lambda user: next(stale, None) or real_next_seq(user))
+    core.transfer_bafoka(a.phone, b.phone, 50)
+
+    assert [e.seq for e in LedgerEntry.query.filter_by(user_id=a.id).order_by(LedgerEntry.seq)] == [1, 2]
+    assert a.bafoka_balance == 850 and b.bafoka_balance == 150
+    assert ledger.balance_as_of(a.id, datetime.utcnow() + timedelta(seconds=1)) == 850
+
+
+def test_postings_stay_in_the_callers_transaction(app):
+    a, b = _users()
+    ledger._append(a, None, "transfer", -5, datetime.utcnow())
+    db.session.rollback()  # the savepoint must not have committed anything on its own
+    assert LedgerEntry.query.count() == 0 and BalanceCheckpoint.query.count() == 0
+    assert User.query.get(a.id).bafoka_balance == 1000
@@ -0,0 +1,72 @@
+import itertools
+
+import pytest
+
+from bot import app as app_module
+from bot import core_logic as core
+from bot import nlu
+from bot.db import db
+from bot.models import User
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    counter = itertools.count(1)
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": f"tx-{next(counter)}", "status": "completed"})
+    test_app = app_module.create_app()
+    with test_app.app_context():
+        a = User(phone="+237600000001", community="BAMEKA", bafoka_wallet_id="0xA", bafoka_balance=1000)
+        b = User(phone="+237600000002", community="BAMEKA", bafoka_wallet_id="0xB", bafoka_balance=1000)
+        db.session.add_all([a, b])
+        db.session.commit()
+        for amount in range(1, 6):
+            core.transfer_bafoka(a.phone, b.phone, amount)
+        core.transfer_bafoka(b.phone, a.phone, 50)
+        yield test_app.test_client()
+        db.session.remove()
+
+
+def test_api_transactions_keyset_pages(client):
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/transactions?phone=%2B237600000001&limit=4" + (f"&cursor={cursor}" if cursor else "")
+        data = client.get(url).get_json()
+        seen.extend(data["transactions"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert [r["amount"] for r in seen] == [50, 5, 4, 3, 2, 1]
+    assert seen[0] == {**seen[0], "direction": "in", "counterparty": "+237600000002", "tx_id": "tx-6"}
+    assert all(r["direction"] == "out" for r in seen[1:])
+
+
+def test_api_transactions_errors(client):
+    assert client.get("/api/transactions").status_code == 400
+    assert client.get("/api/transactions?phone=%2B237699999999").status_code == 404
+    assert client.get("/api/transactions?phone=%2B237600000001&cursor=bogus").status_code == 400
+
+
+def test_history_command(client):
+    out = app_module.process_command("+237600000002", "/history")
+    lines = out.splitlines()
+    assert "+50 to" not in out and "-50 to +237600000001 [completed]" in lines[0]
+    assert lines[-1].startswith("More: /history ")
+    more = app_module.process_command("+237600000002", lines[-1][len("More: "):])
+    assert "+1 from +237600000001" in more
+    assert app_module.process_command("+237600000002", "did my payment go through?").startswith(lines[0][:16])
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("show my history", "history"),
+    ("my transactions", "history"),
+    ("history", "history"),
+    ("did my transfer go through?", "history"),
+    ("I offer history lessons for 500", "offer"),
+    ("search for history teacher", "offer"),  # "teacher" is an offer keyword, as before
+    ("I can help with bank statements for 200", "offer"),
+])
+def test_history_intent_only_for_own_records(text, intent):
+    assert nlu.extract_intent_and_entities(text)[0] == intent
@@ -0,0 +1,120 @@
+import pytest
+from sqlalchemy import text
+
+from bot import app as app_module
+from bot import core_logic as core
+from bot.db import db
+from bot.models import User, Transaction
+
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    test_app = app_module.create_app()
+    with test_app.app_context():
+        a = User(phone="+237600000001", community="BAMEKA", bafoka_wallet_id="0xA", bafoka_balance=1000)
+        b = User(phone="+237600000002", community="BAMEKA", bafoka_wallet_id="0xB", bafoka_balance=0)
+        db.session.add_all([a, b])
+        db.session.commit()
+        yield test_app
+        db.session.remove()
+
+
+def test_successful_transfer_stores_structured_meta(app, monkeypatch):
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": "TX-1", "status": "completed", "senderBalance": 900})
+    core.transfer_bafoka("+237600000001", "+237600000002", 100)
+
+    tx = Transaction.query.filter_by(tx_id="TX-1").one()
+    assert tx.external_id == "TX-1"
+    assert tx.sender_balance == 900
+    assert tx.external_status == "completed"
+    assert tx.get_meta("provider")["senderBalance"] == 900
+
+
+def test_failures_are_queryable_by_error_code(app, monkeypatch):
+    def _boom(f, t, a):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(core, "bafoka_transfer", _boom)
+    with pytest.raises(RuntimeError):
+        core.transfer_bafoka("+237600000001", "+237600000002", 100)
+
+    [tx] = core.find_transactions(error_code="external_transfer_failed")
+    assert tx.failure_reason == "upstream down"
+    assert tx.reverted
+
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": "TX-2", "status": "pending"})
+    core.transfer_bafoka("+237600000001", "+237600000002", 50)
+    core.adjust_balances_on_external_update("TX-2", "rejected", {"tx_id": "TX-2", "errorCode": "LIMIT", "message": "daily limit"})
+    [tx2] = core.find_transactions(external_status="rejected", error_code="LIMIT")
+    assert tx2.failure_reason == "daily limit"
+
+
+def test_generated_columns_are_indexed(app):
+    plan = db.session.execute(text("EXPLAIN QUERY PLAN SELECT id FROM bafoka_transactions WHERE error_code = 'x'")).fetchall()
+    assert "ix_bafoka_transactions_error_code" in " ".join(str(row) for row in plan)
+
+
+def test_delete_user_flags_transactions(app, monkeypatch):
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": "TX-3", "status": "completed"})
+    core.transfer_bafoka("+237600000001", "+237600000002", 10)
+    ok, _ = core.delete_user("+237600000002")
+    assert ok
+    tx = Transaction.query.filter_by(tx_id="TX-3").one()
+    assert tx.user_deleted and tx.to_user_id is None and tx.external_id == "TX-3"
+
+
+def test_legacy_metadata_is_backfilled_on_upgrade(tmp_path, monkeypatch):
+    import sqlite3
+
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE bafoka_transactions (id INTEGER PRIMARY KEY, tx_id VARCHAR(200), from_user_id INTEGER, to_user_id INTEGER,
+                    amount INTEGER NOT NULL, status VARCHAR(50), _metadata TEXT, created_at DATETIME NOT NULL, reverted BOOLEAN NOT NULL)""")
+    conn.executemany("INSERT INTO bafoka_transactions (tx_id, amount, status, _metadata, created_at, reverted) VALUES (?, 10, ?, ?, '2024-01-01 00:00:00', 0)", [
+        ("TX-1", "completed", str({"tx_id": "TX-1", "status": "completed", "senderBalance": 90})),
+        ("TX-2", "rejected", str({"tx_id": "TX-2", "errorCode": "LIMIT", "message": "daily limit"}) + " | user_deleted"),
+        (None, "failed", "external-transfer-failed: upstream down"),
+        ("TX-4", "pending", "<Response [200]>"),
+        ("TX-5", "pending", None),
+    ])
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{path}")
+
+    with app_module.create_app().app_context():
+        [tx1] = core.find_transactions(external_status="completed")
+        assert tx1.external_id == "TX-1" and tx1.sender_balance == 90
+        [tx2] = core.find_transactions(external_status="rejected", error_code="LIMIT")
+        assert tx2.failure_reason == "daily limit" and tx2.user_deleted
+        [tx3] = core.find_transactions(error_code="external_transfer_failed")
+        assert tx3.failure_reason == "upstream down"
+        assert Transaction.query.filter_by(tx_id="TX-4").one().get_meta("provider") == "<Response [200]>"
+        assert Transaction.query.filter_by(tx_id="TX-5").one().meta is None
+        assert core.backfill_legacy_metadata() == 0  # done once
+        db.session.remove()
+
+
+def test_dev_purchase_writes_structured_meta(tmp_path, monkeypatch):
+    from bot.dev import app as dev_app_module
+    from bot.dev import api_client as dev_api
+    from bot.dev import core_logic as dev_core
+    from bot.dev.db import db as dev_db
+    from bot.dev.models import Transaction as DevTransaction, User as DevUser
+
+    monkeypatch.setenv("DEV_DATABASE_URL", f"sqlite:///{tmp_path / 'dev.db'}")
+    monkeypatch.setattr(dev_api, "purchase", lambda token, seller_id, amount: {"id": "P-1", "status": "pending"})
+    with dev_app_module.create_app().app_context():
+        dev_db.session.add_all([
+            DevUser(phone="+237600000001", community="BAMEKA", auth_token="tok-a", bafoka_balance=100),
+            DevUser(phone="+237600000002", community="BAMEKA", auth_token="tok-b", remote_user_id=7),
+        ])
+        dev_db.session.commit()
+        dev_core.transfer_bafoka("+237600000001", "+237600000002", 30)
+        dev_core.adjust_balances_on_external_update("P-1", "rejected", {"errorCode": "LIMIT", "message": "daily limit"})
+
+        tx = DevTransaction.query.filter_by(tx_id="P-1").one()
+        assert tx._metadata is None
+        assert tx.meta == {"external_id": "P-1", "external_status": "rejected", "error_code": "LIMIT",
+                           "failure_reason": "daily limit", "provider": {"errorCode": "LIMIT", "message": "daily limit"}}
+        dev_db.session.remove()
@@ -0,0 +1,113 @@
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+import torch
+
+from bot import app as app_module
+from bot import voice_utils
+
+
+def test_bounded_queue_rejects_fast():
+    service = voice_utils.TranscriptionService(workers=1, queue_max=1, torch_threads=1)
+    service._executor = ThreadPoolExecutor(1)  # same bookkeeping, no model processes
+    gate = threading.Event()
+
+    running = service.submit(gate.wait, 5)
+    queued = service.submit(lambda: "queued")
+    with pytest.raises(voice_utils.TranscriptionBusy):
+        service.submit(lambda: "rejected")
+    assert service.stats["rejected"] == 1 and service.stats["in_flight"] == 2
+
+    gate.set()
+    assert running.result(5) is True and queued.result(5) == "queued"
+    assert service.submit(lambda: "again").result(5) == "again"
+    assert service.stats["completed"] == 3 and service.stats["in_flight"] == 0
+    service.shutdown()
+
+
+def test_worker_init_pins_torch_threads(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(voice_utils, "warm_up", lambda: warmed.append(voice_utils.MODEL_NAME))
+    monkeypatch.setattr(voice_utils, "MODEL_NAME", voice_utils.MODEL_NAME)
+    before = torch.get_num_threads()
+    try:
+        voice_utils._init_worker("tiny", 2)
+        assert torch.get_num_threads() == 2 and warmed == ["tiny"]
+    finally:
+        torch.set_num_threads(before)
+
+
+def test_transcribe_audio_uses_pool(monkeypatch):
+    class _Service:
+        def transcribe(self, data):
+            return f"pooled {len(data)} bytes"
+
+    monkeypatch.setattr(voice_utils, "WORKERS", 2)
+    monkeypatch.setattr(voice_utils, "_service", _Service())
+    assert voice_utils.transcribe_audio(b"OggS") == "pooled 4 bytes"
+
+
+def test_voice_endpoint_answers_busy(monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+
+    def _busy(path):
+        raise voice_utils.TranscriptionBusy("Voice transcription is busy, please try again in a moment")
+
+    monkeypatch.setattr(voice_utils, "decode_audio", lambda data: np.zeros(len(data), dtype=np.float32))
+    monkeypatch.setattr(voice_utils, "transcribe_audio", _busy)
+    test_app = app_module.create_app()
+    test_app.static_folder = str(tmp_path)
+    resp = test_app.test_client().post("/api/voice/process", data={"phone": "+237600000001", "audio": (io.BytesIO(b"OggS"), "note.ogg")})
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "5"
+    assert resp.get_json()["error_type"] == "busy"
+    assert not (tmp_path / "audio").exists()  # uploads are decoded from memory
+
+
+class _FakePool:
+    """Executor stand-in: answers each job with the next pid, or raises when broken."""
+
+    def __init__(self, pids=(), broken=False):
+        self.pids = iter(pids)
+        self.broken = broken
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool("A process in the process pool was terminated abruptly")
+        future = Future()
+        future.set_result(next(self.pids))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_start_waits_for_every_worker(monkeypatch):
+    monkeypatch.setattr(voice_utils, "_status", {"state": "idle", "error": None})
+    service = voice_utils.TranscriptionService(workers=2, queue_max=0, torch_threads=1)
+    service._executor = _FakePool(pids=[101, 101, 102])  # first round lands twice on one worker
+
+    service.start()
+    assert voice_utils._status["state"] == "ready"
+    assert next(service._executor.pids, None) is None  # a second round was needed
+
+
+@pytest.mark.parametrize("call", ["start", "submit"])
+def test_broken_pool_is_discarded_and_reported(monkeypatch, call):
+    monkeypatch.setattr(voice_utils, "_status", {"state": "ready", "error": None})
+    service = voice_utils.TranscriptionService(workers=1, queue_max=0, torch_threads=1)
+    broken = service._executor = _FakePool(broken=True)
+
+    with pytest.raises(BrokenProcessPool):
+        service.start() if call == "start" else service.submit(len, b"")
+    assert service._executor is None and broken.shut_down
+    assert voice_utils._status["state"] == "failed" and "terminated" in voice_utils._status["error"]
+
+    # the slot was given back and the next job gets a fresh pool
+    service._executor = ThreadPoolExecutor(1)
+    assert service.submit(len, b"ok").result(5) == 2
+    service.shutdown()
@@ -0,0 +1,249 @@
+import io
+import os
+import shutil
+import sys
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from bot import app as app_module
+from bot import voice_utils
+
+
+def _wav(samples: np.ndarray, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+def test_pcm_to_float32_scaling():
+    samples = voice_utils.pcm_to_float32(np.array([0, 16384, -32768, 32767], dtype="<i2").tobytes())
+    assert samples.dtype == np.float32
+    assert samples.tolist() == pytest.approx([0.0, 0.5, -1.0, 32767 / 32768])
+
+
+FAKE_FFMPEG = """#!{python}
+import os, sys, time
+mode = os.environ.get("FAKE_FFMPEG_MODE")
+if mode == "noisy":
+    sys.stderr.write("warning: noise\\n" * 100000)  # far more than a pipe buffer, before reading stdin
+    sys.stderr.write("pipe:0: Invalid data found when processing input")
+    sys.exit(1)
+if mode == "stall":
+    time.sleep(30)  # never reads stdin
+data = sys.stdin.buffer.read()
+if data.startswith(b"OggS-corrupt"):
+    sys.stderr.write("pipe:0: Invalid data found when processing input")
+    sys.exit(1)
+with open({log!r}, "a") as log:
+    log.write(" ".join(sys.argv[1:]) + "\\n")
+sys.stdout.buffer.write(data[4:])  # "decoded" PCM = payload minus the magic
+"""
+
+FAKE_FFPROBE = """#!{python}
+import json, sys
+data = sys.stdin.buffer.read()
+# like an m4a with its moov atom last: only recognisable from the whole file
+streams = [{{"codec_type": "audio"}}] if data.startswith(b"OggS") or data.endswith(b"moov") else []
+duration = "600.0" if data.startswith(b"OggS-long") else "N/A"
+print(json.dumps({{"streams": streams, "format": {{"duration": duration}}}}))
+"""
+
+
+@pytest.fixture()
+def fake_ffmpeg(tmp_path, monkeypatch):
+    log = tmp_path / "ffmpeg.log"
+    for name, source in (("ffmpeg", FAKE_FFMPEG), ("ffprobe", FAKE_FFPROBE)):
+        path = tmp_path / name
+        path.write_text(source.format(python=sys.executable, log=str(log)))
+        path.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return log
+
+
+def _pcm(n_samples: int) -> bytes:
+    return np.full(n_samples, 16384, dtype="<i2").tobytes()
+
+
+def test_stream_decode_pipes_chunks_through_one_ffmpeg(fake_ffmpeg):
+    payload = b"OggS" + _pcm(40000)
+    chunks = [payload[i:i + 1000] for i in range(0, len(payload), 1000)]
+    samples = voice_utils.stream_decode(chunks, max_bytes=len(payload), max_seconds=10)
+    assert samples.dtype == np.float32 and len(samples) == 40000 and samples[0] == 0.5
+    args = fake_ffmpeg.read_text().split()
+    assert args[args.index("-i") + 1] == "pipe:0" and args[-1] == "pipe:1" and args[args.index("-ar") + 1] == "16000"
+
+
+def test_rejects_non_audio_before_decoding(fake_ffmpeg):
+    with pytest.raises(voice_utils.AudioRejected) as err:
+        voice_utils.decode_audio(b"<html>Not found</html>")
+    assert err.value.status == 415 and not fake_ffmpeg.exists()
+
+
+def test_rejects_declared_duration_before_decoding(fake_ffmpeg):
+    with pytest.raises(voice_utils.AudioRejected, match="longer than 120") as err:
+        voice_utils.decode_audio(b"OggS-long" + _pcm(100), max_seconds=120)
+    assert err.value.status == 413 and not fake_ffmpeg.exists()
+
+
+def test_stops_reading_past_max_bytes(fake_ffmpeg):
+    pulled = []
+
+    def _chunks():
+        for i in range(1000):
+            pulled.append(i)
+            yield (b"OggS" if i == 0 else b"") + _pcm(8192)
+
+    with pytest.raises(voice_utils.AudioRejected, match="larger than") as err:
+        voice_utils.stream_decode(_chunks(), max_bytes=200_000, max_seconds=600)
+    assert err.value.status == 413 and len(pulled) < 20
+
+
+def test_kills_decoder_past_max_seconds(fake_ffmpeg):
+    # duration unknown from the header (streamed ogg): enforced on the decoded PCM
+    with pytest.raises(voice_utils.AudioRejected, match="longer than 1 seconds"):
+        voice_utils.decode_audio(b"OggS" + _pcm(3 * voice_utils.SAMPLE_RATE), max_seconds=1)
+
+
+def test_decode_failure_raises_runtime_error(fake_ffmpeg):
+    with pytest.raises(RuntimeError, match="Invalid data"):
+        voice_utils.decode_audio(b"OggS-corrupt")
+
+
+def test_stderr_flood_does_not_block_and_is_truncated(fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_MODE", "noisy")
+    with pytest.raises(RuntimeError, match="Invalid data") as err:
+        voice_utils.decode_audio(b"OggS" + _pcm(500_000), max_bytes=2_000_000)
+    assert len(str(err.value)) <= voice_utils.STDERR_TAIL + 100
+
+
+def test_deadline_covers_a_decoder_that_stops_reading(fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_MODE", "stall")
+    payload = b"OggS" + _pcm(500_000)
+    chunks = [payload[i:i + 10_000] for i in range(0, len(payload), 10_000)]
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="timed out after 1 seconds"):
+        voice_utils.stream_decode(chunks, max_bytes=2_000_000, timeout=1)
+    assert time.monotonic() - started < 10
+
+
+def test_in_memory_payload_is_probed_whole(fake_ffmpeg):
+    m4a = b"ftyp" + _pcm(voice_utils.PROBE_BYTES) + b"moov"
+    assert len(voice_utils.decode_audio(m4a)) == voice_utils.PROBE_BYTES + 2
+
+
+def test_stream_with_trailing_moov_is_probed_again_whole(fake_ffmpeg):
+    not_audio = b"<html>" + b" " * voice_utils.PROBE_BYTES
+    with pytest.raises(voice_utils.AudioRejected) as err:
+        voice_utils.stream_decode([not_audio[i:i + 1000] for i in range(0, len(not_audio), 1000)])
+    assert err.value.status == 415 and not fake_ffmpeg.exists()
+
+    m4a = b"ftyp" + _pcm(voice_utils.PROBE_BYTES) + b"moov"
+    samples = voice_utils.stream_decode([m4a[i:i + 1000] for i in range(0, len(m4a), 1000)])
+    assert len(samples) == voice_utils.PROBE_BYTES + 2
+
+
+class _Response:
+    def __init__(self, body, headers):
+        self.body, self.headers, self.read = body, headers, 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            self.read += 1
+            yield self.body[i:i + chunk_size]
+
+
+def test_fetch_audio_checks_headers_then_streams(fake_ffmpeg, monkeypatch):
+    responses = {}
+    monkeypatch.setattr(voice_utils.requests, "get", lambda url, **kw: responses[url])
+    body = b"OggS" + _pcm(16000)
+    responses["ok"] = _Response(body, {"Content-Type": "audio/ogg; codecs=opus", "Content-Length": str(len(body))})
+    responses["html"] = _Response(b"<html>", {"Content-Type": "text/html"})
+    responses["huge"] = _Response(body, {"Content-Type": "audio/ogg", "Content-Length": str(50 * 1024 * 1024)})
+    m4a = b"ftyp" + _pcm(voice_utils.PROBE_BYTES) + b"moov"  # moov atom last: not recognisable from the head
+    responses["m4a"] = _Response(m4a, {"Content-Type": "audio/mp4"})
+
+    assert len(voice_utils.fetch_audio("ok")) == 16000
+    assert len(voice_utils.fetch_audio("m4a")) == voice_utils.PROBE_BYTES + 2
+    for url, status in (("html", 415), ("huge", 413)):
+        with pytest.raises(voice_utils.AudioRejected) as err:
+            voice_utils.fetch_audio(url)
+        assert err.value.status == status and responses[url].read == 0
+
+
+def test_voice_endpoint_reports_rejected_audio(monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+
+    def _reject(url):
+        raise voice_utils.AudioRejected("Audio larger than 10485760 bytes", 413)
+
+    monkeypatch.setattr(voice_utils, "fetch_audio", _reject)
+    resp = app_module.create_app().test_client().post("/api/voice/process", json={"audio_url": "http://x/a.ogg", "phone": "+237600000001"})
+    assert resp.status_code == 413 and resp.get_json()["error_type"] == "rejected_audio"
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None, reason="ffmpeg not installed")
+def test_real_ffmpeg_resamples_to_16k_mono():
+    tone = (np.sin(np.linspace(0, 440 * 2 * np.pi, 8000)) * 10000).astype(np.int16)
+    samples = voice_utils.decode_audio(_wav(tone, rate=8000))
+    assert samples.dtype == np.float32 and abs(len(samples) - 16000) < 200
+
+
+def test_model_gets_samples_not_a_path(monkeypatch):
+    seen = []
+
+    class _Model:
+        def transcribe(self, audio, **kwargs):
+            seen.append(audio)
+            return {"text": " bonjour "}
+
+    monkeypatch.setattr(voice_utils, "WORKERS", 0)
+    monkeypatch.setattr(voice_utils, "get_model", lambda: _Model())
+    monkeypatch.setattr(voice_utils, "decode_audio", lambda data: np.zeros(len(data), dtype=np.float32))
+    assert voice_utils.transcribe_audio(b"abc") == "bonjour"
+    assert isinstance(seen[0], np.ndarray) and len(seen[0]) == 3
+
+
+def test_upload_is_transcribed_from_memory(monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    received = []
+    monkeypatch.setattr(voice_utils, "decode_audio", lambda data: np.zeros(len(data), dtype=np.float32))
+    monkeypatch.setattr(voice_utils, "transcribe_audio", lambda audio: received.append(audio) or "balance")
+    test_app = app_module.create_app()
+    test_app.static_folder = str(tmp_path)
+    resp = test_app.test_client().post("/api/voice/process", data={
+        "phone": "+237600000001", "output_format": "text", "audio": (io.BytesIO(b"OggS-voice-note"), "note.ogg"),
+    })
+    assert resp.status_code == 200 and resp.get_json()["transcription"] == "balance"
+    # decoded in the request thread: the pool only ever gets samples
+    assert isinstance(received[0], np.ndarray) and len(received[0]) == len(b"OggS-voice-note")
+    assert not (tmp_path / "audio").exists()
+
+
+def test_upload_is_checked_before_transcription(fake_ffmpeg, monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(voice_utils, "transcribe_audio", lambda audio: pytest.fail("transcribed a rejected upload"))
+    client = app_module.create_app().test_client()
+
+    resp = client.post("/api/voice/process", data={"phone": "+237600000001", "audio": (io.BytesIO(b"<html>"), "note.ogg")})
+    assert resp.status_code == 415 and resp.get_json()["error_type"] == "rejected_audio"
+
+    huge = io.BytesIO(b"OggS" + b"\0" * (voice_utils.MAX_BYTES + 100 * 1024))
+    resp = client.post("/api/voice/process", data={"phone": "+237600000001", "audio": (huge, "note.ogg")})
+    assert resp.status_code == 413 and resp.get_json()["error_type"] == "rejected_audio"
+    assert not fake_ffmpeg.exists()
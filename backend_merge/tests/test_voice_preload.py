@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from bot import app as app_module
+from bot import voice_utils
+
+
+class _FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **kwargs):
+        self.calls.append((audio, kwargs))
+        return {"text": ""}
+
+
+@pytest.fixture()
+def loads(monkeypatch):
+    loaded = []
+
+    def _load(name):
+        time.sleep(0.05)
+        loaded.append(name)
+        return _FakeModel()
+
+    monkeypatch.setattr(voice_utils.whisper, "load_model", _load)
+    monkeypatch.setattr(voice_utils, "WHISPER_MODEL", None)
+    monkeypatch.setattr(voice_utils, "MODEL_NAME", "tiny")
+    monkeypatch.setattr(voice_utils, "WORKERS", 0)  # in-process model; the pool has its own tests
+    monkeypatch.setattr(voice_utils, "_status", dict(voice_utils._status, state="idle", error=None))
+    return loaded
+
+
+def test_concurrent_first_calls_load_once(loads):
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(voice_utils.get_model())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loads == ["tiny"]
+    assert len({id(m) for m in models}) == 1
+    assert voice_utils.readiness()["state"] == "loaded"
+
+
+def test_warm_up_runs_silent_inference(loads):
+    voice_utils.preload(background=False)
+    (audio, kwargs), = voice_utils.WHISPER_MODEL.calls
+    assert audio.dtype.name == "float32" and len(audio) == voice_utils.SAMPLE_RATE and not audio.any()
+    assert voice_utils.is_ready() and voice_utils.readiness()["warmup_seconds"] is not None
+
+
+def test_ready_endpoint_waits_for_preload(loads, monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    gate = threading.Event()
+    monkeypatch.setattr(voice_utils, "PRELOAD", True)
+    monkeypatch.setattr(voice_utils, "warm_up", lambda: gate.wait(5) and voice_utils._status.update(state="ready"))
+    client = app_module.create_app().test_client()
+
+    pending = client.get("/api/ready")
+    assert pending.status_code == 503 and pending.get_json()["ready"] is False
+    gate.set()
+    for _ in range(100):
+        if voice_utils.is_ready():
+            break
+        time.sleep(0.01)
+    assert client.get("/api/ready").status_code == 200
+
+
+def test_ready_without_preload(loads, monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(voice_utils, "PRELOAD", False)
+    body = app_module.create_app().test_client().get("/api/ready").get_json()
+    assert body["ready"] is True and body["voice"]["state"] == "idle" and loads == []
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from bot import app as app_module
+from bot import core_logic as core
+from bot import notify
+from bot import wallet_jobs
+from bot.db import db
+from bot.models import User, WalletJob
+
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    sent = []
+    monkeypatch.setattr(notify, "send_message", lambda phone, text: sent.append((phone, text)) or True)
+    test_app = app_module.create_app()
+    test_app.sent = sent
+    with test_app.app_context():
+        yield test_app
+        db.session.remove()
+
+
+def _make_due():
+    WalletJob.query.update({"next_attempt_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def test_register_enqueues_without_calling_bafoka(app, monkeypatch):
+    def _fail(**kw):
+        raise AssertionError("create_wallet must not run on the request path")
+
+    monkeypatch.setattr(core, "create_wallet", _fail)
+    resp = app.test_client().post("/api/register", json={"phoneNumber": "+237600000001", "fullName": "A", "groupement_id": 1})
+    data = resp.get_json()
+    assert data["wallet_status"] == "pending" and data["bafoka_wallet_id"] is None
+    job = WalletJob.query.one()
+    assert (job.groupement_id, job.status) == (1, "pending")
+
+
+def test_worker_provisions_and_notifies(app, monkeypatch):
+    monkeypatch.setattr(core, "create_wallet", lambda **kw: {"code": 200, "data": {"blockchainAddress": "0xABC"}})
+    core.register_user("+237600000001", name="A", community="BAMEKA")
+
+    assert wallet_jobs.process_due() == 1
+    user = User.query.filter_by(phone="+237600000001").one()
+    assert (user.wallet_status, user.bafoka_wallet_id) == ("ready", "0xABC")
+    assert WalletJob.query.one().status == "done"
+    assert app.sent and app.sent[0][0] == "+237600000001"
+    assert wallet_jobs.process_due() == 0
+
+
+def test_retries_with_backoff_then_fails(app, monkeypatch):
+    monkeypatch.setattr(wallet_jobs, "MAX_ATTEMPTS", 3)
+    calls = []
+
+    def _down(**kw):
+        calls.append(kw)
+        raise RuntimeError("sandbox timeout")
+
+    monkeypatch.setattr(core, "create_wallet", _down)
+    core.register_user("+237600000001", name="A", community="BAMEKA", age="30")
+
+    wallet_jobs.process_due()
+    job = WalletJob.query.one()
+    assert (job.status, job.attempts, job.last_error) == ("pending", 1, "sandbox timeout")
+    assert job.next_attempt_at > datetime.utcnow()
+    assert wallet_jobs.process_due() == 0  # not due yet
+
+    for _ in range(2):
+        _make_due()
+        wallet_jobs.process_due()
+    assert len(calls) == 3 and calls[0]["age"] == "30"
+    assert WalletJob.query.one().status == "failed"
+    assert User.query.one().wallet_status == "failed"
+    assert not app.sent
+
+
+def test_backoff_is_capped(monkeypatch):
+    monkeypatch.setattr(wallet_jobs, "RETRY_BASE_SECONDS", 5)
+    monkeypatch.setattr(wallet_jobs, "RETRY_MAX_SECONDS", 60)
+    assert [wallet_jobs.backoff_seconds(n) for n in (1, 2, 3, 4, 5)] == [5, 10, 20, 40, 60]
+
+
+def test_legacy_users_without_wallet_are_queued_on_upgrade(tmp_path, monkeypatch):
+    import sqlite3
+
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE users (id INTEGER PRIMARY KEY, phone VARCHAR(80) NOT NULL UNIQUE, name VARCHAR(120), skill VARCHAR(120),
+                    community VARCHAR(120), bafoka_wallet_id VARCHAR(200), bafoka_local_name VARCHAR(120),
+                    bafoka_balance INTEGER NOT NULL DEFAULT 0, created_at DATETIME NOT NULL)""")
+    conn.executemany("INSERT INTO users (phone, community, bafoka_wallet_id, created_at) VALUES (?, ?, ?, '2024-01-01 00:00:00')",
+                     [("+237600000001", "BAMEKA", "0xA"), ("+237600000002", "BATOUFAM", None)])
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{path}")
+
+    with app_module.create_app().app_context():
+        statuses = {u.phone: u.wallet_status for u in User.query}
+        assert statuses == {"+237600000001": "ready", "+237600000002": "pending"}
+        job = WalletJob.query.one()
+        assert (job.user.phone, job.groupement_id, job.status) == ("+237600000002", 1, "pending")
+        db.session.remove()
+
+    # a second start does not queue again
+    with app_module.create_app().app_context():
+        assert WalletJob.query.count() == 1
+        db.session.remove()
+
+
+@pytest.mark.parametrize("refusal", ["body", "http"])
+def test_client_errors_fail_on_first_attempt(app, monkeypatch, refusal):
+    def _refuse(**kw):
+        if refusal == "body":
+            return {"code": 400, "message": "Phone number already used", "data": None, "success": False}
+        response = requests.Response()
+        response.status_code = 400
+        raise requests.exceptions.HTTPError("400 Client Error: Bad Request", response=response)
+
+    monkeypatch.setattr(core, "create_wallet", _refuse)
+    core.register_user("+237600000001", name="A", community="BAMEKA")
+
+    wallet_jobs.process_due()
+    job = WalletJob.query.one()
+    assert (job.status, job.attempts) == ("failed", 1)
+    assert User.query.one().wallet_status == "failed"
+    if refusal == "body":
+        assert job.last_error == "Phone number already used"
@@ -0,0 +1,56 @@
+import itertools
+
+import pytest
+
+from bot import app as app_module
+from bot import core_logic as core
+from bot.db import db
+from bot.models import User, Transaction
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    counter = itertools.count(1)
+    monkeypatch.setattr(core, "bafoka_transfer", lambda f, t, a: {"tx_id": f"tx-{next(counter)}", "status": "pending"})
+    test_app = app_module.create_app()
+    with test_app.app_context():
+        a = User(phone="+237600000001", community="BAMEKA", bafoka_wallet_id="0xA", bafoka_balance=1000)
+        b = User(phone="+237600000002", community="BAMEKA", bafoka_wallet_id="0xB", bafoka_balance=0)
+        db.session.add_all([a, b])
+        db.session.commit()
+        for _ in range(3):
+            core.transfer_bafoka(a.phone, b.phone, 100)
+        yield test_app.test_client()
+        db.session.remove()
+
+
+def test_batch_webhook_applies_in_one_request(client):
+    resp = client.post("/api/bafoka/webhook", json=[
+        {"tx_id": "tx-1", "status": "completed"},
+        {"transaction_id": "tx-2", "status": "failed"},
+        {"tx_id": "tx-2", "status": "failed"},
+        {"tx_id": "tx-404", "status": "completed"},
+        {"status": "completed"},
+    ])
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert (data["applied"], data["skipped"], data["failed"]) == (2, 1, 2)
+    assert [r.get("action") for r in data["results"][:3]] == ["confirmed", "reverted", "skipped"]
+
+    a = User.query.filter_by(phone="+237600000001").first()
+    assert a.bafoka_balance == 800
+    assert Transaction.query.filter_by(tx_id="tx-3").first().status == "pending"
+
+
+def test_batch_webhook_accepts_wrapped_payloads(client):
+    resp = client.post("/api/bafoka/webhook", json={"updates": [{"tx_id": "tx-3", "status": "completed"}]})
+    assert resp.get_json()["applied"] == 1
+    resp = client.post("/api/bafoka/webhook", json={"data": [{"tx_id": "tx-3", "status": "completed"}]})
+    assert resp.get_json()["skipped"] == 1
+
+
+def test_single_webhook_unchanged(client):
+    resp = client.post("/api/bafoka/webhook", json={"data": {"tx_id": "tx-1", "status": "rejected"}})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"received": True, "action": "reverted", "status": "rejected"}